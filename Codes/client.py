@@ -1,10 +1,14 @@
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QPushButton,
                              QVBoxLayout, QWidget, QLineEdit, QLabel,
                              QMessageBox, QSizePolicy, QTabWidget, QListView,
-                             QFrame, QLCDNumber, QMenuBar, QStatusBar)
+                             QFrame, QLCDNumber, QMenuBar, QStatusBar,
+                             QDialog)
 from PyQt6.QtCore import pyqtSignal, QObject, QRect, QStringListModel
 from PyQt6.QtGui import QAction
 import threading
+import codecs
+import time
+import select
 import socket
 import json
 import sys
@@ -17,9 +21,13 @@ class ClientServeur(QObject):
     Cette classe gère la communication entre le client et le serveur,
     émet des signaux en cas de réponse, de succès de connexion ou de
     perte de connexion.
+
+    Les réponses sont transmises par lots : signal_reponses porte la
+    liste de tous les messages reçus lors d'une même lecture, afin de ne
+    pas émettre un signal inter-threads par message.
     """
 
-    signal_reponse = pyqtSignal(str)
+    signal_reponses = pyqtSignal(list)
     signal_connexion_echouee = pyqtSignal()
     signal_connexion_reussie = pyqtSignal()
     signal_connexion_perdue = pyqtSignal()
@@ -33,6 +41,9 @@ class ClientServeur(QObject):
         self.hote = None
         self.port = None
         self.socket_client = None
+        self.tramage_actif = False
+        self.taille_max_lot = 500
+        self.delai_accuse_tramage = 2
 
     def ecoute_serveur(self):
         """
@@ -44,20 +55,68 @@ class ClientServeur(QObject):
 
         try:
 
-            self.socket_client = socket.create_connection((self.hote,
-                                                           self.port))
+            socket_client = socket.create_connection((self.hote, self.port))
+            decodeur = DecodeurTrames()
+
+            # Négociation du tramage par longueur : aucun autre message
+            # n'est envoyé avant l'accusé TRAMAGE_ACCEPTE. Sans accusé
+            # après delai_accuse_tramage secondes (serveur sans tramage),
+            # les envois restent au format historique
+            socket_client.sendall(b"[PROTOCOLE]TRAMAGE:LONGUEUR\n")
+            messages_initiaux = []
+            limite = time.monotonic() + self.delai_accuse_tramage
+
+            while not decodeur.tramage_actif:
+
+                restant = limite - time.monotonic()
+
+                if (restant <= 0 or not
+                        select.select([socket_client], [], [], restant)[0]):
+
+                    break
+
+                donnees = socket_client.recv(65536)
+
+                if not donnees:
+
+                    raise ConnectionError("Connexion au serveur perdue.")
+
+                messages_initiaux.extend(decodeur.alimenter(donnees))
+
+            self.tramage_actif = decodeur.tramage_actif
+            self.socket_client = socket_client
             self.signal_connexion_reussie.emit()
 
+            if messages_initiaux:
+
+                self.signal_reponses.emit(messages_initiaux)
+
             while True:
 
-                donnees = self.socket_client.recv(1024)
+                donnees = socket_client.recv(65536)
 
                 if not donnees:
 
                     raise ConnectionError("Connexion au serveur perdue.")
 
-                message = donnees.decode()
-                self.signal_reponse.emit(message)
+                lot_messages = decodeur.alimenter(donnees)
+
+                # Regroupe ce qui est déjà arrivé avant de notifier
+                # l'interface
+                while (len(lot_messages) < self.taille_max_lot
+                       and select.select([socket_client], [], [], 0)[0]):
+
+                    donnees = socket_client.recv(65536)
+
+                    if not donnees:
+
+                        break
+
+                    lot_messages.extend(decodeur.alimenter(donnees))
+
+                if lot_messages:
+
+                    self.signal_reponses.emit(lot_messages)
 
         except ConnectionRefusedError:
 
@@ -88,7 +147,8 @@ class ClientServeur(QObject):
 
     def envoi_message_serveur(self, message):
         """
-        Envoie un message au serveur avec un délimiteur à la fin.
+        Envoie un message au serveur avec un délimiteur à la fin, ou
+        précédé de sa taille une fois le tramage par longueur négocié.
 
         :param message: Le message à envoyer au serveur.
 
@@ -96,8 +156,136 @@ class ClientServeur(QObject):
 
         if self.socket_client:
 
-            delimiteur_message = message + "\n"
-            self.socket_client.sendall(delimiteur_message.encode())
+            if self.tramage_actif:
+
+                donnees = message.encode()
+                self.socket_client.sendall(len(donnees).to_bytes(4, "big")
+                                           + donnees)
+
+            else:
+
+                delimiteur_message = message + "\n"
+                self.socket_client.sendall(delimiteur_message.encode())
+
+
+class DecodeurTrames:
+    """
+    Découpe le flux reçu du serveur en messages.
+
+    Tant que le serveur n'a pas accepté le tramage par longueur, le flux
+    est au format historique, sans délimiteur : il est transmis tel quel,
+    mais décodé de façon incrémentale afin qu'un caractère UTF-8 coupé
+    entre deux lectures ne soit pas corrompu. Après l'accusé
+    TRAMAGE_ACCEPTE, chaque message est précédé de sa taille sur
+    4 octets (big-endian).
+    """
+
+    ACCUSE_TRAMAGE = b"[PROTOCOLE]TRAMAGE_ACCEPTE:LONGUEUR"
+
+    def __init__(self, taille_max_trame=1048576):
+        """
+        Constructeur de la classe DecodeurTrames.
+
+        :param taille_max_trame: La taille maximale acceptée pour un
+        message tramé, en octets.
+        """
+
+        self.tampon = bytearray()
+        self.tramage_actif = False
+        self.taille_max_trame = taille_max_trame
+        self.decodeur_utf8 = codecs.getincrementaldecoder("utf-8")(
+            errors="replace")
+
+    def alimenter(self, donnees):
+        """
+        Ajoute des octets reçus au tampon et renvoie les messages complets.
+
+        :param donnees: Les octets reçus du serveur.
+        :return: La liste des messages décodés, éventuellement vide.
+        :exception ConnectionError: Si une trame annonce une taille
+        supérieure à taille_max_trame.
+        """
+
+        self.tampon += donnees
+        messages = []
+
+        if not self.tramage_actif:
+
+            self.decoder_flux_historique(messages)
+
+        if self.tramage_actif:
+
+            self.decoder_trames(messages)
+
+        return messages
+
+    def decoder_flux_historique(self, messages):
+        """
+        Décode la partie du tampon précédant l'accusé de tramage.
+
+        Une fin de tampon pouvant être le début de l'accusé est conservée
+        jusqu'à la lecture suivante.
+
+        :param messages: La liste à laquelle ajouter le texte décodé.
+        """
+
+        position = self.tampon.find(self.ACCUSE_TRAMAGE)
+
+        if position >= 0:
+
+            fin_texte = position
+            self.tramage_actif = True
+            consommes = position + len(self.ACCUSE_TRAMAGE)
+
+        else:
+
+            fin_texte = len(self.tampon)
+
+            for taille in range(len(self.ACCUSE_TRAMAGE) - 1, 0, -1):
+
+                if self.tampon.endswith(self.ACCUSE_TRAMAGE[:taille]):
+
+                    fin_texte -= taille
+                    break
+
+            consommes = fin_texte
+
+        texte = self.decodeur_utf8.decode(bytes(self.tampon[:fin_texte]),
+                                          final=self.tramage_actif)
+
+        if texte:
+
+            messages.append(texte)
+
+        del self.tampon[:consommes]
+
+    def decoder_trames(self, messages):
+        """
+        Extrait du tampon toutes les trames complètes.
+
+        :param messages: La liste à laquelle ajouter les messages décodés.
+        :exception ConnectionError: Si une trame est trop grande.
+        """
+
+        debut = 0
+
+        while len(self.tampon) - debut >= 4:
+
+            taille = int.from_bytes(self.tampon[debut:debut + 4], "big")
+
+            if taille > self.taille_max_trame:
+
+                raise ConnectionError(f"Message annoncé de {taille} octets.")
+
+            if len(self.tampon) - debut - 4 < taille:
+
+                break
+
+            messages.append(self.tampon[debut + 4:debut + 4 + taille]
+                            .decode("utf-8", errors="replace"))
+            debut += 4 + taille
+
+        del self.tampon[:debut]
 
 
 class InterfaceAccueil(QMainWindow):
@@ -498,6 +686,18 @@ class InterfaceAccueil(QMainWindow):
                    f"{nom},{prenom},{email},{mot_de_passe},utilisateur")
         self.client.envoi_message_serveur(message)
 
+    def gestion_lot_reponses_serveur(self, messages):
+        """
+        Traite, dans l'ordre de réception, un lot de messages du serveur.
+
+        :param messages: Les messages reçus lors d'une même lecture.
+        :type messages: list
+        """
+
+        for message in messages:
+
+            self.gestion_reponses_serveur(message)
+
     def gestion_reponses_serveur(self, message):
         """
         Gère les réponses reçues du serveur après l'envoi de demandes
@@ -532,8 +732,10 @@ class InterfaceAccueil(QMainWindow):
             self.fenetre_principale = InterfacePrincipale(self, self.client)
             self.client.envoi_message_serveur(
                 "[PROTOCOLE]VERIFICATION_SALONS_AUTORISES:")
+            self.fenetre_principale.demander_membres_salons()
+            self.client.envoi_message_serveur("[PROTOCOLE]REQUETE_PRESENCE:")
             self.client.envoi_message_serveur(
-                "[PROTOCOLE]REQUETE_MEMBRES_SALONS_PUBLICS:")
+                "[PROTOCOLE]REQUETE_HISTORIQUE_SALONS_PRIVES:")
             self.fenetre_principale.show()
             self.hide()
 
@@ -647,11 +849,15 @@ class InterfacePrincipale(QMainWindow):
         self.liste_membres = None
         self.membres_par_salon = {}
         self.infos_membre = {}
+        self.version_membres = 0
+        self.resynchronisation_membres = False
+        self.changements_membres_en_attente = []
+        self.membres_en_ligne = set()
         self.separateur_horizontal_droit = None
         self.bouton_theme = None
         self.theme_sombre = False
-        self.client_serveur.signal_reponse.connect(
-            self.gestion_reponses_serveur)
+        self.client_serveur.signal_reponses.connect(
+            self.gestion_lot_reponses_serveur)
         self.salons_autorises = []
         self.modele_chat_general = QStringListModel()
         self.modele_chat_blabla = QStringListModel()
@@ -659,6 +865,14 @@ class InterfacePrincipale(QMainWindow):
         self.modele_chat_informatique = QStringListModel()
         self.modele_chat_marketing = QStringListModel()
         self.modele_chat_prive = QStringListModel()
+        self.taille_page_historique = 50
+        self.curseurs_historique = {}
+        self.champ_recherche = None
+        self.fenetre_recherche = None
+        self.liste_resultats_recherche = None
+        self.bouton_suite_recherche = None
+        self.modele_resultats_recherche = QStringListModel()
+        self.recherche = {"texte": "", "curseur": 0, "en_cours": False}
         self.creation_barre_menu()
         self.initialisation_interface_principale(self)
         self.changement_theme()
@@ -715,8 +929,8 @@ class InterfacePrincipale(QMainWindow):
             self.client_serveur.socket_client = None
 
         self.close()
-        self.client_serveur.signal_reponse.disconnect(
-            self.gestion_reponses_serveur)
+        self.client_serveur.signal_reponses.disconnect(
+            self.gestion_lot_reponses_serveur)
         self.interface_client.retour_vers_fenetre_accueil()
 
     def changement_theme(self):
@@ -926,6 +1140,18 @@ class InterfacePrincipale(QMainWindow):
 
         return onglet
 
+    def gestion_lot_reponses_serveur(self, messages):
+        """
+        Traite, dans l'ordre de réception, un lot de messages du serveur.
+
+        :param messages: Les messages reçus lors d'une même lecture.
+        :type messages: list
+        """
+
+        for message in messages:
+
+            self.gestion_reponses_serveur(message)
+
     def gestion_reponses_serveur(self, message):
         """
         Gère les réponses reçues du serveur en fonction
@@ -953,35 +1179,90 @@ class InterfacePrincipale(QMainWindow):
             self.activer_salons_autorises(salons_autorises)
 
         elif message.startswith("[PROTOCOLE]LISTE_MEMBRES_SALONS_PUBLICS:"):
-            print(message)
-            donnees = message.split(
-                "[PROTOCOLE]LISTE_MEMBRES_SALONS_PUBLICS:")[1]
-            print(donnees)
-            messages = donnees.split('\n')
+            _, version, donnees = message.split(":", 2)
+
+            try:
+
+                membres = json.loads(donnees)
+                self.liste_membres_salons_publics(int(version), membres)
+                self.mettre_a_jour_liste_membres(None)
+
+            except (ValueError, json.JSONDecodeError) as erreur:
+
+                print(f"Erreur de décodage JSON: {erreur}")
+
+        elif message.startswith("[PROTOCOLE]PRESENCE:"):
+
+            try:
+
+                presence = json.loads(message.split(":", 1)[1])
+                self.changement_presence(presence)
+
+            except json.JSONDecodeError as erreur:
+
+                print(f"Erreur de décodage JSON: {erreur}")
+
+        elif message.startswith(("[PROTOCOLE]MEMBRE_AJOUTE:",
+                                 "[PROTOCOLE]MEMBRE_RETIRE:")):
+            type_changement, version, nom_salon, etiquette = message.split(
+                ":", 3)
+            self.changement_membres(
+                int(version), nom_salon, etiquette,
+                type_changement == "[PROTOCOLE]MEMBRE_AJOUTE")
+
+        elif message.startswith("[PROTOCOLE]PAGE_HISTORIQUE_SALON:"):
+            _, nom_salon, sens, page = message.split(":", 3)
+            self.historique_salon_public(nom_salon, sens, page)
+
+        elif message.startswith("[PROTOCOLE]ERREUR_HISTORIQUE_PUBLIC:"):
+            nom_salon = message.split(":")[1]
 
-            for msg in messages:
+            if nom_salon in self.curseurs_historique:
 
-                if not msg.strip():
+                self.curseurs_historique[nom_salon]["en_cours"] = False
 
-                    continue
+        elif message.startswith("[PROTOCOLE]RESULTATS_RECHERCHE:"):
 
-                try:
+            try:
 
-                    membres = json.loads(msg)
-                    print(membres)
-                    self.liste_membres_salons_publics(membres)
-                    self.mettre_a_jour_liste_membres(None)
+                self.resultats_recherche(json.loads(message.split(":", 1)[1]))
 
-                except json.JSONDecodeError as erreur:
+            except json.JSONDecodeError as erreur:
 
-                    print(f"Erreur de décodage JSON: {erreur}")
+                print(f"Erreur de décodage JSON: {erreur}")
 
-        elif message.startswith("[PROTOCOLE]LISTE_MESSAGES_PUBLICS:"):
-            self.historique_salons_publics(message.split(
-                "[PROTOCOLE]LISTE_MESSAGES_PUBLICS:")[1])
+        elif message == "[PROTOCOLE]ERREUR_RECHERCHE":
 
-        elif message.startswith("[PROTOCOLE]LISTE_MESSAGES_PRIVES:"):
-            self.historique_salons_prives(message.split(':')[1])
+            self.recherche["en_cours"] = False
+            QMessageBox.warning(self, "Recherche",
+                                "La recherche est indisponible.")
+
+        elif message.startswith("[PROTOCOLE]LIMITE_DEBIT:"):
+
+            self.barre_statut.showMessage(
+                "Trop de messages envoyés : le dernier a été ignoré.", 5000)
+
+        elif message.startswith("[PROTOCOLE]MUET:"):
+
+            minutes = int(message.split(":")[1])
+            duree = (f"encore {minutes} minute(s)" if minutes >= 0
+                     else "pour une durée indéterminée")
+            self.barre_statut.showMessage(f"Vous êtes muet {duree}.", 5000)
+
+        elif message.startswith("[PROTOCOLE]BLOC_MESSAGES_PRIVES:"):
+
+            try:
+
+                self.historique_salons_prives(
+                    json.loads(message.split(":", 1)[1]))
+
+            except json.JSONDecodeError as erreur:
+
+                print(f"Erreur de décodage JSON: {erreur}")
+
+        elif message.startswith("[PROTOCOLE]FIN_MESSAGES_PRIVES:"):
+            print(f"Historique privé reçu : {message.split(':')[1]} "
+                  f"message(s)")
 
         elif message.startswith("[PROTOCOLE]MESSAGE_CHAT"):
             _, nom_salon, contenu = message.split(":", 2)
@@ -995,8 +1276,13 @@ class InterfacePrincipale(QMainWindow):
 
             nom_salon = message.split(":")[1]
             self.activer_salon(nom_salon)
-            self.client_serveur.envoi_message_serveur(
-                "[PROTOCOLE]REQUETE_MEMBRES_SALONS_PUBLICS:")
+
+        elif message.startswith("[PROTOCOLE]ACCES_EN_ATTENTE"):
+
+            nom_salon = message.split(":")[1]
+            self.barre_statut.showMessage(
+                f"Demande d'accès au salon {nom_salon} transmise à "
+                f"l'administrateur.", 5000)
 
         elif message == "BAN_CLIENT":
 
@@ -1014,7 +1300,19 @@ class InterfacePrincipale(QMainWindow):
             QMessageBox.critical(self, "Accès Refusé",
                                  f"Accès au salon {nom_salon} refusé.")
 
-    def liste_membres_salons_publics(self, membres):
+    def demander_membres_salons(self):
+        """
+        Demande au serveur la liste complète des membres des salons publics.
+
+        Les changements reçus d'ici la réponse sont mis de côté, puis
+        rejoués par-dessus la liste reçue.
+        """
+
+        self.resynchronisation_membres = True
+        self.client_serveur.envoi_message_serveur(
+            "[PROTOCOLE]REQUETE_MEMBRES_SALONS_PUBLICS:")
+
+    def liste_membres_salons_publics(self, version, membres):
         """
         Met à jour la liste des membres par salon à partir des données reçues
         du serveur.
@@ -1024,37 +1322,122 @@ class InterfacePrincipale(QMainWindow):
         Elle parcourt les données, extrait le nom et l'e-mail de chaque membre,
         puis les ajoute à la liste des membres du salon correspondant. Les
         informations sur les membres sont également stockées dans le
-        dictionnaire `self.infos_membre`.
+        dictionnaire `self.infos_membre`. Les changements mis de côté
+        pendant la demande sont ensuite rejoués.
 
+        :param version: La version de la liste des membres.
+        :type version: int
         :param membres: Les données des membres par salon au format
-        [(nom_salon, liste_membres_str)].
+        [(nom_salon, ["Nom Prenom:email", ...])].
         :type membres: list
         """
 
         self.membres_par_salon.clear()
         self.infos_membre = {}
 
-        for nom_salon, liste_membres_str in membres:
+        for nom_salon, etiquettes in membres:
 
             liste_membres = []
 
-            for membre_str in liste_membres_str.split(','):
+            for etiquette in etiquettes:
 
-                if membre_str:
+                if etiquette:
 
-                    nom_prenom, email = membre_str.split(":", 1)
+                    nom_prenom, email = etiquette.split(":", 1)
                     liste_membres.append(nom_prenom)
                     self.infos_membre[nom_prenom] = email
 
             self.membres_par_salon[nom_salon] = liste_membres
 
+        self.version_membres = version
+        self.resynchronisation_membres = False
+        en_attente = sorted(self.changements_membres_en_attente)
+        self.changements_membres_en_attente = []
+
+        for changement in en_attente:
+
+            self.changement_membres(*changement)
+
+    def changement_membres(self, version, nom_salon, etiquette, ajoute):
+        """
+        Applique un changement de membres poussé par le serveur.
+
+        Un changement déjà connu est ignoré. Si la version ne suit pas
+        celle de la liste locale, un changement a été manqué : la liste
+        complète est redemandée.
+
+        :param version: La version atteinte après ce changement.
+        :type version: int
+        :param nom_salon: Le nom du salon public.
+        :type nom_salon: str
+        :param etiquette: Le membre concerné, au format "Nom Prenom:email".
+        :type etiquette: str
+        :param ajoute: True si le membre rejoint le salon, False s'il le
+        quitte.
+        :type ajoute: bool
+        """
+
+        if self.resynchronisation_membres:
+
+            self.changements_membres_en_attente.append(
+                (version, nom_salon, etiquette, ajoute))
+            return
+
+        if version <= self.version_membres:
+
+            return
+
+        if version != self.version_membres + 1:
+
+            self.changements_membres_en_attente.append(
+                (version, nom_salon, etiquette, ajoute))
+            self.demander_membres_salons()
+            return
+
+        nom_prenom, email = etiquette.split(":", 1)
+        liste_membres = self.membres_par_salon.setdefault(nom_salon, [])
+
+        if ajoute:
+
+            self.infos_membre[nom_prenom] = email
+
+            if nom_prenom not in liste_membres:
+
+                liste_membres.append(nom_prenom)
+
+        elif nom_prenom in liste_membres:
+
+            liste_membres.remove(nom_prenom)
+
+        self.version_membres = version
+        self.mettre_a_jour_liste_membres(None)
+
+    def changement_presence(self, presence):
+        """
+        Met à jour les membres en ligne à partir d'un message de présence
+        du serveur, puis rafraîchit la liste des membres.
+
+        :param presence: Le dictionnaire reçu, avec les e-mails passés
+        "en_ligne" et "hors_ligne", et "complet" à True s'il remplace la
+        liste entière.
+        :type presence: dict
+        """
+
+        if presence.get("complet"):
+
+            self.membres_en_ligne.clear()
+
+        self.membres_en_ligne.update(presence.get("en_ligne", []))
+        self.membres_en_ligne.difference_update(presence.get("hors_ligne", []))
+        self.mettre_a_jour_liste_membres(None)
+
     def mettre_a_jour_liste_membres(self, index):
         """
         Met à jour la liste des membres selon l'onglet actif.
 
         Si `index` n'est pas spécifié, l'index de l'onglet actif est utilisé.
-        Affiche la liste des membres autorisés ou un message d'accès
-        non autorisé.
+        Affiche la liste des membres autorisés, précédés de ● s'ils sont
+        en ligne et de ○ sinon, ou un message d'accès non autorisé.
 
         :param index: Index de l'onglet à mettre à jour (par défaut, actif).
         :type index: int or None
@@ -1068,7 +1451,14 @@ class InterfacePrincipale(QMainWindow):
 
         if nom_salon in self.salons_autorises:
 
-            membres = self.membres_par_salon.get(nom_salon, [])
+            membres = []
+
+            # Les membres en ligne sont marqués d'un point plein
+            for nom in self.membres_par_salon.get(nom_salon, []):
+
+                en_ligne = self.infos_membre.get(nom) in self.membres_en_ligne
+                membres.append(f"{'●' if en_ligne else '○'} {nom}")
+
             self.champ_saisie.setEnabled(True)
             self.bouton_envoyer.setEnabled(True)
 
@@ -1085,38 +1475,116 @@ class InterfacePrincipale(QMainWindow):
         self.liste_membres.setEditTriggers(
             QListView.EditTrigger.NoEditTriggers)
 
-    def historique_salons_publics(self, historique_json):
+    def demander_historique_salon(self, nom_salon):
+        """
+        Demande au serveur la page d'historique précédant le plus ancien
+        message affiché dans un salon public.
+
+        Une seule demande est en cours à la fois par salon, et aucune
+        n'est envoyée une fois le début de l'historique atteint.
+
+        :param nom_salon: Le nom du salon public.
+        :type nom_salon: str
+        """
+
+        curseur = self.curseurs_historique.setdefault(
+            nom_salon, {"plus_ancien": 0, "encore": True,
+                        "en_cours": False})
+
+        if curseur["en_cours"] or not curseur["encore"]:
+
+            return
+
+        curseur["en_cours"] = True
+        self.client_serveur.envoi_message_serveur(
+            f"[PROTOCOLE]REQUETE_HISTORIQUE_SALON:{nom_salon}:AVANT:"
+            f"{curseur['plus_ancien']}:{self.taille_page_historique}")
+
+    def defilement_chat_salon(self, nom_salon, valeur):
+        """
+        Charge la page d'historique précédente lorsque l'utilisateur
+        remonte en haut du chat d'un salon.
+
+        :param nom_salon: Le nom du salon public.
+        :type nom_salon: str
+        :param valeur: La position de la barre de défilement.
+        :type valeur: int
+        """
+
+        chat = getattr(self, f"chat_{nom_salon.lower()}", None)
+
+        if chat and valeur == chat.verticalScrollBar().minimum():
+
+            self.demander_historique_salon(nom_salon)
+
+    def historique_salon_public(self, nom_salon, sens, page_json):
         """
-        Met à jour l'historique des salons publics avec les messages reçus
+        Ajoute au chat d'un salon public une page d'historique reçue
         du serveur.
 
-        Cette méthode prend en entrée l'historique des salons publics au format
-        JSON et le convertit en une liste de tuples (nom_salon, contenu).
-        Elle parcourt ensuite l'historique, récupère le contenu de chaque
-        message et l'ajoute à la liste des messages actuels du salon
-        correspondant.
+        Une page "AVANT" contient des messages plus anciens que ceux
+        affichés : elle est insérée en tête de liste, en conservant la
+        position de lecture. Une page "DEPUIS" est ajoutée en fin de liste.
 
-        :param historique_json: L'historique des salons publics au format JSON.
-        :type historique_json: str
+        :param nom_salon: Le nom du salon public.
+        :type nom_salon: str
+        :param sens: "AVANT" ou "DEPUIS".
+        :type sens: str
+        :param page_json: La page au format JSON
+        {"messages": [[id, message], ...], "encore": bool}.
+        :type page_json: str
         """
 
         try:
-            historique = json.loads(historique_json)
+            page = json.loads(page_json)
 
         except json.JSONDecodeError as erreur:
 
             print(f"Erreur de décodage JSON: {erreur}")
             return
 
-        for nom_salon, contenu in historique:
+        modele = getattr(self, f"modele_chat_{nom_salon.lower()}", None)
+        chat = getattr(self, f"chat_{nom_salon.lower()}", None)
+        curseur = self.curseurs_historique.setdefault(
+            nom_salon, {"plus_ancien": 0, "encore": True,
+                        "en_cours": False})
+
+        if not modele or not chat:
+
+            return
+
+        messages = [message for _, message in page["messages"]]
+
+        if sens == "AVANT":
+
+            premiere_page = curseur["plus_ancien"] == 0
+            curseur["en_cours"] = False
+            curseur["encore"] = page["encore"]
+
+            if page["messages"]:
+
+                curseur["plus_ancien"] = page["messages"][0][0]
 
-            chat = getattr(self, f"chat_{nom_salon.lower()}", None)
+            barre = chat.verticalScrollBar()
+            position = barre.value()
+            modele.setStringList(messages + modele.stringList())
+            chat.setModel(modele)
 
-            if chat:
+            # Le premier chargement place la vue sur les derniers messages
+            if premiere_page:
 
-                messages_actuels = chat.model().stringList()
-                messages_actuels.append(contenu)
-                chat.model().setStringList(messages_actuels)
+                chat.scrollToBottom()
+
+            else:
+
+                barre.setValue(position + len(messages))
+
+        else:
+
+            modele.setStringList(modele.stringList() + messages)
+            chat.setModel(modele)
+
+        chat.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
 
     def historique_salons_prives(self, historique):
         """
@@ -1127,13 +1595,104 @@ class InterfacePrincipale(QMainWindow):
         sous forme de liste de messages et les ajoute à l'élément de liste
         des messages privés.
 
-        :param historique: L'historique des messages privés.
+        L'historique arrive en plusieurs blocs : chacun est ajouté à la
+        suite des précédents.
+
+        :param historique: Un bloc de l'historique des messages privés.
         :type historique: list[str]
         """
 
-        for message in historique:
+        self.modele_chat_prive.setStringList(
+            self.modele_chat_prive.stringList() + historique)
+        self.liste_messages_prives.setModel(self.modele_chat_prive)
+
+    def lancer_recherche(self):
+        """
+        Lance la recherche du texte saisi dans le champ de recherche, en
+        partant des messages les plus récents.
+        """
+
+        texte = self.champ_recherche.text().strip()
+
+        if not texte:
+
+            return
+
+        self.recherche = {"texte": texte, "curseur": 0, "en_cours": False}
+        self.modele_resultats_recherche.setStringList([])
+        self.demander_resultats_recherche()
+
+    def demander_resultats_recherche(self):
+        """
+        Demande au serveur la page de résultats suivant le dernier résultat
+        reçu pour la recherche en cours.
+        """
+
+        if self.recherche["en_cours"]:
+
+            return
+
+        self.recherche["en_cours"] = True
+        self.client_serveur.envoi_message_serveur(
+            f"[PROTOCOLE]RECHERCHE:{self.recherche['curseur']}:"
+            f"{self.taille_page_historique}:{self.recherche['texte']}")
+
+    def resultats_recherche(self, page):
+        """
+        Ajoute une page de résultats de recherche à la fenêtre des
+        résultats, ouverte au besoin.
+
+        :param page: La page reçue du serveur : {"texte", "resultats",
+        "encore"}.
+        :type page: dict
+        """
 
-            self.liste_messages_prives.addItem(message)
+        if page["texte"] != self.recherche["texte"]:
+
+            return
+
+        self.recherche["en_cours"] = False
+        lignes = []
+
+        for resultat in page["resultats"]:
+
+            origine = (resultat["salon"]
+                       or f"MP {resultat['correspondant']}")
+            lignes.append(f"{origine} | {resultat['message']}")
+            self.recherche["curseur"] = resultat["id"]
+
+        self.modele_resultats_recherche.setStringList(
+            self.modele_resultats_recherche.stringList() + lignes)
+
+        if self.fenetre_recherche is None:
+
+            self.creer_fenetre_recherche()
+
+        self.fenetre_recherche.setWindowTitle(
+            f"Recherche : {self.recherche['texte']} "
+            f"({self.modele_resultats_recherche.rowCount()} résultat(s))")
+        self.bouton_suite_recherche.setEnabled(page["encore"])
+        self.fenetre_recherche.show()
+        self.fenetre_recherche.raise_()
+
+    def creer_fenetre_recherche(self):
+        """
+        Crée la fenêtre des résultats de recherche : la liste des messages
+        trouvés et un bouton demandant les résultats suivants.
+        """
+
+        self.fenetre_recherche = QDialog(self)
+        self.fenetre_recherche.resize(700, 450)
+        disposition = QVBoxLayout(self.fenetre_recherche)
+        self.liste_resultats_recherche = QListView(self.fenetre_recherche)
+        self.liste_resultats_recherche.setModel(
+            self.modele_resultats_recherche)
+        disposition.addWidget(self.liste_resultats_recherche)
+        self.bouton_suite_recherche = QPushButton("Résultats suivants",
+                                                  self.fenetre_recherche)
+        self.bouton_suite_recherche.clicked.connect(
+            self.demander_resultats_recherche)
+        disposition.addWidget(self.bouton_suite_recherche)
 
     def activer_salons_autorises(self, salons_autorises):
         """
@@ -1175,6 +1734,10 @@ class InterfacePrincipale(QMainWindow):
             if nom_salon not in self.salons_autorises:
 
                 self.salons_autorises.append(nom_salon)
+                chat.verticalScrollBar().valueChanged.connect(
+                    lambda valeur: self.defilement_chat_salon(nom_salon,
+                                                              valeur))
+                self.demander_historique_salon(nom_salon)
 
             self.mettre_a_jour_liste_membres(None)
 
@@ -1276,7 +1839,7 @@ class InterfacePrincipale(QMainWindow):
         :type index: QModelIndex
         """
 
-        nom_membre = index.data()
+        nom_membre = index.data().removeprefix("● ").removeprefix("○ ")
         email_membre = self.infos_membre.get(nom_membre)
 
         if email_membre:
@@ -1421,6 +1984,14 @@ class InterfacePrincipale(QMainWindow):
         self.barre_statut.setSizeGripEnabled(True)
         fenetre_interface_client.setStatusBar(self.barre_statut)
 
+        # Configuration du champ de recherche dans les messages
+        self.champ_recherche = QLineEdit(self.barre_statut)
+        self.champ_recherche.setObjectName(u"champ_recherche")
+        self.champ_recherche.setPlaceholderText("Rechercher dans les messages")
+        self.champ_recherche.setFixedWidth(300)
+        self.champ_recherche.returnPressed.connect(self.lancer_recherche)
+        self.barre_statut.addPermanentWidget(self.champ_recherche)
+
         # Configuration du widget principal
         self.widget_principal = QWidget(fenetre_interface_client)
         self.widget_principal.setObjectName(u"widget_principal")
@@ -1585,8 +2156,8 @@ def execution_programme():
     application = QApplication(sys.argv)
     interface_client = InterfaceAccueil()
     interface_client.show()
-    interface_client.client.signal_reponse.connect(
-        interface_client.gestion_reponses_serveur)
+    interface_client.client.signal_reponses.connect(
+        interface_client.gestion_lot_reponses_serveur)
     sys.exit(application.exec())
 
 
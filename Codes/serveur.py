@@ -1,1384 +1,9045 @@
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing.connection
+import multiprocessing
+import logging.handlers
+import http.server
+import collections
+import contextlib
 import datetime
+import bisect
+import heapq
+import itertools
+import struct
+import signal
+import select
+import array
+import mmap
+import zlib
 import threading
+import logging
+import weakref
+import tempfile
+import sqlite3
+import argparse
+import asyncio
 import socket
+import unicodedata
+import random
+import uuid
+import os
 import pymysql
+import queue
 import json
+import math
+import re
 import time
 import sys
 
+# Traces du serveur (connexions, messages, erreurs des clients), écrites
+# par un thread dédié : voir configuration_traces
+traces = logging.getLogger("serveur")
+ecrivain_traces = None
+
+
+def champs(**valeurs):
+    """
+    Donne les champs structurés d'une trace, à passer en extra.
+
+    :param valeurs: Les champs de la trace (ip, erreur...).
+    :return: Le dictionnaire extra de la trace.
+    """
+
+    return {"champs": valeurs}
+
 
 class ServeurDeMessagerie:
 
-    def __init__(self, hote, port, mysql):
+    # Durée maximale d'un envoi en flux, au-delà de laquelle un client qui
+    # ne lit plus est abandonné (s)
+    DUREE_MAX_FLUX = 300
+
+    def __init__(self, hote, port, stockage, mode="threads",
+                 nombre_executeurs=4, nombre_processus=1, file_envoi=None,
+                 tramage=None, taille_cache_identites=10000, pool=None,
+                 persistance=None, taille_page_historique=200,
+                 taille_historique_recent=200, controle_requetes=False,
+                 delai_presence=0.5, taille_bloc_flux=500, journal=None,
+                 dossier_recherche=None, limites_debit=None,
+                 chemin_socket_admin=None, metriques=None,
+                 echantillonnage_messages=100):
         """
         Constructeur de la classe ServeurDeMessagerie.
 
         :param hote: L'adresse IP  du serveur.
         :param port: Le port sur lequel le serveur écoutera les connexions.
-        :param mysql: Les informations de configuration pour la BDD MySQL.
+        :param stockage: Le moteur de stockage (StockageMySQL ou
+        StockageSQLite).
+        :param mode: Le mode de service des connexions, "threads" (un thread
+        par client) ou "asyncio" (une seule boucle d'événements).
+        :param nombre_executeurs: En mode asyncio, le nombre de threads
+        auxquels sont déléguées les requêtes bloquantes vers la BDD (et,
+        à part, celui des threads des envois en flux).
+        :param nombre_processus: Le nombre de processus travailleurs
+        partageant le port via SO_REUSEPORT (1 = un seul processus).
+        :param file_envoi: Les paramètres des files d'envoi par connexion
+        (seuil_haut, seuil_bas en octets, et politique appliquée aux
+        clients trop lents : "abandon", "fusion" ou "deconnexion").
+        :param tramage: Les paramètres de réception (taille_tampon et
+        taille_max_trame, en octets).
+        :param taille_cache_identites: Le nombre maximal de clients gardés
+        dans le cache des identités (id, nom, prénom, email).
+        :param pool: Les paramètres du pool de connexions à la BDD (taille_min,
+        taille_max, delai_acquisition et intervalle_verification).
+        :param persistance: Les paramètres de l'écriture différée des
+        messages (taille_lot et delai_lot en secondes).
+        :param taille_page_historique: Le nombre maximal de messages
+        renvoyés par page d'historique.
+        :param taille_historique_recent: Le nombre de derniers messages
+        gardés en mémoire pour chaque salon public.
+        :param controle_requetes: True pour qu'une commande dépassant son
+        budget de requêtes lève une erreur (mode test).
+        :param delai_presence: L'intervalle de regroupement des changements
+        de présence poussés aux clients, en secondes.
+        :param taille_bloc_flux: Le nombre de lignes par bloc des
+        résultats envoyés en flux (historique privé).
+        :param journal: Les paramètres du journal des messages publics
+        (dossier, taille_segment, delai_synchronisation et
+        intervalle_compactage), les messages publics étant stockés en BDD
+        sans dossier.
+        :param dossier_recherche: Le dossier de l'index de recherche des
+        messages (None pour désactiver la recherche).
+        :param limites_debit: Les paramètres de la limitation du débit des
+        commandes clients (regles, politique, attente_max, seuil_mute,
+        fenetre_mute, duree_mute et retention_compteurs).
+        :param chemin_socket_admin: Le chemin de la socket Unix recevant
+        les lots d'administration (None pour ne pas l'ouvrir).
+        :param metriques: Les paramètres du point d'accès HTTP des
+        métriques (hote et port, None pour ne pas l'ouvrir).
+        :param echantillonnage_messages: Au niveau DEBUG, un message reçu
+        sur combien est tracé (aucun aux autres niveaux).
         """
 
         self.hote = hote
         self.port = port
-        self.mysql = mysql
+        self.stockage = stockage
+        self.mode = mode
+        self.nombre_executeurs = nombre_executeurs
+        self.boucle = None
+        self.evenement_arret = None
+        self.executeur_flux = None
+        self.nombre_processus = nombre_processus
+        self.role = "unique"
+        self.bus = None
+        self.file_envoi = file_envoi or {}
+        self.tramage = tramage or {}
         self.clients = {}
         self.sessions = {}
-        self.lien_mysql = None
-        self.requete_acces_en_cours = False
-        self.verrou_requete_acces = threading.Lock()
+        self.index_salons = IndexSalons()
+        self.verrou_membres = threading.Lock()
+        self.cache_identites = CacheIdentites(taille_cache_identites)
+        self.registre_sanctions = RegistreSanctions()
+        self.limiteur_debit = LimiteurDebit(**(limites_debit or {}))
+        self.pool = pool or {}
+        self.pool_bdd = None
+        self.acces_donnees = None
+        self.controle_requetes = controle_requetes
+        self.persistance = persistance or {}
+        self.ecriture_messages = None
+        self.parametres_journal = journal or {}
+        self.journal = None
+        self.dossier_recherche = dossier_recherche
+        self.index_recherche = None
+        self.taille_page_historique = taille_page_historique
+        self.taille_bloc_flux = taille_bloc_flux
+        self.historique_recent = HistoriqueRecent(taille_historique_recent)
+        self.compteur_messages = None
+        self.registre_presence = RegistrePresence(delai_presence)
+        self.verrou_presence = threading.Lock()
+        self.demandes_acces = DemandesAcces()
+        self.chemin_socket_admin = chemin_socket_admin
+        self.socket_admin = None
+        self.parametres_metriques = metriques
+        self.metriques = Metriques()
+        self.metriques.ajouter_jauges(self.jauges_metriques)
+        self.echantillonnage_messages = (
+            echantillonnage_messages
+            if traces.isEnabledFor(logging.DEBUG) else 0)
+        self.compteur_messages_recus = itertools.count()
+        self.file_admin = queue.Queue()
+        self.tampon_console = b""
+        self.fin_console = False
         self.arret_serveur = False
-        self.etat_commande = "commande"
 
-    def connexion_mysql(self):
+    def connexion_bdd(self):
         """
-        Établit une connexion à la base de données MySQL en utilisant
-        les informations de configuration.
+        Ouvre le pool de connexions à la base de données du moteur de
+        stockage choisi.
         """
 
         try:
 
-            self.lien_mysql = pymysql.connect(**self.mysql)
-            print("Connexion à la BDD réussie.")
+            self.pool_bdd = PoolConnexions(self.stockage.ouvrir, **self.pool)
+            self.pool_bdd.remplir()
+            self.acces_donnees = AccesDonnees(self.pool_bdd, self.stockage,
+                                              self.controle_requetes,
+                                              self.metriques)
+            print(f"Connexion à la BDD ({self.stockage.nom}) réussie.")
 
         except Exception as erreur:
 
             print(f"Erreur de connexion à la BDD: {erreur}")
-            self.lien_mysql = None
+            self.pool_bdd = None
 
-    def demarrage_serveur(self):
+    def migration_schema(self):
         """
-        Démarrage du serveur de messagerie.
+        Met le schéma de la BDD à jour avant de servir les clients.
 
-        Cette méthode configure et démarre le serveur comme cela :
-        1. Tente de se connecter à la base de données MySQL.
-        2. Vérifie si la connexion à la base de données a réussi.
-        3. Crée un socket pour écouter les connexions entrantes.
-        4. Démarre un thread pour l'authentification de l'administrateur.
-        5. Boucle principale pour gérer les connexions entrantes des clients.
-        6. Finalement, fermeture propre de toutes les connexions.
+        Un échec n'empêche pas le démarrage : les migrations manquantes
+        seront retentées au prochain lancement.
         """
-        
-        self.connexion_mysql()
-
-        if not self.lien_mysql:
-
-            print("Impossible de démarrer le serveur sans connexion à la BDD.")
-            return
-
-        socket_serveur = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        socket_serveur.bind((self.hote, self.port))
-        socket_serveur.listen()
-        print(f"Serveur lancé sur l'hôte {self.hote}, port {self.port}.\n")
-
-        # Configuration du thread d'authentification administrateur
-        thread_authentification_admin = threading.Thread(
-            target=self.authentification_administrateur)
-        thread_authentification_admin.start()
 
         try:
 
-            while not self.arret_serveur:
-
-                socket_serveur.settimeout(1)
+            version = MigrationsSchema(self.pool_bdd,
+                                       self.stockage).appliquer()
+            print(f"Schéma de la BDD en version {version}.")
 
-                try:
-                    socket_client, adresse_client = socket_serveur.accept()
+        except Exception as erreur:
 
-                except socket.timeout:
+            print(f"\nErreur de la migration du schéma : {erreur}")
 
-                    continue
+    def chargement_index_salons(self):
+        """
+        Charge en mémoire les salons publics et leurs membres depuis
+        les tables salons_publics et membres_salons_publics.
+        """
 
-                thread_client = threading.Thread(
-                    target=self.gestion_clients,
-                    args=(socket_client, adresse_client))
-                thread_client.start()
+        try:
 
-        except KeyboardInterrupt:
+            with self.acces_donnees.transaction() as transaction:
 
-            print("Arrêt du serveur...")
+                self.index_salons.charger_salons(
+                    transaction.tous("salons_publics"))
+                self.index_salons.charger(transaction.tous("membres_salons"))
 
-        finally:
+        except Exception as erreur:
 
-            self.fermeture_connexions_clients()
-            socket_serveur.close()
+            print(f"\nErreur du chargement des membres des salons : "
+                  f"{erreur}")
 
-    def authentification_client(self, email, mot_de_passe):
+    def chargement_compteur_messages(self):
         """
-        Cette méthode tente d'authentifier un client en vérifiant
-        son email et son mot de passe dans la base de données.
-
-        :param email: L'adresse e-mail du client.
-        :param mot_de_passe: Le mot de passe du client.
+        Initialise le compteur des ID de messages à partir du plus grand
+        ID déjà en BDD ou dans le journal des messages.
 
-        :return: Un tuple contenant l'ID du client et ses permissions
-        s'il est authentifié, sinon (None, None).
+        Les ID sont attribués par le serveur, avant l'écriture différée,
+        pour que l'historique en mémoire et la BDD partagent les mêmes
+        curseurs. Le compteur est créé avant le lancement des travailleurs,
+        qui en héritent et le partagent.
         """
 
         try:
 
-            connexion = self.lien_mysql.cursor()
-
-            connexion.execute(
-                "SELECT id_client, mot_de_passe, permission "
-                "FROM clients WHERE email = %s", (email,))
-            resultat = connexion.fetchone()
+            (id_max,) = self.acces_donnees.un("id_message_max")
 
-            if resultat and resultat[1] == mot_de_passe:
+            if self.journal is not None:
 
-                id_client, _, permission = resultat
-                connexion.close()
-                return id_client, permission
+                id_max = max(id_max, self.journal.id_max())
 
-            connexion.close()
-            return None, None
+            self.compteur_messages = multiprocessing.get_context(
+                "fork").Value("q", id_max)
 
         except Exception as erreur:
 
-            print(f"\nErreur lors de l'authentification : {erreur}")
-            return None, None
+            print(f"\nErreur de l'initialisation du compteur des messages : "
+                  f"{erreur}")
 
-    def inscription_client(self, nom, prenom, email, mot_de_passe, permission):
+    def allouer_id_message(self):
         """
-        Cette méthode tente d'inscrire un nouveau client
-        en vérifiant d'abord si l'email est déjà utilisé.
+        Attribue l'ID du prochain message, public ou privé.
 
-        Si l'email n'est pas déjà enregistré, elle insère
-        le nouveau client dans la base de données.
+        :return: Le nouvel ID de message.
+        """
 
-        :param nom: Le nom du client.
-        :param prenom: Le prénom du client.
-        :param email: L'adresse e-mail du client.
-        :param mot_de_passe: Le mot de passe du client.
-        :param permission: Les permissions du client.
+        with self.compteur_messages.get_lock():
 
-        :return: "SUCCES_INSCRIPTION" en cas de succès,
-        sinon un message d'échec.
+            self.compteur_messages.value += 1
+            return self.compteur_messages.value
+
+    def chargement_historique_recent(self):
+        """
+        Charge en mémoire les derniers messages de chaque salon public.
         """
 
-        try:
+        capacite = self.historique_recent.capacite
 
-            connexion = self.lien_mysql.cursor()
+        for nom_salon, id_salon_public in self.index_salons.ids_salons.items():
 
-            # Vérification si l'email est déjà utilisé
-            connexion.execute("SELECT COUNT(*) FROM clients WHERE email = %s",
-                              (email,))
-            (nombre,) = connexion.fetchone()
+            try:
 
-            if nombre > 0:
+                messages, encore = self.lecture_page_historique(
+                    id_salon_public, "AVANT", 0, capacite)
+                self.historique_recent.charger(nom_salon, messages,
+                                               not encore)
 
-                connexion.close()
-                return "ECHEC_INSCRIPTION"
+            except Exception as erreur:
 
-            # Insertion du nouveau client
-            connexion.execute("INSERT INTO clients "
-                              "(nom, prenom, email, mot_de_passe, permission) "
-                              "VALUES (%s, %s, %s, %s, %s)",
-                              (nom, prenom, email, mot_de_passe, permission))
-            self.lien_mysql.commit()
+                print(f"\nErreur du chargement de l'historique de "
+                      f"{nom_salon} : {erreur}")
 
-            # Récupération de l'ID du client nouvellement inscrit
-            connexion.execute("SELECT LAST_INSERT_ID()")
-            (id_client,) = connexion.fetchone()
+    def ouverture_index_recherche(self):
+        """
+        Ouvre l'index de recherche des messages, puis y ajoute les messages
+        stockés depuis sa dernière mise à jour (tous à la création).
 
-            # Récupération de l'ID du salon "General"
-            connexion.execute(
-                "SELECT id_salon_public "
-                "FROM salons_publics WHERE nom_salon = 'General'")
-            (id_salon_general,) = connexion.fetchone()
+        Les messages manquants sont lus en flux en BDD, puis dans le
+        journal des messages s'il est ouvert.
+        """
 
-            # Vérification si le salon "General" existe
-            if id_salon_general is None:
+        if not self.dossier_recherche:
 
-                print("\nErreur: Salon 'General' introuvable.")
-                return "ECHEC_INSCRIPTION : Salon 'General' introuvable."
+            return
 
-            # Ajout du client au salon "General"
-            connexion.execute(
-                "INSERT INTO membres_salons_publics "
-                "(id_client, id_salon_public) VALUES (%s, %s)",
-                (id_client, id_salon_general))
-            self.lien_mysql.commit()
+        try:
 
-            connexion.close()
-            return "SUCCES_INSCRIPTION"
+            index = IndexRecherche(self.dossier_recherche)
+            index.ouvrir()
+            id_max = index.id_max()
+            nombre = 0
 
-        except Exception as erreur:
+            for lignes in self.acces_donnees.flux(
+                    "messages_a_indexer", (id_max,), self.taille_bloc_flux):
 
-            print(f"\nErreur lors de l'inscription : {erreur}")
-            return "ECHEC_INSCRIPTION : Erreur serveur."
+                for (id_message, horodatage, nom, prenom, contenu,
+                     id_salon_public, id_salon_prive) in lignes:
 
-    def ban_client(self, email_client, motif):
-        """
-        Bannir un client en enregistrant une sanction dans la base de données.
+                    if id_salon_public is not None:
 
-        Cette méthode enregistre une sanction de type "ban"
-        pour un client spécifié, avec un motif par défaut.
+                        entete = (f"[{horodatage:%Y-%m-%d %H:%M:%S}] "
+                                  f"{nom}/{prenom} : ")
+                        portee = id_salon_public
 
-        :param email_client: L'adresse e-mail du client à bannir.
-        :param motif: Le motif du bannissement.
-        """
+                    else:
 
-        with self.lien_mysql.cursor() as curseur:
+                        entete = f"[{horodatage:%Y-%m-%d %H:%M:%S}] "
+                        portee = -id_salon_prive
 
-            curseur.execute("SELECT COUNT(*) FROM clients WHERE email = %s",
-                            (email_client,))
-            result = curseur.fetchone()
+                    index.ajouter(id_message, portee, entete + contenu,
+                                  len(entete))
+                    nombre += 1
 
-            if result[0] > 0:
+            for id_salon_public in (self.index_salons.ids_salons.values()
+                                    if self.journal else ()):
 
-                curseur.execute("""
-                    INSERT INTO sanctions 
-                    (type_sanction, motif_sanction, email_client, ip_client)
-                    VALUES ('ban', %s, %s, 
-                    (SELECT ip_client FROM historique_ip 
-                    WHERE email_client = %s))
-                """, (motif, email_client, email_client))
+                curseur, encore = id_max, True
 
-                self.lien_mysql.commit()
-                print(f"\n{email_client} a été banni.")
+                while encore:
 
-                self.deconnecter_clients_par_email(email_client)
+                    messages, encore = self.journal.page(
+                        id_salon_public, "DEPUIS", curseur,
+                        self.taille_bloc_flux)
 
-            else:
+                    for id_message, message_formate in messages:
 
-                print(f"\nAucun client existant pour l'email {email_client} !")
+                        index.ajouter(id_message, id_salon_public,
+                                      message_formate,
+                                      message_formate.find(" : ") + 3)
+                        curseur = id_message
+                        nombre += 1
 
-    def unban_client(self, email_client):
-        """
-        Révoquer le bannissement d'un client en supprimant
-        les sanctions de type "ban" dans la base de données.
+            self.index_recherche = index
+            messages, termes, _, _, _ = index.statistiques()
+            print(f"Index de recherche ouvert : {messages} message(s), "
+                  f"{termes} terme(s), dont {nombre} message(s) indexé(s) "
+                  f"au démarrage.")
 
-        :param email_client: L'adresse e-mail du client
-        dont le bannissement doit être révoqué.
+        except Exception as erreur:
+
+            print(f"\nErreur de l'ouverture de l'index de recherche : "
+                  f"{erreur}")
+
+    def indexation_message(self, id_message, portee, message_formate,
+                           debut_contenu):
+        """
+        Ajoute un message à l'index de recherche, s'il est ouvert.
+
+        :param id_message: L'ID du message.
+        :param portee: L'ID du salon public, ou l'opposé de l'ID du salon
+        privé.
+        :param message_formate: Le message tel qu'affiché (pour un message
+        public, celui qui est diffusé).
+        :param debut_contenu: La position du contenu dans message_formate,
+        après l'en-tête.
         """
 
-        with self.lien_mysql.cursor() as curseur:
+        if self.index_recherche is None:
 
-            curseur.execute("""
-            SELECT COUNT(*) FROM sanctions
-             WHERE type_sanction = 'ban' AND email_client = %s
-             """, (email_client,))
-            resultat = curseur.fetchone()
+            return
 
-            if resultat[0] > 0:
+        try:
 
-                curseur.execute("""
-                DELETE FROM sanctions 
-                WHERE type_sanction = 'ban' AND email_client = %s
-                """, (email_client,))
-                self.lien_mysql.commit()
-                print(f"\n{email_client} a été débanni.")
+            self.index_recherche.ajouter(id_message, portee, message_formate,
+                                         debut_contenu)
 
-            else:
+        except Exception as erreur:
 
-                print(f"\nAucune sanction BAN existante pour l'email "
-                      f"{email_client}")
+            traces.error("Erreur de l'indexation du message",
+                         extra=champs(id_message=id_message, erreur=erreur))
 
-    def kick_client(self, email_client, duree, motif="Kick administratif."):
+    def recherche_messages(self, id_client, email_client, curseur, nombre,
+                           texte):
         """
-        Cette méthode enregistre une sanction de type "kick" pour un client
-        spécifié, en incluant la durée et le motif de l'exclusion.
-
-        :param email_client: Adresse e-mail du client à exclure temporairement.
-        :param duree: La durée de l'exclusion temporaire en minutes.
-        :param motif: Le motif de l'exclusion.
+        Cherche les messages contenant tous les mots d'un texte parmi ceux
+        des salons publics dont le client est membre et de ses salons
+        privés, du plus récent au plus ancien.
+
+        :param id_client: L'ID du client demandeur.
+        :param email_client: L'adresse e-mail du client demandeur.
+        :param curseur: L'ID de message en dessous duquel chercher (0 pour
+        les plus récents, puis l'ID du dernier résultat reçu).
+        :param nombre: Le nombre de résultats souhaité, borné par
+        taille_page_historique.
+        :param texte: Le texte recherché.
+        :return: Une chaîne "[PROTOCOLE]RESULTATS_RECHERCHE:" suivie d'un
+        objet JSON {"texte": texte, "resultats": [{"id", "salon",
+        "correspondant", "message"}, ...], "encore": bool}, "salon" étant
+        null pour un message privé et "correspondant" pour un message
+        public.
         """
 
-        with self.lien_mysql.cursor() as curseur:
+        if self.index_recherche is None or id_client is None:
 
-            curseur.execute("""
-            SELECT COUNT(*) FROM clients WHERE email = %s
-            """, (email_client,))
-            result = curseur.fetchone()
+            return "[PROTOCOLE]ERREUR_RECHERCHE"
 
-            if result[0] > 0:
+        nombre = max(1, min(nombre, self.taille_page_historique))
 
-                curseur.execute("""
-                INSERT INTO sanctions 
-                (type_sanction, duree_sanction, motif_sanction, 
-                email_client, ip_client)
-                VALUES ('kick', %s, %s, %s, 
-                (SELECT ip_client FROM historique_ip WHERE email_client = %s))
-                """, (duree, motif, email_client, email_client))
-                self.lien_mysql.commit()
+        try:
 
-                print(f"\n{email_client} a été exclu temporairement pour "
-                      f"{duree} minutes.")
+            correspondants = {}
 
-                self.deconnecter_clients_par_email(email_client)
+            for id_salon_prive, email_1, email_2 in self.acces_donnees.tous(
+                    "salons_prives_client", (email_client, email_client)):
 
-            else:
+                correspondants[-id_salon_prive] = (
+                    email_2 if email_1 == email_client else email_1)
 
-                print(f"\nAucun client existant pour l'email {email_client} !")
+            salons = {id_salon_public: nom_salon for nom_salon, id_salon_public
+                      in self.index_salons.ids_salons.items()}
+            portees = self.index_salons.salons_membre(id_client)
+            portees.update(correspondants)
+            resultats, encore = self.index_recherche.chercher(
+                texte, portees, curseur, nombre)
 
-    def unkick_client(self, email_client):
-        """
-        Révoquer l'exclusion temporaire d'un client en supprimant
-        les sanctions de type "kick" dans la base de données.
+        except Exception as erreur:
 
-        :param email_client: L'adresse e-mail du client dont
-        l'exclusion temporaire doit être révoquée.
+            traces.error("Erreur de la recherche des messages",
+                         extra=champs(erreur=erreur))
+            return "[PROTOCOLE]ERREUR_RECHERCHE"
+
+        page = json.dumps({
+            "texte": texte,
+            "resultats": [{"id": id_message,
+                           "salon": salons.get(portee),
+                           "correspondant": correspondants.get(portee),
+                           "message": message}
+                          for id_message, portee, message in resultats],
+            "encore": encore})
+        return f"[PROTOCOLE]RESULTATS_RECHERCHE:{page}"
+
+    def chargement_sanctions(self):
+        """
+        Charge en mémoire les sanctions encore actives de la table
+        sanctions.
         """
 
-        with self.lien_mysql.cursor() as curseur:
-
-            curseur.execute("""
-            SELECT COUNT(*) FROM sanctions 
-            WHERE type_sanction = 'kick' AND email_client = %s
-            """, (email_client,))
-            resultat = curseur.fetchone()
+        try:
 
-            if resultat[0] > 0:
+            self.registre_sanctions.charger(
+                self.acces_donnees.tous("sanctions"))
 
-                curseur.execute("""
-                DELETE FROM sanctions 
-                WHERE type_sanction = 'kick' AND email_client = %s
-                """, (email_client,))
-                self.lien_mysql.commit()
-                print(f"\nLe kick sur {email_client} a été révoqué.")
+        except Exception as erreur:
 
-            else:
+            print(f"\nErreur du chargement des sanctions : {erreur}")
 
-                print(f"\nAucune sanction KICK existante pour l'email "
-                      f"{email_client}.")
+    def enregistrement_sanction(self, transaction):
+        """
+        Reporte dans le registre des sanctions, de ce processus et des
+        autres, une sanction qui vient d'être insérée en BDD.
 
-    def grant_access(self, nom_salon, email_client):
+        :param transaction: La transaction ayant inséré la sanction.
         """
-        Ajoute un client en tant que membre d'un salon public spécifié.
 
-        Cette méthode vérifie d'abord l'existence du salon et du client
-        avant de l'ajouter comme membre du salon.
+        type_sanction, email_client, ip_client, horodatage, duree = (
+            transaction.un("sanction_par_id", (transaction.dernier_id,)))
 
-        :param nom_salon: Le nom du salon public.
-        :param email_client: L'adresse e-mail du client à ajouter au salon.
-        """
+        self.registre_sanctions.ajouter(type_sanction, email_client,
+                                        ip_client, horodatage, duree)
+        self.publier_bus({"type": "sanction", "action": "ajout",
+                          "sanction": type_sanction, "email": email_client,
+                          "ip": ip_client,
+                          "horodatage": horodatage.isoformat(),
+                          "duree": duree})
 
-        with self.lien_mysql.cursor() as curseur:
+    def retrait_sanction(self, type_sanction, email_client):
+        """
+        Retire du registre des sanctions, de ce processus et des autres,
+        les sanctions d'un type supprimées en BDD pour un email.
 
-            curseur.execute("""
-            SELECT id_salon_public FROM salons_publics WHERE nom_salon = %s
-            """, (nom_salon,))
-            salon = curseur.fetchone()
+        :param type_sanction: "ban", "kick" ou "mute".
+        :param email_client: L'adresse e-mail du client.
+        """
 
-            curseur.execute("""
-            SELECT id_client FROM clients WHERE email = %s
-            """, (email_client,))
-            client = curseur.fetchone()
+        self.registre_sanctions.retirer(type_sanction, email_client)
+        self.publier_bus({"type": "sanction", "action": "retrait",
+                          "sanction": type_sanction, "email": email_client})
 
-            if salon and client:
+    def mise_a_jour_acces_salon(self, id_client, nom_salon, accorde,
+                                etiquette=None):
+        """
+        Reporte dans l'index des salons un accès ajouté ou retiré en BDD,
+        dans ce processus et dans les autres.
 
-                curseur.execute("""
-                SELECT COUNT(*) FROM membres_salons_publics 
-                WHERE id_client = %s AND id_salon_public = %s
-                """, (client[0], salon[0]))
-                est_membre = curseur.fetchone()[0]
+        :param id_client: L'ID du client concerné.
+        :param nom_salon: Le nom du salon public.
+        :param accorde: True si l'accès est ajouté, False s'il est retiré.
+        :param etiquette: Le libellé "Nom Prenom:email" du client, à
+        fournir s'il vient d'être créé.
+        """
 
-                if est_membre == 0:
+        if accorde and etiquette is None:
 
-                    curseur.execute("""
-                    INSERT INTO 
-                    membres_salons_publics (id_client, id_salon_public) 
-                    VALUES (%s, %s)
-                    """, (client[0], salon[0]))
-                    self.lien_mysql.commit()
+            etiquette = self.index_salons.etiquette(id_client)
 
-                    print(f"\n{email_client} a été ajouté au salon "
-                          f"{nom_salon}.")
+            if etiquette is None:
 
-                else:
+                identite = self.obtenir_identite_par_id(id_client)
 
-                    print(
-                        f"\n{email_client} est déjà membre de {nom_salon}.")
+                if identite is not None:
 
-            else:
+                    _, nom, prenom, email = identite
+                    etiquette = f"{nom} {prenom}:{email}"
 
-                print("\nSalon ou client introuvable.")
+        self.application_acces_salon(id_client, nom_salon, accorde,
+                                     etiquette)
+        self.publier_bus({"type": "acces_salon", "id_client": id_client,
+                          "salon": nom_salon, "accorde": accorde,
+                          "etiquette": etiquette})
 
-    def revoke_access(self, nom_salon, email_client):
+    def application_acces_salon(self, id_client, nom_salon, accorde,
+                                etiquette):
         """
-        Retire un client d'un salon public spécifié.
-
-        Cette méthode vérifie d'abord si le client est membre du salon
-        avant de le retirer.
+        Applique un changement de membres à l'index de ce processus et
+        pousse le changement à ses clients authentifiés.
 
+        :param id_client: L'ID du client concerné.
         :param nom_salon: Le nom du salon public.
-        :param email_client: L'adresse e-mail du client à retirer du salon.
+        :param accorde: True si l'accès est ajouté, False s'il est retiré.
+        :param etiquette: Le libellé "Nom Prenom:email" du client.
         """
 
-        with self.lien_mysql.cursor() as curseur:
+        self.application_acces_salons([(id_client, nom_salon, accorde,
+                                        etiquette)])
 
-            curseur.execute("""
-            SELECT id_salon_public FROM salons_publics WHERE nom_salon = %s
-            """, (nom_salon,))
-            salon = curseur.fetchone()
+    def application_acces_salons(self, changements):
+        """
+        Applique des changements de membres à l'index de ce processus et
+        les pousse à ses clients authentifiés, sous la forme
+        "[PROTOCOLE]MEMBRE_AJOUTE:<version>:<salon>:<Nom Prenom:email>"
+        ou "[PROTOCOLE]MEMBRE_RETIRE:...", en un seul parcours des
+        connexions.
+
+        Un client qui reçoit une version qui ne suit pas la sienne a
+        manqué un changement et redemande la liste complète.
+
+        :param changements: Les tuples (ID du client, nom du salon,
+        True pour un ajout ou False pour un retrait, libellé
+        "Nom Prenom:email" du client).
+        """
 
-            curseur.execute("""
-            SELECT id_client FROM clients WHERE email = %s
-            """, (email_client,))
-            client = curseur.fetchone()
+        # Le verrou garantit que les versions partent dans l'ordre et
+        # qu'aucune ne s'intercale dans l'envoi d'une liste complète.
+        with self.verrou_membres:
 
-            if salon and client:
+            messages = []
 
-                curseur.execute("""
-                SELECT COUNT(*) FROM membres_salons_publics 
-                WHERE id_client = %s AND id_salon_public = %s
-                """, (client[0], salon[0]))
-                est_membre = curseur.fetchone()[0]
+            for id_client, nom_salon, accorde, etiquette in changements:
 
-                if est_membre > 0:
+                if accorde:
 
-                    curseur.execute("""
-                    DELETE FROM membres_salons_publics 
-                    WHERE id_client = %s AND id_salon_public = %s
-                    """, (client[0], salon[0]))
-                    self.lien_mysql.commit()
-                    print(f"\n{email_client} a été retiré du salon "
-                          f"{nom_salon}.")
+                    version = self.index_salons.ajouter_membre(
+                        id_client, nom_salon, etiquette)
+                    type_changement = "MEMBRE_AJOUTE"
 
                 else:
 
-                    print(
-                        f"\n{email_client} n'est pas déjà membre "
-                        f"du salon {nom_salon}.")
+                    etiquette = self.index_salons.etiquette(id_client)
+                    version = self.index_salons.retirer_membre(id_client,
+                                                               nom_salon)
+                    type_changement = "MEMBRE_RETIRE"
 
-            else:
+                if version is not None and etiquette is not None:
 
-                print("\nSalon ou client introuvable.")
+                    messages.append(f"[PROTOCOLE]{type_changement}:"
+                                    f"{version}:{nom_salon}:{etiquette}")
 
-    def verification_sanctions(self, email_client):
-        """
-        Vérifie les sanctions actives pour un client spécifié.
+            if not messages:
 
-        :param email_client: L'adresse e-mail du client.
-        :return: "BAN" si le client est banni, "KICK" si le client est kické,
-                 "NONE" si aucune sanction active.
-        """
+                return
 
-        with self.lien_mysql.cursor() as curseur:
+            for connexion in self.index_salons.connexions_authentifiees():
 
-            curseur.execute("""
-            SELECT COUNT(*) FROM sanctions 
-            WHERE type_sanction = 'ban' AND email_client = %s
-            """, (email_client,))
+                try:
 
-            if curseur.fetchone()[0] > 0:
+                    for message in messages:
 
-                return "BAN"
+                        connexion.envoyer(message)
 
-            curseur.execute("""
-            SELECT duree_sanction, 
-            TIMESTAMPDIFF(MINUTE, horodatage_sanction, NOW()) 
-            AS temps_ecoule
-            FROM sanctions 
-            WHERE type_sanction = 'kick' AND email_client = %s
-            """, (email_client,))
+                except Exception as erreur:
 
-            for ligne in curseur.fetchall():
+                    traces.warning("Erreur de l'envoi des membres",
+                                   extra=champs(ip=connexion.ip_client,
+                                                erreur=erreur))
 
-                duree_sanction, temps_ecoule = ligne
+    def connexion_presence(self, connexion, id_client, email):
+        """
+        Compte une connexion authentifiée dans la présence du client,
+        dans ce processus et dans les autres.
 
-                if temps_ecoule < duree_sanction:
+        :param connexion: La connexion du client.
+        :param id_client: L'ID du client authentifié.
+        :param email: L'adresse e-mail du client.
+        """
 
-                    return "KICK"
+        self.annonce_presence(
+            self.registre_presence.connecter(connexion, id_client, email))
 
-            return "NONE"
+    def deconnexion_presence(self, connexion):
+        """
+        Retire une connexion fermée de la présence de son client, dans ce
+        processus et dans les autres.
 
-    def deconnecter_clients_par_email(self, email_client):
+        :param connexion: La connexion fermée.
+        """
 
-        with self.lien_mysql.cursor() as curseur:
+        self.annonce_presence(self.registre_presence.deconnecter(connexion))
 
-            curseur.execute("""
-            SELECT DISTINCT ip_client FROM historique_ip 
-            WHERE email_client = %s
-            """, (email_client,))
+    def annonce_presence(self, variations):
+        """
+        Publie sur le bus les variations de connexions d'un client.
 
-            ips_a_deconnecter = [ligne[0] for ligne in curseur.fetchall()]
+        :param variations: Les tuples (id_client, email, variation).
+        """
 
-            for ip in ips_a_deconnecter:
+        for id_client, email, variation in variations:
 
-                if ip in self.clients:
+            self.publier_bus({"type": "presence", "id_client": id_client,
+                              "email": email, "variation": variation})
 
-                    try:
+    def diffusion_presence(self):
+        """
+        Pousse les changements de présence regroupés depuis le dernier
+        appel aux membres connectés des salons des clients concernés.
 
-                        self.clients[ip].close()
+        Chaque connexion reçoit au plus un message par appel :
+        "[PROTOCOLE]PRESENCE:{"en_ligne": [emails], "hors_ligne": [emails]}".
+        """
 
-                    except Exception as erreur:
+        # Le verrou empêche une liste complète construite avant ces
+        # changements d'être envoyée après eux.
+        with self.verrou_presence:
 
-                        print(f"\nErreur lors de la fermeture de la connexion "
-                              f"pour l'IP {ip}: {erreur}")
+            changements = self.registre_presence.extraire_changements()
+            presences = collections.defaultdict(
+                lambda: {"en_ligne": [], "hors_ligne": []})
 
-                    finally:
+            for id_client, email, en_ligne in changements:
 
-                        del self.clients[ip]
-                        del self.sessions[ip]
+                etat = "en_ligne" if en_ligne else "hors_ligne"
 
-                        print(f"\nClient déconnecté suite à un ban/kick : "
-                              f"{ip}")
+                for connexion in self.index_salons.connexions_voisins(
+                        id_client):
 
-    def authentification_administrateur(self):
-        """
-        Authentification de l'administrateur.
+                    presences[connexion][etat].append(email)
 
-        Cette méthode permet à l'administrateur de s'authentifier
-        en saisissant son email et son mot de passe.
+            for connexion, presence in presences.items():
 
-        Si l'authentification réussit et que l'administrateur a les
-        permissions nécessaires, elle démarre un thread pour gérer
-        les commandes administratives.
-        """
+                try:
 
-        while True:
+                    connexion.envoyer(
+                        f"[PROTOCOLE]PRESENCE:{json.dumps(presence)}")
 
-            email_admin = input("Email Administrateur: ")
-            motdepasse_admin = input("Mot de passe: ")
-            id_client, permission = self.authentification_client(
-                email_admin, motdepasse_admin)
+                except Exception as erreur:
 
-            if id_client is not None and permission == "administrateur":
+                    traces.warning("Erreur de l'envoi de la présence",
+                                   extra=champs(ip=connexion.ip_client,
+                                                erreur=erreur))
 
-                print("Authentification réussie.\n")
-                thread_admin = threading.Thread(
-                    target=self.gestion_commandes_admin)
-                thread_admin.start()
-                break
+    def obtenir_presence(self, id_client):
+        """
+        Donne la liste des clients en ligne parmi les membres des salons
+        d'un client.
 
-            else:
-                print("Échec de l'authentification.")
+        :param id_client: L'ID du client demandeur.
+        :return: Une chaîne "[PROTOCOLE]PRESENCE:{"complet": true,
+        "en_ligne": [emails], "hors_ligne": []}".
+        """
 
-    def gestion_commandes_admin(self):
+        en_ligne = self.registre_presence.en_ligne(
+            self.index_salons.voisins(id_client))
+        presence = {"complet": True, "en_ligne": en_ligne, "hors_ligne": []}
+        return f"[PROTOCOLE]PRESENCE:{json.dumps(presence)}"
+
+    def demarrage_serveur(self):
         """
-        Cette méthode permet à l'administrateur d'entrer 
-        des commandes spécifiques pour gérer le serveur.
-        Elle peut effectuer des actions telles que l'arrêt du serveur, 
-        le bannissement, le kick de clients ou encore l'octroi/la révocation
-        d'accès à des salons.
+        Démarrage du serveur de messagerie.
+
+        Cette méthode configure et démarre le serveur comme cela :
+        1. Tente de se connecter à la base de données.
+        2. Vérifie si la connexion à la base de données a réussi.
+        3. Crée un socket pour écouter les connexions entrantes.
+        4. Démarre un thread pour l'authentification de l'administrateur.
+        5. Boucle principale pour gérer les connexions entrantes des clients,
+        en mode "threads" ou en mode "asyncio".
+        6. Finalement, fermeture propre de toutes les connexions.
+
+        Si plusieurs processus sont demandés, le démarrage est confié
+        à demarrage_multiprocessus.
         """
-        
-        while True:
 
-            if self.etat_commande == "commande":
+        if self.nombre_processus > 1:
 
-                commande = input("[ADMIN] Entrez une commande : ")
+            self.demarrage_multiprocessus()
+            return
 
-                if commande == "/kill":
-                    
-                    print("\nArrêt du serveur en cours...")
-                    self.envoi_message_clients("[PROTOCOLE]ARRET_SERVEUR:")
-                    time.sleep(5)
-                    self.fermeture_connexions_clients()
-                    self.arret_serveur = True
-                    sys.exit(0)
+        self.connexion_bdd()
 
-                elif commande.startswith("/ban "):
+        if not self.pool_bdd:
 
-                    try:
+            print("Impossible de démarrer le serveur sans connexion à la BDD.")
+            return
 
-                        _, email_client = commande.split(" ", 1)
-                        self.ban_client(email_client, "Ban administratif.")
+        self.migration_schema()
+        self.chargement_index_salons()
+        self.chargement_sanctions()
+        self.ouverture_journal()
+        self.chargement_compteur_messages()
+        self.chargement_historique_recent()
+        self.ouverture_index_recherche()
+        self.demarrage_ecriture_messages()
+        self.registre_presence.demarrer(self.diffusion_presence)
 
-                    except Exception as erreur:
+        if self.mode == "asyncio":
 
-                        print(f"Erreur : {erreur}")
-                        continue
+            self.demarrage_serveur_asyncio()
 
-                elif commande.startswith("/unban "):
-                    
-                    _, email_client = commande.split(" ", 1)
-                    self.unban_client(email_client)
-
-                elif commande.startswith("/kick "):
+        else:
 
-                    try:
-                        _, email_client, duree = commande.split(" ", 3)
-                        self.kick_client(email_client, int(duree),
-                                         "Kick administratif.")
+            self.demarrage_serveur_threads()
 
-                    except Exception as erreur:
+        self.registre_presence.arreter()
+        self.ecriture_messages.arreter()
 
-                        print(f"Erreur : {erreur}")
-                        continue
+        if self.journal is not None:
 
-                elif commande.startswith("/unkick "):
+            self.journal.fermer()
 
-                    _, email_client = commande.split(" ", 1)
-                    self.unkick_client(email_client)
+        if self.index_recherche is not None:
 
-                elif commande.startswith("/grant "):
-                    try:
-                        _, nom_salon, email_client = commande.split(" ", 3)
-                        self.grant_access(nom_salon, email_client)
+            self.index_recherche.fermer()
 
-                    except ValueError:
+        self.pool_bdd.fermer()
 
-                        print("\nProblème de syntaxe.")
+    def ouverture_journal(self):
+        """
+        Ouvre le journal des messages publics, si un dossier est configuré.
 
-                elif commande.startswith("/revoke "):
+        En cas d'échec, les messages publics restent stockés en BDD.
+        """
 
-                    try:
-                        _, nom_salon, email_client = commande.split(" ", 3)
-                        self.revoke_access(nom_salon, email_client)
+        if not self.parametres_journal.get("dossier"):
 
-                    except ValueError:
+            return
 
-                        print("\nProblème de syntaxe.")
+        try:
 
-                else:
-                    
-                    print(f"\nCommande non reconnue : {commande}")
+            journal = JournalMessages(**self.parametres_journal)
+            journal.ouvrir()
+            journal.demarrer()
+            self.journal = journal
+            segments, messages, _, _, _, _ = journal.statistiques()
+            print(f"Journal des messages ouvert : {messages} message(s) en "
+                  f"{segments} segment(s), {journal.octets_tronques} "
+                  f"octet(s) incomplet(s) retiré(s).")
 
-            elif self.etat_commande == "acces_salon":
+        except Exception as erreur:
 
-                pass
+            print(f"\nErreur de l'ouverture du journal des messages : "
+                  f"{erreur}")
 
-    def envoi_message_clients(self, message):
+    def demarrage_ecriture_messages(self):
         """
-        Cette méthode parcourt tous les clients connectés
-        et envoie le message spécifié à chacun d'eux.
-
-        :param message: Le message à envoyer à tous les clients.
+        Démarre le thread d'écriture différée des messages.
         """
 
-        for ip_client, socket_client in self.clients.items():
-            
-            try:
-                
-                socket_client.sendall(message.encode())
-                
-            except Exception as erreur:
-                
-                print(f"\nErreur d'envoi du message à {ip_client}: {erreur}")
+        self.ecriture_messages = EcritureDifferee(self.pool_bdd,
+                                                  **self.persistance)
+        self.ecriture_messages.demarrer()
 
-    def fermeture_connexions_clients(self):
+    def demarrage_thread_admin(self):
         """
-        Cette méthode parcourt tous les clients connectés
-        et ferme leur connexion individuellement.
+        Démarre le thread d'authentification de l'administrateur.
         """
 
-        for ip_client, socket_client in self.clients.items():
-            
-            try:
-                
-                socket_client.close()
-                
-            except Exception as erreur:
+        thread_authentification_admin = threading.Thread(
+            target=self.authentification_administrateur)
+        thread_authentification_admin.start()
 
-                print(f"\nErreur de fermeture de la connexion avec "
-                      f"{ip_client}: {erreur}")
+    def demarrage_metriques(self):
+        """
+        Ouvre le point d'accès HTTP des métriques (GET /metrics) et le
+        sert dans un thread.
 
-    def gestion_clients(self, socket_client, adresse_client):
+        En plusieurs processus, chaque travailleur a ses métriques : le
+        travailleur n écoute sur le port configuré + n.
         """
-        Cette méthode gère la communication avec un client spécifié
-        en utilisant la socket du client.
 
-        Elle gère l'authentification, l'inscription, les discussions publiques
-        et tous types de requêtes différentes.
+        if not self.parametres_metriques:
 
-        :param socket_client: La socket du client.
-        :param adresse_client: L'adresse IP du client.
-        """
+            return
 
-        ip_client = adresse_client[0]
-        self.sessions[ip_client] = SessionClient()
-        self.clients[ip_client] = socket_client
+        port = self.parametres_metriques['port']
 
-        print(f"\nClient connecté : {ip_client}")
+        if self.role == "travailleur":
 
-        message_tampon = ""
+            port += self.indice_travailleur
 
         try:
 
-            while True:
-
-                donnees_client = socket_client.recv(1024)
+            serveur_http = http.server.ThreadingHTTPServer(
+                (self.parametres_metriques['hote'], port),
+                GestionnaireMetriques)
+            serveur_http.daemon_threads = True
+            serveur_http.metriques = self.metriques
+            threading.Thread(target=serveur_http.serve_forever,
+                             daemon=True).start()
+            print(f"Métriques : http://{self.parametres_metriques['hote']}:"
+                  f"{port}/metrics")
 
-                if not donnees_client:
+        except Exception as erreur:
 
-                    print(f"\nClient déconnecté : {ip_client}")
-                    break
+            print(f"\nErreur de l'ouverture du point d'accès des "
+                  f"métriques : {erreur}")
 
-                message_tampon += donnees_client.decode()
+    def jauges_metriques(self):
+        """
+        Calcule les jauges des métriques : connexions, sessions et files
+        d'envoi de ce processus.
 
-                while "\n" in message_tampon:
+        :return: La liste des tuples (nom, étiquettes, valeur).
+        """
 
-                    message_client, message_tampon = (
-                        message_tampon.split("\n", 1))
-                    message_client = message_client.strip()
-                    print(f"\nMessage reçu de {ip_client}: {message_client}")
+        sessions = list(self.sessions.values())
+        authentifiees = sum(1 for session in sessions if session.authentifie)
+        messages = octets = octets_max = 0
 
-                    if message_client.startswith(
-                            "[PROTOCOLE]AUTHENTIFICATION:"):
+        for connexion in list(self.clients.values()):
 
-                        email, mot_de_passe = (
-                            message_client.split(":")[1].split(","))
+            en_attente, octets_en_attente, _ = connexion.profondeur_file()
+            messages += en_attente
+            octets += octets_en_attente
+            octets_max = max(octets_max, octets_en_attente)
 
-                        etat_sanction = self.verification_sanctions(email)
+        return [
+            ("sae_clients_connectes", (), len(self.clients)),
+            ("sae_sessions", (("etat", "authentifiee"),), authentifiees),
+            ("sae_sessions", (("etat", "anonyme"),),
+             len(sessions) - authentifiees),
+            ("sae_file_envoi_messages", (), messages),
+            ("sae_file_envoi_octets", (), octets),
+            ("sae_file_envoi_octets_max", (), octets_max),
+        ]
 
-                        if etat_sanction == "BAN":
+    def demarrage_socket_admin(self):
+        """
+        Ouvre la socket Unix d'administration, réservée à l'utilisateur
+        du serveur, et démarre le thread qui en accepte les connexions.
+        """
 
-                            reponse = "BAN_CLIENT"
+        if not self.chemin_socket_admin or not hasattr(socket, "AF_UNIX"):
 
-                        elif etat_sanction == "KICK":
+            return
 
-                            reponse = "KICK_CLIENT"
+        try:
 
-                        else:
+            if os.path.exists(self.chemin_socket_admin):
 
-                            id_client, permission = (
-                                self.authentification_client(email,
-                                                             mot_de_passe))
+                os.unlink(self.chemin_socket_admin)
 
-                            if id_client is not None:
+            self.socket_admin = socket.socket(socket.AF_UNIX,
+                                              socket.SOCK_STREAM)
+            masque = os.umask(0o177)
 
-                                self.sessions[ip_client].authentifie = True
-                                self.sessions[ip_client].id_client = id_client
-                                self.sessions[ip_client].permission = (
-                                    permission)
-                                self.sessions[ip_client].email_client = email
-                                self.enregistrer_historique_ip(email,
-                                                               ip_client)
-                                reponse = "SUCCES_AUTHENTIFICATION"
+            try:
 
-                            else:
+                self.socket_admin.bind(self.chemin_socket_admin)
 
-                                reponse = "ECHEC_AUTHENTIFICATION"
+            finally:
 
-                        socket_client.sendall(reponse.encode())
+                os.umask(masque)
 
-                    elif message_client.startswith(
-                            "[PROTOCOLE]REQUETE_MEMBRES_SALONS_PUBLICS:"):
+            self.socket_admin.listen()
+            threading.Thread(target=self.acceptation_socket_admin,
+                             daemon=True).start()
+            print(f"Socket d'administration : {self.chemin_socket_admin}")
 
-                        reponse = self.obtenir_membres_salons_publics()
-                        socket_client.sendall(reponse.encode())
+        except Exception as erreur:
 
-                    elif message_client.startswith(
-                            "[PROTOCOLE]REQUETE_HISTORIQUE_SALONS_PUBLICS:"):
+            print(f"\nErreur de l'ouverture de la socket d'administration : "
+                  f"{erreur}")
 
-                        reponse = self.obtenir_historique_salons_publics()
-                        socket_client.sendall(reponse.encode())
+    def demarrage_serveur_threads(self):
+        """
+        Boucle principale du mode "threads" : chaque connexion acceptée
+        est confiée à un thread dédié exécutant gestion_clients.
+        """
 
-                    elif message_client.startswith(
-                            "[PROTOCOLE]REQUETE_HISTORIQUE_SALONS_PRIVES:"):
+        socket_serveur = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-                        id_client = self.sessions[ip_client].id_client
-                        reponse = self.obtenir_historique_salons_prives(
-                            id_client)
-                        socket_client.sendall(reponse.encode())
+        if self.role == "travailleur":
 
-                    elif message_client.startswith("[PROTOCOLE]INSCRIPTION:"):
+            socket_serveur.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT,
+                                      1)
 
-                        infos = message_client.split(":")[1].split(",")
-                        email = infos[2]
-                        etat_sanction = self.verification_sanctions(email)
+        socket_serveur.bind((self.hote, self.port))
+        socket_serveur.listen()
+        print(f"Serveur lancé sur l'hôte {self.hote}, port {self.port}.\n")
+        self.demarrage_metriques()
 
-                        if etat_sanction == "BAN":
+        # Configuration du thread d'authentification administrateur
+        if self.role != "travailleur":
 
-                            reponse = "BAN_CLIENT"
+            self.demarrage_thread_admin()
+            self.demarrage_socket_admin()
 
-                        elif etat_sanction == "KICK":
+        try:
 
-                            reponse = "KICK_CLIENT"
+            while not self.arret_serveur:
 
-                        else:
+                socket_serveur.settimeout(1)
 
-                            reponse = self.inscription_client(*infos)
+                try:
+                    socket_client, adresse_client = socket_serveur.accept()
 
-                        socket_client.sendall(reponse.encode())
+                except socket.timeout:
 
-                    elif message_client.startswith("[PROTOCOLE]ACCES_SALON:"):
+                    continue
 
-                        nom_salon = message_client.split(":")[1]
-                        reponse = self.gestion_acces_salons(ip_client,
-                                                            nom_salon)
-                        socket_client.sendall(reponse.encode())
+                thread_client = threading.Thread(
+                    target=self.gestion_clients,
+                    args=(socket_client, adresse_client))
+                thread_client.start()
 
-                    elif message_client.startswith(
-                            "[PROTOCOLE]VERIFICATION_SALONS_AUTORISES:"):
+        except KeyboardInterrupt:
 
-                        id_client = self.sessions[ip_client].id_client
-                        salons_autorises = (
-                            self.obtenir_salons_autorises(id_client))
-                        reponse = (f"[PROTOCOLE]LISTE_SALONS_AUTORISES:"
-                                   f"{','.join(salons_autorises)}")
-                        socket_client.sendall(reponse.encode())
+            print("Arrêt du serveur...")
 
-                    elif message_client.startswith(
-                            "[PROTOCOLE]DISCUSSION_PUBLIQUE:"):
-                        _, nom_salon, contenu = message_client.split(":", 2)
-                        id_client = self.sessions[ip_client].id_client
-                        self.stocker_message_public(id_client, nom_salon,
-                                                    contenu)
-                        self.retransmettre_message_public(nom_salon, contenu,
-                                                          id_client)
+        finally:
 
-                    elif message_client.startswith(
-                            "[PROTOCOLE]DISCUSSION_PRIVEE:"):
+            self.fermeture_connexions_clients()
+            socket_serveur.close()
 
-                        _, email_destinataire, contenu = message_client.split(
-                            ":", 2)
-                        email_expediteur = self.obtenir_email_par_id(
-                            self.sessions[ip_client].id_client)
-                        self.envoi_message_prive(email_expediteur,
-                                                 email_destinataire, contenu)
+    def demarrage_serveur_asyncio(self):
+        """
+        Point d'entrée du mode "asyncio" : toutes les connexions sont
+        servies par une seule boucle d'événements, les appels bloquants
+        à la BDD étant délégués à un pool de threads.
+        """
 
-                    else:
+        try:
 
-                        reponse = f"Message reçu, client {ip_client} !\n"
-                        socket_client.sendall(reponse.encode())
+            asyncio.run(self.boucle_serveur_asyncio())
 
-        except Exception as erreur:
+        except KeyboardInterrupt:
 
-            print(f"\nErreur avec le client {ip_client}: {erreur}")
+            print("Arrêt du serveur...")
 
         finally:
 
-            socket_client.close()
-
-            if ip_client in self.sessions:
+            self.fermeture_connexions_clients()
 
-                del self.sessions[ip_client]
+    async def boucle_serveur_asyncio(self):
+        """
+        Ouvre le serveur asyncio et attend la demande d'arrêt.
+        """
 
-            if ip_client in self.clients:
+        self.boucle = asyncio.get_running_loop()
+        self.evenement_arret = asyncio.Event()
+        executeur = ThreadPoolExecutor(max_workers=self.nombre_executeurs)
+        self.boucle.set_default_executor(executeur)
+        self.executeur_flux = ThreadPoolExecutor(
+            max_workers=self.nombre_executeurs, thread_name_prefix="flux")
 
-                del self.clients[ip_client]
+        serveur = await asyncio.start_server(
+            self.gestion_clients_asyncio, self.hote, self.port,
+            reuse_port=self.role == "travailleur")
+        print(f"Serveur lancé sur l'hôte {self.hote}, port {self.port} "
+              f"(mode asyncio).\n")
+        self.demarrage_metriques()
 
-    def enregistrer_historique_ip(self, email, ip_client):
-        """
-        Cette méthode enregistre l'adresse IP d'un client dans l'historique,
-        associée à son adresse e-mail, si elle n'existe pas déjà.
+        if self.role != "travailleur":
 
-        :param email: L'adresse e-mail du client.
-        :param ip_client: L'adresse IP du client.
-        """
+            self.demarrage_thread_admin()
+            self.demarrage_socket_admin()
 
-        with self.lien_mysql.cursor() as curseur:
+        async with serveur:
 
-            curseur.execute("""
-                INSERT INTO historique_ip (email_client, ip_client)
-                SELECT * FROM (SELECT %s, %s) AS tmp
-                WHERE NOT EXISTS (
-                    SELECT email_client, ip_client FROM historique_ip
-                    WHERE email_client = %s AND ip_client = %s
-                )
-            """, (email, ip_client, email, ip_client))
+            await self.evenement_arret.wait()
 
-            self.lien_mysql.commit()
+        # Les clients encore connectés (arrêt par signal ou perte du bus)
+        # sont fermés tant que la boucle tourne : leurs tâches se terminent
+        # sur la fin de flux au lieu d'être annulées par asyncio.run
+        self.fermeture_locale_connexions_clients()
+        await asyncio.sleep(0.1)
+        self.executeur_flux.shutdown(wait=False)
 
-    def obtenir_membres_salons_publics(self):
+    def demarrage_multiprocessus(self):
         """
-        Cette méthode récupère la liste des membres pour chaque salon public
-        sous forme de chaînes de caractères formatées.
+        Démarrage du serveur en plusieurs processus.
 
-        :return: Une chaîne de caractères contenant la liste des membres
-        des salons publics.
+        Le processus maître ouvre le bus inter-processus, puis crée
+        nombre_processus travailleurs qui écoutent tous sur le même port
+        grâce à SO_REUSEPORT (le noyau répartit les connexions entre eux).
+        Le maître ne sert aucun client : il garde la console
+        d'administration et relaie les événements du bus.
         """
 
-        try:
+        if not hasattr(socket, "SO_REUSEPORT") or not hasattr(socket,
+                                                               "AF_UNIX"):
 
-            with self.lien_mysql.cursor() as curseur:
-
-                curseur.execute("""
-                    SELECT nom_salon, GROUP_CONCAT(CONCAT(
-                    nom, ' ', prenom, ':', email)) 
-                    AS membres FROM membres_salons_publics 
-                    JOIN clients 
-                    ON membres_salons_publics.id_client = clients.id_client 
-                    JOIN salons_publics 
-                    ON membres_salons_publics.id_salon_public = 
-                    salons_publics.id_salon_public GROUP BY nom_salon
-                """)
-
-                resultats = curseur.fetchall()
-                resultats_json = json.dumps(resultats)
-                print(resultats_json)
-                return (f"[PROTOCOLE]LISTE_MEMBRES_SALONS_PUBLICS:"
-                        f"{resultats_json}\n").rstrip()
+            print("SO_REUSEPORT indisponible sur ce système, démarrage "
+                  "en un seul processus.")
+            self.nombre_processus = 1
+            self.demarrage_serveur()
+            return
 
-        except Exception as erreur:
+        self.connexion_bdd()
 
-            print(
-                f"\nErreur de récupération des membres des salons : {erreur}")
-            return "[PROTOCOLE]ERREUR_MEMBRES_SALONS"
+        if not self.pool_bdd:
 
-    def stocker_message_public(self, id_client, nom_salon, contenu):
-        """
-        Cette méthode stocke un message public dans la base de données
-        avec les informations fournies.
+            print("Impossible de démarrer le serveur sans connexion à la BDD.")
+            return
 
-        :param id_client: L'ID du client qui envoie le message.
-        :param nom_salon: Le nom du salon public où le message est envoyé.
-        :param contenu: Le contenu du message.
-        """
+        self.migration_schema()
+        self.chargement_index_salons()
+        self.chargement_sanctions()
+        self.chargement_compteur_messages()
 
-        try:
+        if self.parametres_journal.get("dossier"):
 
-            with self.lien_mysql.cursor() as curseur:
+            # Les segments n'ont qu'un seul écrivain : le journal n'est
+            # pas partagé entre processus
+            print("Journal des messages indisponible avec plusieurs "
+                  "processus, messages publics stockés en BDD.")
 
-                curseur.execute("""
-                    INSERT INTO messages 
-                    (id_client, contenu, horodatage, id_salon_public)
-                    SELECT %s, %s, NOW(), id_salon_public
-                    FROM salons_publics
-                    WHERE nom_salon = %s
-                """, (id_client, contenu, nom_salon))
-                self.lien_mysql.commit()
+        if self.dossier_recherche:
 
-        except Exception as erreur:
+            print("Recherche des messages indisponible avec plusieurs "
+                  "processus.")
 
-            print(f"\nErreur lors de l'insertion du message : {erreur}")
+        self.role = "maitre"
+        chemin_bus = os.path.join(tempfile.gettempdir(),
+                                  f"sae302_bus_{self.port}.sock")
+        self.bus = BusInterProcessus(chemin_bus,
+                                     self.traitement_evenement_bus,
+                                     self.perte_bus)
+        self.bus.ouvrir_concentrateur()
 
-    def obtenir_nom_prenom_client(self, id_client):
-        """
-        Cette méthode récupère le nom et le prénom d'un client
-        à partir de son ID.
+        # Hérité par les travailleurs : SIGTERM arrête proprement chacun
+        # d'eux, et le maître relaie l'arrêt à tous par le bus
+        signal.signal(signal.SIGTERM, self.arret_sur_signal)
 
-        :param id_client: L'ID du client.
-        :return: Une chaîne de caractères au format "nom/prénom" du client.
-        """
+        contexte = multiprocessing.get_context("fork")
+        travailleurs = []
 
-        with self.lien_mysql.cursor() as curseur:
+        for indice in range(self.nombre_processus):
 
-            curseur.execute(
-                "SELECT nom, prenom FROM clients WHERE id_client = %s",
-                (id_client,))
-            nom, prenom = curseur.fetchone()
-            return f"{nom}/{prenom}"
+            travailleur = contexte.Process(target=self.execution_travailleur,
+                                           args=(indice,))
+            travailleur.start()
+            travailleurs.append(travailleur)
 
-    def retransmettre_message_public(self, nom_salon, contenu, id_client):
-        """
-        Cette méthode formate un message public avec les informations fournies
-        (nom du salon, contenu, ID du client) et le retransmet 
-        à tous les clients autorisés.
+        self.bus.demarrer_concentrateur()
+        print(f"{self.nombre_processus} processus travailleurs lancés sur "
+              f"le port {self.port}.\n")
+        self.demarrage_thread_admin()
+        self.demarrage_socket_admin()
 
-        :param nom_salon: Le nom du salon public où le message est envoyé.
-        :param contenu: Le contenu du message.
-        :param id_client: L'ID du client qui envoie le message.
-        """
+        try:
 
-        nom_prenom = self.obtenir_nom_prenom_client(id_client)
-        horodatage = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        message_formate = f"[{horodatage}] {nom_prenom} : {contenu}"
+            # Attente de l'arrêt demandé par l'administrateur ou de la fin
+            # de tous les travailleurs
+            sentinelles = [travailleur.sentinel for travailleur in travailleurs]
 
-        for ip_client, session in self.sessions.items():
+            while not self.arret_serveur and any(
+                    travailleur.is_alive() for travailleur in travailleurs):
 
-            try:
+                multiprocessing.connection.wait(sentinelles, timeout=1)
+
+        except KeyboardInterrupt:
+
+            print("Arrêt du serveur...")
+            self.signaler_arret()
 
-                socket_client = self.clients[ip_client]
+        finally:
 
-                if nom_salon == "General":
+            # Les travailleurs disposent de 10 secondes au total pour
+            # se terminer, après quoi ils sont arrêtés de force
+            echeance = time.monotonic() + 10
 
-                    socket_client.sendall(
-                        f"[PROTOCOLE]MESSAGE_CHAT:"
-                        f"{nom_salon}:{message_formate}".encode())
+            for travailleur in travailleurs:
 
-                elif self.verifier_acces_salon_public(session.id_client,
-                                                      nom_salon):
+                travailleur.join(timeout=max(0, echeance - time.monotonic()))
 
-                    socket_client.sendall(
-                        f"[PROTOCOLE]MESSAGE_CHAT:"
-                        f"{nom_salon}:{message_formate}".encode())
+                if travailleur.is_alive():
 
-            except Exception as erreur:
+                    travailleur.terminate()
 
-                print(
-                    f"\nErreur de la retransmission à {ip_client}: {erreur}")
+            self.bus.fermer()
 
-    def obtenir_historique_salons_publics(self):
+    def execution_travailleur(self, indice):
         """
-        Cette méthode récupère l'historique des messages des salons publics,
-        sous forme de paires (nom_salon, contenu) dans une liste.
+        Point d'entrée d'un processus travailleur.
+
+        Les connexions à la BDD héritées du maître ne sont pas réutilisées :
+        chaque travailleur ouvre son propre pool, se connecte au bus puis sert
+        ses clients dans le mode choisi.
 
-        :return: Une chaîne de caractères contenant l'historique
-        des messages des salons publics.
+        :param indice: Le numéro du travailleur.
         """
 
-        try:
+        self.role = "travailleur"
+        self.indice_travailleur = indice
+        relance_traces()
+        self.pool_bdd = None
+        self.connexion_bdd()
 
-            with self.lien_mysql.cursor() as curseur:
+        if not self.pool_bdd:
 
-                curseur.execute("""
-                    SELECT nom_salon, contenu
-                    FROM messages
-                    JOIN salons_publics ON 
-                    messages.id_salon_public = salons_publics.id_salon_public
-                """)
-                resultats = curseur.fetchall()
-                resultats_json = json.dumps(resultats)
-                return (f"[PROTOCOLE]LISTE_MESSAGES_PUBLICS:"
-                        f"{resultats_json}\n").rstrip()
+            return
 
-        except Exception as erreur:
+        self.chargement_index_salons()
+        self.chargement_sanctions()
+        self.chargement_historique_recent()
+        self.demarrage_ecriture_messages()
+        self.registre_presence.demarrer(self.diffusion_presence)
+        self.bus.connecter()
 
-            print(
-                f"\nErreur de récupération de l'historique public : {erreur}")
-            return "[PROTOCOLE]ERREUR_HISTORIQUE_PUBLIC"
+        if self.mode == "asyncio":
 
-    def obtenir_historique_salons_prives(self, email_client):
-        """
-        Cette méthode récupère l'historique des messages des salons privés
-        dans lesquels le client spécifié est impliqué, sous forme de paires
-        (contenu, horodatage) dans une liste, triée par horodatage.
+            self.demarrage_serveur_asyncio()
 
-        :param email_client: L'adresse e-mail du client.
-        :return: Une chaîne de caractères contenant l'historique d
-        es messages des salons privés.
-        """
+        else:
 
-        try:
+            self.demarrage_serveur_threads()
 
-            with self.lien_mysql.cursor() as curseur:
+        self.registre_presence.arreter()
+        self.ecriture_messages.arreter()
+        self.pool_bdd.fermer()
+        arret_traces()
 
-                curseur.execute("""
-                    SELECT contenu, horodatage 
-                    FROM messages
-                    JOIN salons_prives ON 
-                    messages.id_salon_prive = salons_prives.id_salon_prive 
-                    WHERE email_participant_1 = %s OR email_participant_2 = %s 
-                    ORDER BY horodatage
-                """, (email_client, email_client))
-                resultats = curseur.fetchall()
-                return f"[PROTOCOLE]LISTE_MESSAGES_PRIVES:{resultats}\n"
+    def arret_sur_signal(self, numero, trame):
+        """
+        Gestionnaire de SIGTERM : arrêt propre du processus, propagé aux
+        travailleurs par le maître.
 
-        except Exception as erreur:
+        :param numero: Le numéro du signal.
+        :param trame: La trame d'exécution interrompue.
+        """
 
-            print(
-                f"\nErreur de récupération de l'historique privé : {erreur}")
-            return "[PROTOCOLE]ERREUR_HISTORIQUE_PRIVE"
+        print(f"Arrêt du serveur (signal {numero})...")
+        self.signaler_arret()
 
-    def est_banni(self, email, ip_client):
+    def perte_bus(self):
+        """
+        Appelée par le bus lorsqu'un travailleur perd le concentrateur :
+        sans le maître, il n'a plus ni diffusion entre processus ni
+        sanctions propagées, et s'arrête donc au lieu de servir seul.
         """
-        Cette méthode vérifie si un client est actuellement banni
-        en se basant sur son adresse e-mail et son adresse IP.
-        Elle renvoie True si le client est banni et False sinon.
 
-        :param email: L'adresse e-mail du client.
-        :param ip_client: L'adresse IP du client.
-        :return: True si le client est banni, False sinon.
+        if self.role == "travailleur" and not self.arret_serveur:
+
+            traces.error("Bus inter-processus perdu, arrêt du travailleur",
+                         extra=champs(travailleur=self.indice_travailleur))
+            self.signaler_arret()
+
+    def publier_bus(self, evenement):
         """
+        Publie un événement vers les autres processus, si le serveur
+        fonctionne en plusieurs processus.
 
-        with self.lien_mysql.cursor() as curseur:
-            curseur.execute("""
-                SELECT COUNT(*) FROM sanctions
-                WHERE (email_client = %s OR ip_client = %s) 
-                AND type_sanction = 'ban'
-            """, (email, ip_client))
-            (count,) = curseur.fetchone()
-            return count > 0
-        
-    def est_kick(self, email_client, type_sanction):
+        :param evenement: Un dictionnaire sérialisable en JSON, dont la
+        clé "type" identifie l'événement.
         """
-        Cette méthode consulte la base de données pour vérifier si le client
-        spécifié est actuellement sous une sanction de type "kick"
-        et, le cas échéant, si cette sanction est encore active.
 
-        :param email_client: L'adresse e-mail du client à vérifier.
-        :param type_sanction: Le type de sanction à vérifier ('kick').
+        if self.bus is not None:
 
-        :return: Un tuple (est_sous_sanction, date_expiration) où :
-            - est_sous_sanction est True si le client est sous sanction,
-            sinon False.
-            - date_expiration est la date d'expiration de la sanction
-            si elle est à durée définie, sinon None.
+            self.bus.publier(evenement)
+
+    def traitement_evenement_bus(self, evenement):
         """
+        Applique localement un événement reçu d'un autre processus.
 
-        with self.lien_mysql.cursor() as curseur:
+        :param evenement: Le dictionnaire reçu du bus.
+        """
 
-            curseur.execute("""
-                SELECT horodatage_sanction, duree_sanction FROM sanctions 
-                WHERE email_client = %s AND type_sanction = 'kick'
-            """, (email_client, type_sanction))
-            resultat = curseur.fetchone()
+        type_evenement = evenement.get("type")
 
-            if resultat:
+        if type_evenement == "public":
 
-                horodatage_sanction, duree_sanction = resultat
+            self.diffusion_locale_message_public(evenement["salon"],
+                                                 evenement["message"],
+                                                 evenement["id"])
 
-                if duree_sanction is None:
+        elif type_evenement == "prive":
 
-                    return True, None  # Sanction à durée indéfinie
+            self.diffusion_locale_message_prive(evenement["expediteur"],
+                                                evenement["destinataire"],
+                                                evenement["message"])
 
-                else:
+        elif type_evenement == "diffusion":
 
-                    expiration_duree = horodatage_sanction + (
-                        datetime.timedelta(seconds=duree_sanction))
+            self.envoi_local_message_clients(evenement["message"])
 
-                    if expiration_duree > datetime.datetime.now():
+        elif type_evenement == "deconnexion":
 
-                        return True, expiration_duree  # Sanction non expirée
+            self.deconnexion_locale_par_email(evenement["email"])
 
-                    else:
+        elif type_evenement == "acces_salon":
 
-                        return False, None  # Sanction expirée
+            self.application_acces_salon(evenement["id_client"],
+                                         evenement["salon"],
+                                         evenement["accorde"],
+                                         evenement.get("etiquette"))
 
-            return False, None  # Pas de sanction
+        elif type_evenement == "lot_admin":
 
-    def creation_salon_prive(self, email_client1, email_client2):
-        """
-        Cette méthode crée un salon de discussion privée en enregistrant
-        les adresses e-mail des deux clients participants
-        dans la base de données.
+            self.application_locale_lot_admin(evenement)
 
-        :param email_client1: L'adresse e-mail du premier client participant.
-        :param email_client2: L'adresse e-mail du deuxième client participant.
-        :return: L'ID du salon de discussion privée créé.
-        """
+        elif type_evenement == "presence":
 
-        with self.lien_mysql.cursor() as curseur:
-            
-            curseur.execute("""
-                INSERT INTO salons_prives 
-                (email_participant_1, email_participant_2)
-                VALUES (%s, %s)
-            """, (email_client1, email_client2))
-            self.lien_mysql.commit()
-            curseur.execute("SELECT LAST_INSERT_ID()")
-            id_salon_prive = curseur.fetchone()[0]
-            return id_salon_prive
+            self.registre_presence.appliquer(evenement["id_client"],
+                                             evenement["email"],
+                                             evenement["variation"])
 
-    def envoi_message_prive(self, email_expediteur, email_destinataire, 
-                            message):
-        """
-        Cette méthode envoie un message privé entre deux clients en utilisant 
-        leurs adresses e-mail. Elle crée également un salon de discussion 
-        privée si nécessaire.
+        elif type_evenement == "invalidation_identite":
 
-        :param email_expediteur: L'adresse e-mail de l'expéditeur du MP.
-        :param email_destinataire: L'adresse e-mail du destinataire du MP.
-        :param message: Le contenu du MP.
-        """
-        
-        if email_expediteur and email_destinataire:
-            
-            id_salon_prive = self.obtenir_creation_salon_prive(
-                email_expediteur, email_destinataire)
+            self.cache_identites.invalider(email_client=evenement["email"])
 
-            with self.lien_mysql.cursor() as curseur:
-                
-                curseur.execute("""
-                    INSERT INTO messages 
-                    (id_client, contenu, horodatage, id_salon_prive)
-                    VALUES ((SELECT id_client FROM clients WHERE email = %s), 
-                    %s, NOW(), %s)
-                """, (email_expediteur, message, id_salon_prive))
-                self.lien_mysql.commit()
+        elif type_evenement == "sanction":
 
-            self.retransmettre_message_prive(email_expediteur, 
-                                             email_destinataire, message)
+            if evenement["action"] == "ajout":
 
-        else:
-            
-            print("\nErreur : un des emails est introuvable.")
+                self.registre_sanctions.ajouter(
+                    evenement["sanction"], evenement["email"],
+                    evenement["ip"],
+                    datetime.datetime.fromisoformat(evenement["horodatage"]),
+                    evenement["duree"])
 
-    def retransmettre_message_prive(self, email_expediteur, email_destinataire,
-                                    contenu):
-        """
-        Cette méthode formate un message privé avec les informations fournies
-        (adresse e-mail de l'expéditeur, adresse e-mail du destinataire,
-        contenu) et le retransmet au client destinataire spécifié.
+            else:
 
-        :param email_expediteur: L'adresse e-mail de l'expéditeur du MP.
-        :param email_destinataire: L'adresse e-mail du destinataire du MP.
-        :param contenu: Le contenu du MP.
-        """
+                self.registre_sanctions.retirer(evenement["sanction"],
+                                                evenement["email"])
 
-        message_formate = f"[MP de {email_expediteur}] {contenu}"
-        
-        for ip_client, session in self.sessions.items():
-            
-            if session.email_client == email_destinataire:
-                
-                try:
-                    
-                    socket_client = self.clients[ip_client]
-                    socket_client.sendall(
-                        f"[PROTOCOLE]NOUVEAU_MESSAGE_PRIVE:"
-                        f"{email_expediteur}:{message_formate}".encode())
-                    
-                except Exception as erreur:
-                    
-                    print(f"\nErreur lors de l'envoi du MP à "
-                          f"{ip_client}: {erreur}")
+        elif type_evenement == "fermeture":
 
-    def obtenir_email_par_id(self, id_client):
-        """
-        Obtenir l'adresse e-mail d'un client par son ID.
+            self.fermeture_locale_connexions_clients()
 
-        Cette méthode récupère l'adresse e-mail d'un client à partir de son ID.
+        elif type_evenement == "arret":
 
-        :param id_client: L'ID du client.
-        :return: L'adresse e-mail du client ou None si non trouvée.
-        """
+            self.signaler_arret()
 
-        with self.lien_mysql.cursor() as curseur:
-            
-            curseur.execute("SELECT email FROM clients WHERE id_client = %s",
-                            (id_client,))
-            resultat = curseur.fetchone()
-            return resultat[0] if resultat else None
+        elif type_evenement == "demande_acces" and self.role == "maitre":
 
-    def obtenir_creation_salon_prive(self, email_client1, email_client2):
-        """
-        Cette méthode vérifie si un salon de discussion privée existe déjà
-        entre les deux clients en utilisant leurs adresses e-mail.
-        Si le salon existe, son ID est renvoyé. Sinon, un nouveau
-        salon de discussion privée est créé et son ID est renvoyé.
+            self.enregistrement_demande_acces(evenement["id_client"],
+                                              evenement["email"],
+                                              evenement["ip"],
+                                              evenement["salon"])
 
-        :param email_client1: L'adresse e-mail du premier client participant.
-        :param email_client2: L'adresse e-mail du deuxième client participant.
-        :return: L'ID du salon de discussion privée existant ou créé.
-        """
+        elif type_evenement == "message_client":
 
-        with self.lien_mysql.cursor() as curseur:
-            
-            curseur.execute("""
-                SELECT id_salon_prive
-                FROM salons_prives
-                WHERE (email_participant_1 = %s AND email_participant_2 = %s)
-                   OR (email_participant_1 = %s AND email_participant_2 = %s)
-            """, (email_client1, email_client2, email_client2, email_client1))
-            resultat = curseur.fetchone()
-            
-            if resultat:
-                
-                return resultat[0]
-            
-            else:
-                
-                return self.creation_salon_prive(email_client1, email_client2)
+            self.envoi_local_message_client(evenement["ip"],
+                                            evenement["email"],
+                                            evenement["message"])
 
-    def ajouter_acces_salon_public(self, id_client, nom_salon):
+    def signaler_arret(self):
         """
-        Cette méthode permet à un client d'obtenir l'accès à un salon public
-        spécifique en utilisant son ID et le nom du salon. Si le client
-        n'a pas déjà accès au salon, l'accès est ajouté.
-
-        :param id_client: L'ID du client auquel ajouter l'accès.
-        :param nom_salon: Le nom du salon public auquel ajouter l'accès.
+        Demande l'arrêt de la boucle principale, quel que soit le mode.
+        Le maître propage la demande à tous les travailleurs.
         """
 
-        try:
+        self.arret_serveur = True
+        self.file_admin.put(None)
+        self.fermeture_socket_admin()
 
-            with self.lien_mysql.cursor() as curseur:
+        if self.role == "maitre":
 
-                if not self.verifier_acces_salon_public(id_client, nom_salon):
+            self.publier_bus({"type": "arret"})
 
-                    curseur.execute("""
-                        INSERT INTO 
-                        membres_salons_publics (id_client, id_salon_public) 
-                        SELECT %s, id_salon_public 
-                        FROM salons_publics WHERE nom_salon = %s
-                    """, (id_client, nom_salon))
-                    self.lien_mysql.commit()
+        if self.boucle is not None and self.evenement_arret is not None:
 
-        except Exception as erreur:
+            try:
+
+                self.boucle.call_soon_threadsafe(self.evenement_arret.set)
+
+            except RuntimeError:
+
+                pass  # Boucle déjà fermée
+
+    def authentification_client(self, email, mot_de_passe):
+        """
+        Cette méthode tente d'authentifier un client en vérifiant
+        son email et son mot de passe dans la base de données.
+
+        :param email: L'adresse e-mail du client.
+        :param mot_de_passe: Le mot de passe du client.
+
+        :return: Un tuple contenant l'ID du client et ses permissions
+        s'il est authentifié, sinon (None, None).
+        """
+
+        try:
+
+            resultat = self.acces_donnees.un("authentification", (email,))
+
+            if resultat and resultat[1] == mot_de_passe:
+
+                id_client, _, permission, nom, prenom = resultat
+                self.cache_identites.ajouter(id_client, nom, prenom, email)
+                return id_client, permission
+
+            return None, None
+
+        except Exception as erreur:
+
+            traces.error("Erreur lors de l'authentification",
+                         extra=champs(erreur=erreur))
+            return None, None
+
+    def inscription_client(self, nom, prenom, email, mot_de_passe, permission):
+        """
+        Cette méthode tente d'inscrire un nouveau client
+        en vérifiant d'abord si l'email est déjà utilisé.
+
+        Si l'email n'est pas déjà enregistré, elle insère
+        le nouveau client dans la base de données.
+
+        :param nom: Le nom du client.
+        :param prenom: Le prénom du client.
+        :param email: L'adresse e-mail du client.
+        :param mot_de_passe: Le mot de passe du client.
+        :param permission: Les permissions du client.
+
+        :return: "SUCCES_INSCRIPTION" en cas de succès,
+        sinon un message d'échec.
+        """
+
+        try:
+
+            # Vérification si le salon "General" existe
+            id_salon_general = self.index_salons.id_salon("General")
+
+            if id_salon_general is None:
+
+                traces.error("Inscription impossible : salon General "
+                             "introuvable", extra=champs(email=email))
+                return "ECHEC_INSCRIPTION : Salon 'General' introuvable."
+
+            with self.acces_donnees.transaction() as transaction:
+
+                # Vérification si l'email est déjà utilisé
+                (nombre,) = transaction.un("nombre_clients_email", (email,))
+
+                if nombre > 0:
+
+                    return "ECHEC_INSCRIPTION"
+
+                # Insertion du nouveau client
+                transaction.executer(
+                    "insertion_client",
+                    (nom, prenom, email, mot_de_passe, permission))
+                id_client = transaction.dernier_id
+
+                # Ajout du client au salon "General"
+                transaction.executer("insertion_membre",
+                                     (id_client, id_salon_general))
+                transaction.valider()
+
+            self.mise_a_jour_acces_salon(id_client, "General", True,
+                                         f"{nom} {prenom}:{email}")
+            self.invalidation_identite(email)
+            return "SUCCES_INSCRIPTION"
+
+        except Exception as erreur:
+
+            traces.error("Erreur lors de l'inscription",
+                         extra=champs(erreur=erreur))
+            return "ECHEC_INSCRIPTION : Erreur serveur."
+
+    def ban_client(self, email_client, motif):
+        """
+        Bannir un client en enregistrant une sanction dans la base de données.
+
+        Cette méthode enregistre une sanction de type "ban"
+        pour un client spécifié, avec un motif par défaut.
+
+        :param email_client: L'adresse e-mail du client à bannir.
+        :param motif: Le motif du bannissement.
+        """
+
+        with self.acces_donnees.transaction() as transaction:
+
+            result = transaction.un("nombre_clients_email", (email_client,))
+
+            if result[0] > 0:
+
+                transaction.executer("insertion_ban",
+                                     (motif, email_client, email_client))
+                transaction.valider()
+                self.enregistrement_sanction(transaction)
+
+        if result[0] > 0:
+
+            print(f"\n{email_client} a été banni.")
+
+            # Hors de la transaction : la recherche des IP du client
+            # emprunte sa propre connexion au pool
+            self.deconnecter_clients_par_email(email_client)
+
+        else:
+
+            print(f"\nAucun client existant pour l'email {email_client} !")
+
+    def unban_client(self, email_client):
+        """
+        Révoquer le bannissement d'un client en supprimant
+        les sanctions de type "ban" dans la base de données.
+
+        :param email_client: L'adresse e-mail du client
+        dont le bannissement doit être révoqué.
+        """
+
+        with self.acces_donnees.transaction() as transaction:
+
+            resultat = transaction.un("nombre_sanctions",
+                                      ("ban", email_client))
+
+            if resultat[0] > 0:
+
+                transaction.executer("suppression_sanctions",
+                                     ("ban", email_client))
+                transaction.valider()
+                self.retrait_sanction("ban", email_client)
+                print(f"\n{email_client} a été débanni.")
+
+            else:
+
+                print(f"\nAucune sanction BAN existante pour l'email "
+                      f"{email_client}")
+
+    def kick_client(self, email_client, duree, motif="Kick administratif."):
+        """
+        Cette méthode enregistre une sanction de type "kick" pour un client
+        spécifié, en incluant la durée et le motif de l'exclusion.
+
+        :param email_client: Adresse e-mail du client à exclure temporairement.
+        :param duree: La durée de l'exclusion temporaire en minutes.
+        :param motif: Le motif de l'exclusion.
+        """
+
+        with self.acces_donnees.transaction() as transaction:
+
+            result = transaction.un("nombre_clients_email", (email_client,))
+
+            if result[0] > 0:
+
+                transaction.executer(
+                    "insertion_kick",
+                    (duree, motif, email_client, email_client))
+                transaction.valider()
+                self.enregistrement_sanction(transaction)
+
+        if result[0] > 0:
+
+            print(f"\n{email_client} a été exclu temporairement pour "
+                  f"{duree} minutes.")
+
+            # Hors de la transaction, comme pour ban_client
+            self.deconnecter_clients_par_email(email_client)
+
+        else:
+
+            print(f"\nAucun client existant pour l'email {email_client} !")
+
+    def unkick_client(self, email_client):
+        """
+        Révoquer l'exclusion temporaire d'un client en supprimant
+        les sanctions de type "kick" dans la base de données.
+
+        :param email_client: L'adresse e-mail du client dont
+        l'exclusion temporaire doit être révoquée.
+        """
+
+        with self.acces_donnees.transaction() as transaction:
+
+            resultat = transaction.un("nombre_sanctions",
+                                      ("kick", email_client))
+
+            if resultat[0] > 0:
+
+                transaction.executer("suppression_sanctions",
+                                     ("kick", email_client))
+                transaction.valider()
+                self.retrait_sanction("kick", email_client)
+                print(f"\nLe kick sur {email_client} a été révoqué.")
+
+            else:
+
+                print(f"\nAucune sanction KICK existante pour l'email "
+                      f"{email_client}.")
+
+    def mute_client(self, email_client, duree, motif="Mute administratif.",
+                    ip_client=None):
+        """
+        Cette méthode enregistre une sanction de type "mute" pour un client :
+        il reste connecté, mais ses messages publics et privés sont refusés
+        pendant la durée indiquée.
+
+        :param email_client: L'adresse e-mail du client à rendre muet.
+        :param duree: La durée du mute en minutes.
+        :param motif: Le motif du mute.
+        :param ip_client: L'adresse IP associée à la sanction (à défaut,
+        une IP connue du client).
+        """
+
+        with self.acces_donnees.transaction() as transaction:
+
+            result = transaction.un("nombre_clients_email", (email_client,))
+
+            if result[0] > 0:
+
+                transaction.executer(
+                    "insertion_mute",
+                    (duree, motif, email_client, ip_client, email_client))
+                transaction.valider()
+                self.enregistrement_sanction(transaction)
+
+                print(f"\n{email_client} a été rendu muet pour {duree} "
+                      f"minutes.")
+
+            else:
+
+                print(f"\nAucun client existant pour l'email {email_client} !")
+
+    def unmute_client(self, email_client):
+        """
+        Révoquer le mute d'un client en supprimant les sanctions de type
+        "mute" dans la base de données.
+
+        :param email_client: L'adresse e-mail du client.
+        """
+
+        with self.acces_donnees.transaction() as transaction:
+
+            resultat = transaction.un("nombre_sanctions",
+                                      ("mute", email_client))
+
+            if resultat[0] > 0:
+
+                transaction.executer("suppression_sanctions",
+                                     ("mute", email_client))
+                transaction.valider()
+                self.retrait_sanction("mute", email_client)
+                print(f"\nLe mute sur {email_client} a été révoqué.")
+
+            else:
+
+                print(f"\nAucune sanction MUTE existante pour l'email "
+                      f"{email_client}.")
+
+    def client_muet(self, connexion, email_client):
+        """
+        Vérifie, dans le registre des sanctions, si un client est muet, et
+        le lui signale : "[PROTOCOLE]MUET:<minutes restantes>" (-1 pour un
+        mute indéfini).
+
+        :param connexion: La connexion du client.
+        :param email_client: L'adresse e-mail du client.
+        :return: True si le client est muet.
+        """
+
+        expiration = self.registre_sanctions.expiration("mute", email_client)
+
+        if expiration is None:
+
+            return False
+
+        if expiration == datetime.datetime.max:
+
+            minutes = -1
+
+        else:
+
+            minutes = math.ceil(
+                (expiration - datetime.datetime.now()).total_seconds() / 60)
+
+        connexion.envoyer(f"[PROTOCOLE]MUET:{minutes}", cle_fusion="MUET")
+        return True
+
+    def trace_message_recu(self, ip_client, message_client):
+        """
+        Trace un message reçu (au niveau DEBUG, un message sur
+        echantillonnage_messages) : sa commande et sa taille, sans son
+        contenu.
+
+        :param ip_client: L'adresse IP du client.
+        :param message_client: Le message reçu.
+        """
+
+        traces.debug("Message reçu", extra=champs(
+            ip=ip_client, commande=AccesDonnees.nom_commande(message_client),
+            taille=len(message_client),
+            echantillonnage=self.echantillonnage_messages))
+
+    def controle_debit(self, connexion, ip_client, message_client):
+        """
+        Applique la limitation de débit à un message client, avant son
+        traitement.
+
+        Les seaux "utilisateur" sont ceux de l'email du client authentifié ;
+        avant authentification, et toujours pour les commandes
+        d'authentification, ce sont les seaux "adresse" de son IP. Un
+        message refusé est signalé par
+        "[PROTOCOLE]LIMITE_DEBIT:<catégorie>". Les messages de discussion
+        d'un client muet ne sont pas limités : ils sont refusés par leur
+        commande.
+
+        :param connexion: La connexion du client.
+        :param ip_client: L'adresse IP du client.
+        :param message_client: Le message reçu.
+        :return: L'attente en secondes avant de traiter le message, ou
+        None s'il est refusé.
+        """
+
+        categorie = LimiteurDebit.CATEGORIES.get(
+            AccesDonnees.nom_commande(message_client))
+
+        if categorie is None:
+
+            return 0.0
+
+        session = self.sessions.get(ip_client)
+        email_client = session.email_client if session else None
+
+        # Les messages d'un client muet sont refusés par leur commande,
+        # sans compter comme un excès de débit
+        if (categorie == "discussion" and email_client
+                and self.registre_sanctions.expiration("mute",
+                                                       email_client)):
+
+            return 0.0
+
+        utilisateur = (email_client if email_client
+                       and categorie != "authentification" else None)
+        issue, attente = self.limiteur_debit.controler(
+            categorie, connexion, utilisateur, ip_client)
+
+        if issue in ("accepte", "retarde"):
+
+            return attente
+
+        connexion.envoyer(f"[PROTOCOLE]LIMITE_DEBIT:{categorie}",
+                          cle_fusion="LIMITE_DEBIT")
+
+        if issue == "mute" and email_client:
+
+            traces.warning("Débit excessif, mute automatique",
+                           extra=champs(ip=ip_client, email=email_client))
+            mute = (email_client, self.limiteur_debit.duree_mute,
+                    "Mute automatique : débit de messages excessif.",
+                    ip_client)
+
+            # La sanction est écrite en BDD hors de la boucle asyncio
+            if self.mode == "asyncio":
+
+                self.boucle.run_in_executor(None, self.mute_client, *mute)
+
+            else:
+
+                self.mute_client(*mute)
+
+        return None
+
+    def grant_access(self, nom_salon, email_client):
+        """
+        Ajoute un client en tant que membre d'un salon public spécifié.
+
+        Cette méthode vérifie d'abord l'existence du salon et du client
+        avant de l'ajouter comme membre du salon.
+
+        :param nom_salon: Le nom du salon public.
+        :param email_client: L'adresse e-mail du client à ajouter au salon.
+        """
+
+        est_membre = None
+
+        with self.acces_donnees.transaction() as transaction:
+
+            salon = transaction.un("id_salon_public", (nom_salon,))
+            client = transaction.un("id_client_par_email", (email_client,))
+
+            if salon and client:
+
+                est_membre = transaction.un("nombre_membres",
+                                            (client[0], salon[0]))[0]
+
+                if est_membre == 0:
+
+                    transaction.executer("insertion_membre",
+                                         (client[0], salon[0]))
+                    transaction.valider()
+
+        # La mise à jour des membres peut emprunter sa propre connexion
+        # (identité du client) : elle attend que celle de la transaction
+        # soit rendue au pool, pour n'en tenir qu'une à la fois
+        if est_membre is None:
+
+            print("\nSalon ou client introuvable.")
+
+        elif est_membre == 0:
+
+            self.mise_a_jour_acces_salon(client[0], nom_salon, True)
+
+            print(f"\n{email_client} a été ajouté au salon "
+                  f"{nom_salon}.")
+
+        else:
+
+            print(f"\n{email_client} est déjà membre de {nom_salon}.")
+
+    def revoke_access(self, nom_salon, email_client):
+        """
+        Retire un client d'un salon public spécifié.
+
+        Cette méthode vérifie d'abord si le client est membre du salon
+        avant de le retirer.
+
+        :param nom_salon: Le nom du salon public.
+        :param email_client: L'adresse e-mail du client à retirer du salon.
+        """
+
+        est_membre = None
+
+        with self.acces_donnees.transaction() as transaction:
+
+            salon = transaction.un("id_salon_public", (nom_salon,))
+            client = transaction.un("id_client_par_email", (email_client,))
+
+            if salon and client:
+
+                est_membre = transaction.un("nombre_membres",
+                                            (client[0], salon[0]))[0]
+
+                if est_membre > 0:
+
+                    transaction.executer("suppression_membre",
+                                         (client[0], salon[0]))
+                    transaction.valider()
+
+        # Hors de la transaction, comme pour grant_access
+        if est_membre is None:
+
+            print("\nSalon ou client introuvable.")
+
+        elif est_membre > 0:
+
+            self.mise_a_jour_acces_salon(client[0], nom_salon, False)
+            print(f"\n{email_client} a été retiré du salon {nom_salon}.")
+
+        else:
+
+            print(f"\n{email_client} n'est pas déjà membre "
+                  f"du salon {nom_salon}.")
+
+    def application_lot_admin(self, operations):
+        """
+        Applique un lot d'opérations d'administration en une seule
+        transaction, et donne le résultat de chaque opération au fil de
+        l'eau.
+
+        Les opérations sont des dictionnaires {"action", "email", ...} :
+        "ban" (motif), "kick" et "mute" (duree en minutes, motif),
+        "unban", "unkick", "unmute", "grant" et "revoke" (salon). Une
+        opération invalide ou sans effet est signalée sans interrompre le
+        lot ; une erreur de la BDD annule tout le lot, de même qu'un
+        demandeur qui cesse de lire les résultats.
+
+        Une fois le lot validé, les registres et les connexions de ce
+        processus et des autres sont mis à jour en une fois.
+
+        :param operations: La liste des opérations.
+        :return: Un générateur des résultats : {"numero", "action",
+        "email", "statut", "detail"} par opération (statut "ok",
+        "ignore" ou "erreur"), puis {"fin": True, "valide", "ok",
+        "ignore", "erreur"} en dernier.
+        """
+
+        lot = {"salons": {}, "acces": {}, "etiquettes": {}, "sanctions": [],
+               "retraits": [], "ips": set()}
+        compteurs = {"ok": 0, "ignore": 0, "erreur": 0}
+
+        try:
+
+            with self.acces_donnees.transaction() as transaction:
+
+                for numero, operation in enumerate(operations, 1):
+
+                    try:
+
+                        statut, detail = self.operation_lot_admin(
+                            transaction, operation, lot)
+
+                    except (KeyError, ValueError, TypeError,
+                            AttributeError) as erreur:
+
+                        statut, detail = "erreur", (f"Opération invalide : "
+                                                    f"{erreur!r}")
+
+                    compteurs[statut] += 1
+                    yield {"numero": numero,
+                           "action": operation.get("action")
+                           if isinstance(operation, dict) else None,
+                           "email": operation.get("email")
+                           if isinstance(operation, dict) else None,
+                           "statut": statut, "detail": detail}
+
+                transaction.valider()
+
+        except Exception as erreur:
+
+            traces.error("Erreur du lot d'administration, annulé",
+                         extra=champs(erreur=erreur))
+            yield dict(compteurs, fin=True, valide=False,
+                       erreur=str(erreur))
+            return
+
+        evenement = {
+            "type": "lot_admin",
+            "sanctions": [[type_sanction, email_client, ip_client,
+                           horodatage.isoformat(), duree]
+                          for type_sanction, email_client, ip_client,
+                          horodatage, duree in lot["sanctions"]],
+            "retraits": lot["retraits"],
+            "acces": [[id_client, nom_salon, accorde,
+                       lot["etiquettes"][id_client]]
+                      for (id_client, nom_salon), accorde
+                      in lot["acces"].items()],
+            "ips": sorted(lot["ips"]),
+        }
+        self.publier_bus(evenement)
+
+        try:
+
+            self.application_locale_lot_admin(evenement)
+
+        except Exception as erreur:
+
+            traces.error("Erreur de l'application du lot d'administration",
+                         extra=champs(erreur=erreur))
+
+        print(f"\nLot d'administration appliqué : {compteurs['ok']} "
+              f"opération(s), {compteurs['ignore']} sans effet, "
+              f"{compteurs['erreur']} en erreur.")
+        yield dict(compteurs, fin=True, valide=True)
+
+    def operation_lot_admin(self, transaction, operation, lot):
+        """
+        Exécute une opération d'un lot d'administration dans la
+        transaction du lot, et note ce qu'il faudra appliquer aux
+        registres une fois le lot validé.
+
+        :param transaction: La transaction du lot.
+        :param operation: Le dictionnaire de l'opération.
+        :param lot: Les changements accumulés par le lot.
+        :return: Le tuple (statut, détail).
+        """
+
+        action = operation["action"]
+        email_client = operation["email"]
+
+        if action not in ("ban", "kick", "mute", "unban", "unkick",
+                          "unmute", "grant", "revoke"):
+
+            return "erreur", f"Action inconnue : {action}."
+
+        identite = transaction.un("identite_par_email", (email_client,))
+
+        if identite is None:
+
+            return "erreur", "Client introuvable."
+
+        id_client, nom, prenom, _ = identite
+
+        if action in ("ban", "kick", "mute"):
+
+            motif = operation.get("motif", f"{action.capitalize()} "
+                                           f"administratif.")
+
+            if action == "ban":
+
+                transaction.executer("insertion_ban",
+                                     (motif, email_client, email_client))
+
+            elif action == "kick":
+
+                transaction.executer(
+                    "insertion_kick", (int(operation["duree"]), motif,
+                                       email_client, email_client))
+
+            else:
+
+                transaction.executer(
+                    "insertion_mute", (int(operation["duree"]), motif,
+                                       email_client, None, email_client))
+
+            lot["sanctions"].append(transaction.un(
+                "sanction_par_id", (transaction.dernier_id,)))
+
+            if action != "mute":
+
+                lot["ips"].update(ligne[0] for ligne in transaction.tous(
+                    "ips_client", (email_client,)))
+
+            return "ok", ""
+
+        if action in ("unban", "unkick", "unmute"):
+
+            type_sanction = action[2:]
+
+            if not transaction.executer("suppression_sanctions",
+                                        (type_sanction, email_client)):
+
+                return "ignore", (f"Aucune sanction {type_sanction.upper()} "
+                                  f"existante.")
+
+            lot["retraits"].append([type_sanction, email_client])
+            return "ok", ""
+
+        nom_salon = operation["salon"]
+
+        if nom_salon not in lot["salons"]:
+
+            salon = transaction.un("id_salon_public", (nom_salon,))
+            lot["salons"][nom_salon] = salon[0] if salon else None
+
+        if lot["salons"][nom_salon] is None:
+
+            return "erreur", "Salon introuvable."
+
+        accorde = action == "grant"
+        est_membre = lot["acces"].get(
+            (id_client, nom_salon),
+            self.verifier_acces_salon_public(id_client, nom_salon))
+
+        if est_membre == accorde:
+
+            return "ignore", ("Déjà membre du salon." if accorde
+                              else "Pas membre du salon.")
+
+        transaction.executer(
+            "insertion_membre" if accorde else "suppression_membre",
+            (id_client, lot["salons"][nom_salon]))
+        lot["acces"][id_client, nom_salon] = accorde
+        lot["etiquettes"][id_client] = f"{nom} {prenom}:{email_client}"
+        return "ok", ""
+
+    def application_locale_lot_admin(self, evenement):
+        """
+        Applique aux registres et aux connexions de ce processus les
+        changements d'un lot d'administration validé.
+
+        :param evenement: L'événement "lot_admin" : sanctions ajoutées et
+        retirées, accès changés et adresses IP à déconnecter.
+        """
+
+        for (type_sanction, email_client, ip_client, horodatage,
+             duree) in evenement["sanctions"]:
+
+            self.registre_sanctions.ajouter(
+                type_sanction, email_client, ip_client,
+                datetime.datetime.fromisoformat(horodatage), duree)
+
+        for type_sanction, email_client in evenement["retraits"]:
+
+            self.registre_sanctions.retirer(type_sanction, email_client)
+
+        self.application_acces_salons(evenement["acces"])
+        self.fermeture_connexions_ips(evenement["ips"])
+
+    def verification_sanctions(self, email_client):
+        """
+        Vérifie les sanctions actives pour un client spécifié,
+        dans le registre des sanctions (aucune requête à la BDD).
+
+        :param email_client: L'adresse e-mail du client.
+        :return: "BAN" si le client est banni, "KICK" si le client est kické,
+                 "NONE" si aucune sanction active.
+        """
+
+        if self.registre_sanctions.expiration("ban", email_client):
+
+            return "BAN"
+
+        if self.registre_sanctions.expiration("kick", email_client):
+
+            return "KICK"
+
+        return "NONE"
+
+    def deconnecter_clients_par_email(self, email_client):
+        """
+        Déconnecte toutes les connexions d'un client sanctionné, y compris
+        celles servies par les autres processus.
+
+        :param email_client: L'adresse e-mail du client à déconnecter.
+        """
+
+        self.deconnexion_locale_par_email(email_client)
+        self.publier_bus({"type": "deconnexion", "email": email_client})
+
+    def deconnexion_locale_par_email(self, email_client):
+        """
+        Ferme les connexions de ce processus associées aux adresses IP
+        connues du client.
+
+        :param email_client: L'adresse e-mail du client à déconnecter.
+        """
+
+        self.fermeture_connexions_ips([ligne[0] for ligne in
+                                       self.acces_donnees.tous(
+                                           "ips_client", (email_client,))])
+
+    def fermeture_connexions_ips(self, ips_a_deconnecter):
+        """
+        Ferme les connexions de ce processus venant des adresses IP
+        données.
+
+        :param ips_a_deconnecter: Les adresses IP à déconnecter.
+        """
+
+        for ip in ips_a_deconnecter:
+
+            if ip in self.clients:
+
+                try:
+
+                    self.clients[ip].fermer()
+
+                except Exception as erreur:
+
+                    traces.warning("Erreur lors de la fermeture de la "
+                                   "connexion",
+                                   extra=champs(ip=ip, erreur=erreur))
+
+                finally:
+
+                    # En mode asyncio, la fin du traitement du client a pu
+                    # retirer la connexion entre-temps
+                    self.clients.pop(ip, None)
+                    self.sessions.pop(ip, None)
+
+                    traces.info("Client déconnecté suite à un ban/kick",
+                                extra=champs(ip=ip))
+
+    def authentification_administrateur(self):
+        """
+        Authentification de l'administrateur.
+
+        Cette méthode permet à l'administrateur de s'authentifier
+        en saisissant son email et son mot de passe.
+
+        Si l'authentification réussit et que l'administrateur a les
+        permissions nécessaires, elle démarre un thread pour gérer
+        les commandes administratives.
+        """
+
+        while True:
+
+            email_admin = self.lecture_ligne_console("Email Administrateur: ")
+            motdepasse_admin = self.lecture_ligne_console("Mot de passe: ")
+
+            if motdepasse_admin is None:
+
+                return
+
+            id_client, permission = self.authentification_client(
+                email_admin, motdepasse_admin)
+
+            if id_client is not None and permission == "administrateur":
+
+                print("Authentification réussie.\n")
+                thread_admin = threading.Thread(
+                    target=self.gestion_commandes_admin)
+                thread_admin.start()
+                break
+
+            else:
+                print("Échec de l'authentification.")
+
+    def gestion_commandes_admin(self):
+        """
+        Cette méthode permet à l'administrateur d'entrer 
+        des commandes spécifiques pour gérer le serveur.
+        Elle peut effectuer des actions telles que l'arrêt du serveur, 
+        le bannissement, le kick de clients ou encore l'octroi/la révocation
+        d'accès à des salons.
+
+        Le thread attend sur la file de l'administrateur, alimentée par la
+        lecture de la console et par les demandes d'accès aux salons : il
+        ne lit jamais l'entrée standard lui-même. Un None dans la file
+        met fin à la boucle.
+        """
+
+        threading.Thread(target=self.lecture_console_admin,
+                         daemon=True).start()
+
+        while True:
+
+            evenement = self.file_admin.get()
+
+            if evenement is None:
+
+                break
+
+            nature, commande = evenement
+
+            if nature == "demande":
+
+                self.annonce_demande_acces(commande)
+                continue
+
+            if commande == "/demandes":
+
+                self.affichage_demandes_acces()
+
+            elif commande.startswith(("/accorder ", "/refuser ")):
+
+                try:
+
+                    action, id_demande = commande.split(" ", 1)
+                    self.decision_demande_acces(int(id_demande),
+                                                action == "/accorder")
+
+                except ValueError:
+
+                    print("\nProblème de syntaxe.")
+
+            elif commande == "/kill":
+
+                print("\nArrêt du serveur en cours...")
+                self.envoi_message_clients("[PROTOCOLE]ARRET_SERVEUR:")
+                time.sleep(5)
+                self.fermeture_connexions_clients()
+                self.signaler_arret()
+                sys.exit(0)
+
+            elif commande.startswith("/ban "):
+
+                try:
+
+                    _, email_client = commande.split(" ", 1)
+                    self.ban_client(email_client, "Ban administratif.")
+
+                except Exception as erreur:
+
+                    print(f"Erreur : {erreur}")
+                    continue
+
+            elif commande.startswith("/unban "):
+
+                _, email_client = commande.split(" ", 1)
+                self.unban_client(email_client)
+
+            elif commande.startswith("/kick "):
+
+                try:
+                    _, email_client, duree = commande.split(" ", 3)
+                    self.kick_client(email_client, int(duree),
+                                     "Kick administratif.")
+
+                except Exception as erreur:
+
+                    print(f"Erreur : {erreur}")
+                    continue
+
+            elif commande.startswith("/unkick "):
+
+                _, email_client = commande.split(" ", 1)
+                self.unkick_client(email_client)
+
+            elif commande.startswith("/mute "):
+
+                try:
+                    _, email_client, duree = commande.split(" ", 3)
+                    self.mute_client(email_client, int(duree))
+
+                except Exception as erreur:
+
+                    print(f"Erreur : {erreur}")
+                    continue
+
+            elif commande.startswith("/unmute "):
+
+                _, email_client = commande.split(" ", 1)
+                self.unmute_client(email_client)
+
+            elif commande.startswith("/grant "):
+                try:
+                    _, nom_salon, email_client = commande.split(" ", 3)
+                    self.grant_access(nom_salon, email_client)
+
+                except ValueError:
+
+                    print("\nProblème de syntaxe.")
+
+            elif commande == "/files":
+
+                etats = self.etat_files_envoi()
+
+                if not etats:
+
+                    print("\nAucun client connecté.")
+
+                for ip_client, messages, octets, abandonnes in etats:
+
+                    print(f"\n{ip_client} : {messages} message(s), "
+                          f"{octets} octet(s) en attente, "
+                          f"{abandonnes} abandonné(s)")
+
+            elif commande == "/pool":
+
+                if self.pool_bdd is not None:
+
+                    for nom, valeur in (
+                            self.pool_bdd.statistiques().items()):
+
+                        print(f"\n{nom} : {valeur:g}")
+
+            elif commande == "/ecriture":
+
+                if self.ecriture_messages is not None:
+
+                    for nom, valeur in (
+                            self.ecriture_messages.statistiques().items()):
+
+                        print(f"\n{nom} : {valeur:g}")
+
+            elif commande == "/requetes":
+
+                for nom, mesure in sorted(
+                        self.acces_donnees.statistiques().items()):
+
+                    appels = mesure["appels"] or 1
+                    print(f"\n{nom} : {mesure['appels']} appel(s), "
+                          f"{mesure['requetes'] / appels:.2f} requête(s)"
+                          f" par appel (max {mesure['requetes_max']}, "
+                          f"budget {mesure['budget']}), "
+                          f"{1000 * mesure['duree'] / appels:.3f} ms "
+                          f"en BDD par appel, "
+                          f"{mesure['depassements']} dépassement(s)")
+
+            elif commande == "/historique":
+
+                messages, succes, echecs = (
+                    self.historique_recent.statistiques())
+                print(f"\nHistorique récent : {messages} message(s), "
+                      f"{succes} page(s) servie(s) depuis la mémoire, "
+                      f"{echecs} lue(s) en BDD")
+
+            elif commande == "/presence":
+
+                en_ligne, diffusions, changements = (
+                    self.registre_presence.statistiques())
+                print(f"\nPrésence : {en_ligne} client(s) en ligne, "
+                      f"{changements} changement(s) poussé(s) en "
+                      f"{diffusions} diffusion(s)")
+
+            elif commande == "/journal":
+
+                if self.journal is None:
+
+                    print("\nJournal des messages inactif : messages "
+                          "publics stockés en BDD.")
+                    continue
+
+                (segments, messages, octets, ajouts, synchronisations,
+                 compactages) = self.journal.statistiques()
+                print(f"\nJournal des messages : {messages} message(s) "
+                      f"en {segments} segment(s) ({octets} octets), "
+                      f"{ajouts} ajout(s), {synchronisations} "
+                      f"synchronisation(s), {compactages} "
+                      f"compactage(s)")
+
+            elif commande == "/recherche":
+
+                if self.index_recherche is None:
+
+                    print("\nRecherche des messages inactive.")
+                    continue
+
+                messages, termes, octets, recherches, duree = (
+                    self.index_recherche.statistiques())
+                print(f"\nIndex de recherche : {messages} message(s), "
+                      f"{termes} terme(s) ({octets} octets), "
+                      f"{recherches} recherche(s), "
+                      f"{1000 * duree:.3f} ms en moyenne")
+
+            elif commande == "/limites":
+
+                totaux, plus_limites = (
+                    self.limiteur_debit.statistiques())
+                print(f"\nLimitation de débit "
+                      f"({self.limiteur_debit.politique}) : "
+                      f"{totaux.get('retarde', 0)} message(s) "
+                      f"retardé(s), {totaux.get('refuse', 0)} "
+                      f"refusé(s), {totaux.get('mute', 0)} mute(s)")
+
+                for utilisateur, compteurs in plus_limites:
+
+                    detail = ", ".join(
+                        f"{categorie} {issue} {nombre}"
+                        for (categorie, issue), nombre
+                        in sorted(compteurs.items()))
+                    print(f"{utilisateur} : {detail}")
+
+            elif commande == "/cache":
+
+                taille, succes, echecs = (
+                    self.cache_identites.statistiques())
+                total = succes + echecs
+                taux = 100 * succes / total if total else 0
+                print(f"\nCache des identités : {taille} client(s), "
+                      f"{succes} succès, {echecs} échec(s) "
+                      f"({taux:.1f} % de succès)")
+
+            elif commande.startswith("/revoke "):
+
+                try:
+                    _, nom_salon, email_client = commande.split(" ", 3)
+                    self.revoke_access(nom_salon, email_client)
+
+                except ValueError:
+
+                    print("\nProblème de syntaxe.")
+
+            else:
+
+                print(f"\nCommande non reconnue : {commande}")
+
+    def acceptation_socket_admin(self):
+        """
+        Accepte les connexions à la socket d'administration, jusqu'à sa
+        fermeture par fermeture_socket_admin.
+        """
+
+        while True:
+
+            try:
+
+                socket_lien, _ = self.socket_admin.accept()
+
+            except OSError:
+
+                break
+
+            threading.Thread(target=self.service_socket_admin,
+                             args=(socket_lien,), daemon=True).start()
+
+    def fermeture_socket_admin(self):
+        """
+        Ferme la socket d'administration et retire son fichier.
+        """
+
+        if self.socket_admin is None:
+
+            return
+
+        self.socket_admin.close()
+        self.socket_admin = None
+
+        with contextlib.suppress(OSError):
+
+            os.unlink(self.chemin_socket_admin)
+
+    def service_socket_admin(self, socket_lien):
+        """
+        Traite les lots d'administration reçus sur une connexion à la
+        socket d'administration.
+
+        Chaque ligne reçue est un lot JSON : {"operations": [...]}, ou la
+        forme abrégée {"action": ..., "emails": [...], ...} qui applique
+        la même action à chaque email. Chaque lot reçoit une ligne JSON
+        par opération, puis une ligne {"fin": true, ...} (voir
+        application_lot_admin).
+
+        :param socket_lien: La connexion acceptée.
+        """
+
+        with socket_lien, socket_lien.makefile("r", encoding="utf-8") as (
+                lecteur):
+
+            # Seul l'utilisateur du serveur (ou root) est servi
+            if hasattr(socket, "SO_PEERCRED"):
+
+                _, uid, _ = struct.unpack("3i", socket_lien.getsockopt(
+                    socket.SOL_SOCKET, socket.SO_PEERCRED,
+                    struct.calcsize("3i")))
+
+                if uid not in (0, os.getuid()):
+
+                    return
+
+            for ligne in lecteur:
+
+                if not ligne.strip():
+
+                    continue
+
+                try:
+
+                    lot = json.loads(ligne)
+
+                    if "operations" in lot:
+
+                        operations = lot["operations"]
+
+                    else:
+
+                        emails = lot.pop("emails")
+                        operations = [dict(lot, email=email_client)
+                                      for email_client in emails]
+
+                except (ValueError, KeyError, TypeError,
+                        AttributeError) as erreur:
+
+                    resultats = [{"fin": True, "valide": False,
+                                  "erreur": f"Lot invalide : {erreur!r}"}]
+
+                else:
+
+                    resultats = self.application_lot_admin(operations)
+
+                try:
+
+                    for resultat in resultats:
+
+                        socket_lien.sendall(
+                            (json.dumps(resultat) + "\n").encode())
+
+                except OSError:
+
+                    # Le lot en cours est annulé à la fermeture du
+                    # générateur
+                    return
+
+    def envoi_message_clients(self, message):
+        """
+        Cette méthode envoie le message spécifié à tous les clients
+        connectés, quel que soit le processus qui les sert.
+
+        :param message: Le message à envoyer à tous les clients.
+        """
+
+        self.envoi_local_message_clients(message)
+        self.publier_bus({"type": "diffusion", "message": message})
+
+    def envoi_local_message_clients(self, message):
+        """
+        Cette méthode parcourt tous les clients connectés à ce processus
+        et envoie le message spécifié à chacun d'eux.
+
+        :param message: Le message à envoyer à tous les clients.
+        """
+
+        for ip_client, connexion in list(self.clients.items()):
+            
+            try:
+                
+                connexion.envoyer(message)
+                
+            except Exception as erreur:
+                
+                traces.warning("Erreur d'envoi du message",
+                               extra=champs(ip=ip_client, erreur=erreur))
+
+    def etat_files_envoi(self):
+        """
+        Renvoie l'état de la file d'envoi de chaque client connecté
+        à ce processus, du plus en retard au moins en retard.
+
+        :return: Une liste de tuples (ip_client, messages en attente,
+        octets en attente, messages abandonnés).
+        """
+
+        etats = [(ip_client, *connexion.profondeur_file())
+                 for ip_client, connexion in list(self.clients.items())]
+        return sorted(etats, key=lambda etat: etat[2], reverse=True)
+
+    def fermeture_connexions_clients(self):
+        """
+        Cette méthode ferme la connexion de tous les clients connectés,
+        quel que soit le processus qui les sert.
+        """
+
+        self.fermeture_locale_connexions_clients()
+
+        if self.role == "maitre":
+
+            self.publier_bus({"type": "fermeture"})
+
+    def fermeture_locale_connexions_clients(self):
+        """
+        Cette méthode parcourt tous les clients connectés à ce processus
+        et ferme leur connexion individuellement.
+        """
+
+        for ip_client, connexion in list(self.clients.items()):
+            
+            try:
+                
+                connexion.fermer()
+                
+            except Exception as erreur:
+
+                traces.warning("Erreur de fermeture de la connexion",
+                               extra=champs(ip=ip_client, erreur=erreur))
+
+    def gestion_clients(self, socket_client, adresse_client):
+        """
+        Cette méthode gère la communication avec un client spécifié
+        en utilisant la socket du client.
+
+        Les données sont lues directement dans le tampon de réception
+        de la connexion (recv_into), qui les découpe en messages ; chacun
+        d'eux est confié à traitement_message_client.
+
+        :param socket_client: La socket du client.
+        :param adresse_client: L'adresse IP du client.
+        """
+
+        ip_client = adresse_client[0]
+        connexion = ConnexionThread(socket_client, ip_client,
+                                    **self.file_envoi)
+        connexion.tampon_reception = TamponReception(**self.tramage)
+        self.sessions[ip_client] = SessionClient()
+        self.clients[ip_client] = connexion
+
+        traces.info("Client connecté", extra=champs(ip=ip_client))
+
+        try:
+
+            while True:
+
+                octets_recus = socket_client.recv_into(
+                    connexion.tampon_reception.zone_libre())
+
+                if not octets_recus:
+
+                    traces.info("Client déconnecté",
+                                extra=champs(ip=ip_client))
+                    break
+
+                connexion.tampon_reception.avancer(octets_recus)
+
+                while True:
+
+                    message_client = connexion.tampon_reception.extraire()
+
+                    if message_client is None:
+
+                        break
+
+                    if (self.echantillonnage_messages
+                            and next(self.compteur_messages_recus)
+                            % self.echantillonnage_messages == 0):
+
+                        self.trace_message_recu(ip_client, message_client)
+
+                    attente = self.controle_debit(connexion, ip_client,
+                                                  message_client)
+
+                    if attente is None:
+
+                        continue
+
+                    if attente:
+
+                        time.sleep(attente)
+
+                    self.traitement_message_client(connexion, ip_client,
+                                                   message_client)
+
+        except Exception as erreur:
+
+            traces.warning("Erreur avec le client",
+                           extra=champs(ip=ip_client, erreur=erreur))
+
+        finally:
+
+            connexion.fermer()
+            self.index_salons.deconnecter(connexion)
+            self.deconnexion_presence(connexion)
+            self.limiteur_debit.oublier(connexion)
+
+            # Une nouvelle connexion depuis la même IP a pu remplacer
+            # celle-ci entre-temps : on ne retire que sa propre entrée.
+            if self.clients.get(ip_client) is connexion:
+
+                del self.clients[ip_client]
+                self.sessions.pop(ip_client, None)
+
+    async def gestion_clients_asyncio(self, lecteur, ecrivain):
+        """
+        Équivalent de gestion_clients pour le mode asyncio.
+
+        Les messages d'un même client sont traités dans l'ordre, mais
+        chaque traitement (qui interroge la BDD) est exécuté dans le pool
+        de threads afin de ne jamais bloquer la boucle d'événements.
+
+        :param lecteur: Le flux asyncio en lecture du client.
+        :param ecrivain: Le flux asyncio en écriture du client.
+        """
+
+        ip_client = ecrivain.get_extra_info("peername")[0]
+        connexion = ConnexionAsyncio(self.boucle, ecrivain, ip_client,
+                                     **self.file_envoi)
+        connexion.tampon_reception = TamponReception(**self.tramage)
+        self.sessions[ip_client] = SessionClient()
+        self.clients[ip_client] = connexion
+
+        traces.info("Client connecté", extra=champs(ip=ip_client))
+
+        try:
+
+            while True:
+
+                donnees_client = await lecteur.read(
+                    len(connexion.tampon_reception.zone_libre()))
+
+                if not donnees_client:
+
+                    traces.info("Client déconnecté",
+                                extra=champs(ip=ip_client))
+                    break
+
+                connexion.tampon_reception.alimenter(donnees_client)
+
+                while True:
+
+                    message_client = connexion.tampon_reception.extraire()
+
+                    if message_client is None:
+
+                        break
+
+                    if (self.echantillonnage_messages
+                            and next(self.compteur_messages_recus)
+                            % self.echantillonnage_messages == 0):
+
+                        self.trace_message_recu(ip_client, message_client)
+
+                    attente = self.controle_debit(connexion, ip_client,
+                                                  message_client)
+
+                    if attente is None:
+
+                        continue
+
+                    if attente:
+
+                        await asyncio.sleep(attente)
+
+                    # Un envoi en flux attend que le client lise chaque
+                    # bloc (jusqu'à 30 s) : il a ses propres threads, pour
+                    # qu'un client lent n'occupe pas ceux des commandes
+                    executeur = (self.executeur_flux
+                                 if message_client.startswith(
+                                     "[PROTOCOLE]REQUETE_HISTORIQUE_"
+                                     "SALONS_PRIVES:")
+                                 else None)
+                    await self.boucle.run_in_executor(
+                        executeur, self.traitement_message_client, connexion,
+                        ip_client, message_client)
+
+        except Exception as erreur:
+
+            traces.warning("Erreur avec le client",
+                           extra=champs(ip=ip_client, erreur=erreur))
+
+        finally:
+
+            connexion.fermer()
+            self.index_salons.deconnecter(connexion)
+            self.deconnexion_presence(connexion)
+            self.limiteur_debit.oublier(connexion)
+
+            # Une nouvelle connexion depuis la même IP a pu remplacer
+            # celle-ci entre-temps : on ne retire que sa propre entrée.
+            if self.clients.get(ip_client) is connexion:
+
+                del self.clients[ip_client]
+                self.sessions.pop(ip_client, None)
+
+    def traitement_message_client(self, connexion, ip_client,
+                                  message_client):
+        """
+        Cette méthode traite un message complet reçu d'un client.
+
+        Elle gère l'authentification, l'inscription, les discussions publiques
+        et tous types de requêtes différentes. Elle est commune aux modes
+        "threads" et "asyncio".
+
+        Les requêtes exécutées pendant le traitement sont comptées pour la
+        commande du message par la couche d'accès aux données, et sa durée
+        est ajoutée aux métriques.
+
+        :param connexion: La connexion du client (ConnexionClient).
+        :param ip_client: L'adresse IP du client.
+        :param message_client: Le message reçu, sans délimiteur.
+        """
+
+        nom_commande = AccesDonnees.nom_commande(message_client)
+        debut = time.perf_counter()
+
+        try:
+
+            with self.acces_donnees.commande(nom_commande):
+
+                self.execution_commande_client(connexion, ip_client,
+                                               message_client)
+
+        finally:
+
+            self.metriques.observer("sae_commande_duree_secondes",
+                                    time.perf_counter() - debut,
+                                    (("commande", nom_commande),))
+
+    def execution_commande_client(self, connexion, ip_client,
+                                  message_client):
+        """
+        Exécute la commande du protocole portée par un message client.
+
+        :param connexion: La connexion du client (ConnexionClient).
+        :param ip_client: L'adresse IP du client.
+        :param message_client: Le message reçu, sans délimiteur.
+        """
+
+        if message_client.startswith("[PROTOCOLE]TRAMAGE:"):
+
+            # Négociation du tramage par longueur : l'accusé de réception
+            # part encore au format historique, la suite est tramée
+            if message_client.split(":")[1] == "LONGUEUR":
+
+                connexion.envoyer("[PROTOCOLE]TRAMAGE_ACCEPTE:LONGUEUR")
+                connexion.activer_tramage_longueur()
+
+        elif message_client.startswith("[PROTOCOLE]AUTHENTIFICATION:"):
+
+            email, mot_de_passe = message_client.split(":")[1].split(",")
+
+            etat_sanction = self.verification_sanctions(email)
+
+            if etat_sanction == "BAN":
+
+                reponse = "BAN_CLIENT"
+
+            elif etat_sanction == "KICK":
+
+                reponse = "KICK_CLIENT"
+
+            else:
+
+                id_client, permission = self.authentification_client(
+                    email, mot_de_passe)
+
+                if id_client is not None:
+
+                    identite = self.obtenir_identite_par_id(id_client)
+                    self.sessions[ip_client].authentifie = True
+                    self.sessions[ip_client].id_client = id_client
+                    self.sessions[ip_client].permission = permission
+                    self.sessions[ip_client].email_client = email
+
+                    if identite is not None:
+
+                        _, nom, prenom, _ = identite
+                        self.sessions[ip_client].nom = nom
+                        self.sessions[ip_client].prenom = prenom
+
+                    self.index_salons.connecter(connexion, id_client)
+                    self.connexion_presence(connexion, id_client, email)
+                    self.enregistrer_historique_ip(email, ip_client)
+                    reponse = "SUCCES_AUTHENTIFICATION"
+
+                else:
+
+                    reponse = "ECHEC_AUTHENTIFICATION"
+
+            connexion.envoyer(reponse)
+
+        elif message_client.startswith("[PROTOCOLE]REQUETE_PRESENCE:"):
+
+            id_client = self.sessions[ip_client].id_client
+
+            if id_client is not None:
+
+                with self.verrou_presence:
+
+                    connexion.envoyer(self.obtenir_presence(id_client))
+
+        elif message_client.startswith(
+                "[PROTOCOLE]REQUETE_MEMBRES_SALONS_PUBLICS:"):
+
+            with self.verrou_membres:
+
+                reponse = self.obtenir_membres_salons_publics()
+                # Seule la liste la plus récente importe à un client lent
+                connexion.envoyer(reponse,
+                                  cle_fusion="LISTE_MEMBRES_SALONS_PUBLICS")
+
+        elif message_client.startswith(
+                "[PROTOCOLE]REQUETE_HISTORIQUE_SALON:"):
+
+            # REQUETE_HISTORIQUE_SALON:<salon>:<AVANT|DEPUIS>:<id>:<nombre>
+            _, nom_salon, sens, id_message, nombre = (
+                message_client.split(":"))
+            reponse = self.obtenir_historique_salon_public(
+                self.sessions[ip_client].id_client, nom_salon, sens,
+                int(id_message), int(nombre))
+            connexion.envoyer(reponse)
+
+        elif message_client.startswith("[PROTOCOLE]RECHERCHE:"):
+
+            # RECHERCHE:<id curseur>:<nombre>:<texte>
+            _, curseur, nombre, texte = message_client.split(":", 3)
+            session = self.sessions[ip_client]
+            connexion.envoyer(self.recherche_messages(
+                session.id_client, session.email_client, int(curseur),
+                int(nombre), texte))
+
+        elif message_client.startswith(
+                "[PROTOCOLE]REQUETE_HISTORIQUE_SALONS_PRIVES:"):
+
+            self.envoi_historique_salons_prives(
+                connexion, self.sessions[ip_client].email_client)
+
+        elif message_client.startswith("[PROTOCOLE]INSCRIPTION:"):
+
+            infos = message_client.split(":")[1].split(",")
+            email = infos[2]
+            etat_sanction = self.verification_sanctions(email)
+
+            if etat_sanction == "BAN":
+
+                reponse = "BAN_CLIENT"
+
+            elif etat_sanction == "KICK":
+
+                reponse = "KICK_CLIENT"
+
+            else:
+
+                reponse = self.inscription_client(*infos)
+
+            connexion.envoyer(reponse)
+
+        elif message_client.startswith("[PROTOCOLE]ACCES_SALON:"):
+
+            nom_salon = message_client.split(":")[1]
+            reponse = self.gestion_acces_salons(ip_client, nom_salon)
+            connexion.envoyer(reponse)
+
+        elif message_client.startswith(
+                "[PROTOCOLE]VERIFICATION_SALONS_AUTORISES:"):
+
+            id_client = self.sessions[ip_client].id_client
+            salons_autorises = self.obtenir_salons_autorises(id_client)
+            reponse = (f"[PROTOCOLE]LISTE_SALONS_AUTORISES:"
+                       f"{','.join(salons_autorises)}")
+            connexion.envoyer(reponse)
+
+        elif message_client.startswith("[PROTOCOLE]DISCUSSION_PUBLIQUE:"):
+            _, nom_salon, contenu = message_client.split(":", 2)
+
+            if self.client_muet(connexion,
+                                self.sessions[ip_client].email_client):
+
+                return
+
+            id_client = self.sessions[ip_client].id_client
+
+            # Salon inconnu ou réservé à d'autres : rien n'est stocké,
+            # gardé dans l'historique récent ni publié sur le bus
+            if (self.index_salons.id_salon(nom_salon) is None
+                    or (nom_salon != "General"
+                        and not self.verifier_acces_salon_public(
+                            id_client, nom_salon))):
+
+                connexion.envoyer(f"[PROTOCOLE]ACCES_REFUSE:{nom_salon}")
+                return
+
+            # Horodatage et en-tête uniques : le journal, la BDD, la
+            # diffusion et l'historique récent montrent le même message
+            id_message = self.allouer_id_message()
+            horodatage = datetime.datetime.now().replace(microsecond=0)
+            entete = (f"[{horodatage:%Y-%m-%d %H:%M:%S}] "
+                      f"{self.obtenir_nom_prenom_client(id_client)} : ")
+            message_formate = entete + contenu
+            self.stocker_message_public(id_message, id_client, nom_salon,
+                                        contenu, horodatage, entete)
+            self.indexation_message(id_message,
+                                    self.index_salons.id_salon(nom_salon),
+                                    message_formate, len(entete))
+            self.retransmettre_message_public(id_message, nom_salon,
+                                              message_formate)
+
+        elif message_client.startswith("[PROTOCOLE]DISCUSSION_PRIVEE:"):
+
+            _, email_destinataire, contenu = message_client.split(":", 2)
+            email_expediteur = self.sessions[ip_client].email_client
+
+            if self.client_muet(connexion, email_expediteur):
+
+                return
+
+            self.envoi_message_prive(email_expediteur, email_destinataire,
+                                     contenu)
+
+        else:
+
+            reponse = f"Message reçu, client {ip_client} !\n"
+            connexion.envoyer(reponse)
+
+    def enregistrer_historique_ip(self, email, ip_client):
+        """
+        Cette méthode enregistre l'adresse IP d'un client dans l'historique,
+        associée à son adresse e-mail, si elle n'existe pas déjà.
+
+        :param email: L'adresse e-mail du client.
+        :param ip_client: L'adresse IP du client.
+        """
+
+        self.acces_donnees.executer("insertion_historique_ip",
+                                    (email, ip_client, email, ip_client))
+
+    def obtenir_membres_salons_publics(self):
+        """
+        Cette méthode donne la liste des membres de chaque salon public,
+        lue dans l'index en mémoire, avec sa version. Les changements
+        suivants sont poussés par application_acces_salon.
+
+        :return: Une chaîne "[PROTOCOLE]LISTE_MEMBRES_SALONS_PUBLICS:
+        <version>:<json>" contenant la liste des membres des salons publics.
+        """
+
+        try:
+
+            version, resultats_json = self.index_salons.instantane_membres()
+            return (f"[PROTOCOLE]LISTE_MEMBRES_SALONS_PUBLICS:"
+                    f"{version}:{resultats_json}")
+
+        except Exception as erreur:
+
+            traces.error("Erreur de récupération des membres des salons",
+                         extra=champs(erreur=erreur))
+            return "[PROTOCOLE]ERREUR_MEMBRES_SALONS"
+
+    def stocker_message_public(self, id_message, id_client, nom_salon,
+                               contenu, horodatage, entete):
+        """
+        Cette méthode ajoute un message public au journal des messages,
+        s'il est ouvert, ou le confie à l'écriture différée, qui le
+        stockera dans la base de données avec le prochain lot.
+
+        :param id_message: L'ID attribué au message.
+        :param id_client: L'ID du client qui envoie le message.
+        :param nom_salon: Le nom du salon public où le message est envoyé.
+        :param contenu: Le contenu du message.
+        :param horodatage: L'horodatage du message, à la seconde.
+        :param entete: L'en-tête affiché avant le contenu ("[horodatage]
+        nom/prénom : "), le même que celui du message diffusé.
+        """
+
+        id_salon_public = self.index_salons.id_salon(nom_salon)
+
+        if id_salon_public is None:
+
+            return
+
+        self.metriques.compter("sae_messages_publics_total",
+                               (("salon", nom_salon),))
+
+        if self.journal is not None:
+
+            # Le journal garde le message tel qu'il sera affiché
+            self.journal.ajouter(id_salon_public, id_message, id_client,
+                                 entete + contenu)
+            return
+
+        self.ecriture_messages.ajouter(
+            (id_message, id_client, contenu, horodatage, id_salon_public,
+             None))
+
+    def obtenir_identite_par_id(self, id_client):
+        """
+        Renvoie l'identité d'un client, depuis le cache si possible.
+
+        :param id_client: L'ID du client.
+        :return: Un tuple (id_client, nom, prenom, email), ou None si le
+        client n'existe pas.
+        """
+
+        identite = self.cache_identites.obtenir_par_id(id_client)
+
+        if identite is None:
+
+            identite = self.lecture_identite("id_client", id_client)
+
+        return identite
+
+    def obtenir_identite_par_email(self, email_client):
+        """
+        Renvoie l'identité d'un client, depuis le cache si possible.
+
+        :param email_client: L'adresse e-mail du client.
+        :return: Un tuple (id_client, nom, prenom, email), ou None si le
+        client n'existe pas.
+        """
+
+        identite = self.cache_identites.obtenir_par_email(email_client)
+
+        if identite is None:
+
+            identite = self.lecture_identite("email", email_client)
+
+        return identite
+
+    def lecture_identite(self, colonne, valeur):
+        """
+        Lit l'identité d'un client en BDD et la place dans le cache.
+
+        :param colonne: "id_client" ou "email".
+        :param valeur: La valeur recherchée dans cette colonne.
+        :return: Un tuple (id_client, nom, prenom, email), ou None.
+        """
+
+        requete = ("identite_par_id" if colonne == "id_client"
+                   else "identite_par_email")
+        resultat = self.acces_donnees.un(requete, (valeur,))
+
+        if resultat is None:
+
+            return None
+
+        return self.cache_identites.ajouter(*resultat)
+
+    def invalidation_identite(self, email_client):
+        """
+        Retire un client du cache des identités, dans ce processus et
+        dans les autres, après une modification de sa ligne en BDD.
+
+        :param email_client: L'adresse e-mail du client modifié.
+        """
+
+        self.cache_identites.invalider(email_client=email_client)
+        self.publier_bus({"type": "invalidation_identite",
+                          "email": email_client})
+
+    def obtenir_nom_prenom_client(self, id_client):
+        """
+        Cette méthode récupère le nom et le prénom d'un client
+        à partir de son ID.
+
+        :param id_client: L'ID du client.
+        :return: Une chaîne de caractères au format "nom/prénom" du client.
+        """
+
+        _, nom, prenom, _ = self.obtenir_identite_par_id(id_client)
+        return f"{nom}/{prenom}"
+
+    def retransmettre_message_public(self, id_message, nom_salon,
+                                     message_formate):
+        """
+        Cette méthode retransmet un message public formaté à tous les
+        clients autorisés, y compris ceux des autres processus.
+
+        :param id_message: L'ID attribué au message.
+        :param nom_salon: Le nom du salon public où le message est envoyé.
+        :param message_formate: Le message formaté ("[horodatage]
+        nom/prénom : contenu"), tel que stocké.
+        """
+
+        self.diffusion_locale_message_public(nom_salon, message_formate,
+                                             id_message)
+        self.publier_bus({"type": "public", "salon": nom_salon,
+                          "message": message_formate, "id": id_message})
+
+    def diffusion_locale_message_public(self, nom_salon, message_formate,
+                                        id_message):
+        """
+        Envoie un message public déjà formaté aux clients autorisés
+        connectés à ce processus, et l'ajoute à l'historique récent
+        du salon.
+
+        Hors "General", ouvert à tous, les destinataires sont lus dans
+        l'index des salons : seules les connexions des membres du salon
+        sont parcourues, sans requête à la BDD.
+
+        :param nom_salon: Le nom du salon public où le message est envoyé.
+        :param message_formate: Le message formaté à retransmettre.
+        :param id_message: L'ID attribué au message.
+        """
+
+        self.historique_recent.ajouter(nom_salon, id_message, message_formate)
+
+        if nom_salon == "General":
+
+            connexions = list(self.clients.values())
+
+        else:
+
+            connexions = self.index_salons.connexions_salon(nom_salon)
+
+        message = f"[PROTOCOLE]MESSAGE_CHAT:{nom_salon}:{message_formate}"
+        debut = time.perf_counter()
+
+        for connexion in connexions:
+
+            try:
+
+                connexion.envoyer(message)
+
+            except Exception as erreur:
+
+                traces.warning("Erreur de la retransmission",
+                               extra=champs(ip=connexion.ip_client,
+                                            erreur=erreur))
+
+        self.metriques.observer("sae_diffusion_duree_secondes",
+                                time.perf_counter() - debut)
+        self.metriques.observer("sae_diffusion_destinataires",
+                                len(connexions),
+                                bornes=Metriques.BORNES_NOMBRE)
+
+    def obtenir_historique_salon_public(self, id_client, nom_salon, sens,
+                                        id_message, nombre):
+        """
+        Cette méthode récupère une page de l'historique d'un salon public,
+        triée par ID de message, à partir d'un curseur :
+        - "AVANT" : les `nombre` derniers messages d'ID inférieur à
+        id_message (0 pour les plus récents) ;
+        - "DEPUIS" : les `nombre` premiers messages d'ID supérieur à
+        id_message.
+
+        Les pages couvertes par l'historique récent sont servies depuis
+        la mémoire, les plus anciennes sont lues en BDD.
+
+        :param id_client: L'ID du client demandeur, qui doit avoir accès
+        au salon.
+        :param nom_salon: Le nom du salon public.
+        :param sens: "AVANT" ou "DEPUIS".
+        :param id_message: L'ID de message servant de curseur.
+        :param nombre: Le nombre de messages souhaité, borné par
+        taille_page_historique.
+        :return: Une chaîne "[PROTOCOLE]PAGE_HISTORIQUE_SALON:<salon>:<sens>:"
+        suivie d'un objet JSON {"messages": [[id, message formaté], ...],
+        "encore": bool}, "encore" indiquant qu'une page suivante existe.
+        """
+
+        id_salon_public = self.index_salons.id_salon(nom_salon)
+
+        if (id_salon_public is None or sens not in ("AVANT", "DEPUIS")
+                or not self.verifier_acces_salon_public(id_client,
+                                                        nom_salon)):
+
+            return f"[PROTOCOLE]ERREUR_HISTORIQUE_PUBLIC:{nom_salon}"
+
+        nombre = max(1, min(nombre, self.taille_page_historique))
+
+        # Les pages récentes sont servies depuis la mémoire
+        page = self.historique_recent.page(nom_salon, sens, id_message,
+                                           nombre)
+
+        if page is None:
+
+            try:
+
+                messages, encore = self.lecture_page_historique(
+                    id_salon_public, sens, id_message, nombre)
+
+            except Exception as erreur:
+
+                traces.error("Erreur de récupération de l'historique public",
+                             extra=champs(salon=nom_salon, erreur=erreur))
+                return f"[PROTOCOLE]ERREUR_HISTORIQUE_PUBLIC:{nom_salon}"
+
+            page = json.dumps({"messages": messages, "encore": encore})
+
+        return f"[PROTOCOLE]PAGE_HISTORIQUE_SALON:{nom_salon}:{sens}:{page}"
+
+    def lecture_page_historique(self, id_salon_public, sens, id_message,
+                                nombre):
+        """
+        Lit une page de l'historique d'un salon public dans le journal des
+        messages et en BDD.
+
+        Les messages d'ID inférieur au premier ID du journal sont en BDD :
+        une page est complétée en BDD quand le journal est épuisé dans
+        son sens.
+
+        :param id_salon_public: L'ID du salon public.
+        :param sens: "AVANT" ou "DEPUIS".
+        :param id_message: L'ID de message servant de curseur (0 pour
+        les plus récents avec "AVANT").
+        :param nombre: Le nombre de messages souhaité.
+        :return: Un tuple (messages, encore) : les paires [id, message
+        formaté] triées par ID croissant, et True s'il reste des messages
+        au-delà de la page.
+        """
+
+        limite = self.journal.premier_id() if self.journal else None
+
+        if limite is None:
+
+            return self.lecture_page_historique_bdd(id_salon_public, sens,
+                                                    id_message, nombre)
+
+        if sens == "AVANT":
+
+            messages, encore = self.journal.page(id_salon_public, sens,
+                                                 id_message, nombre)
+
+            if not encore:
+
+                curseur = min(id_message or limite, limite)
+                anciens, encore = self.lecture_page_historique_bdd(
+                    id_salon_public, sens, curseur, nombre - len(messages))
+                messages = anciens + messages
+
+            return messages, encore
+
+        messages, encore = [], False
+
+        if id_message < limite:
+
+            messages, encore = self.lecture_page_historique_bdd(
+                id_salon_public, sens, id_message, nombre)
+
+        if not encore:
+
+            suite, encore = self.journal.page(id_salon_public, sens,
+                                              id_message,
+                                              nombre - len(messages))
+            messages += suite
+
+        return messages, encore
+
+    def lecture_page_historique_bdd(self, id_salon_public, sens, id_message,
+                                    nombre):
+        """
+        Lit en BDD une page de l'historique d'un salon public.
+
+        La requête suit l'index (id_salon_public, id_message) de la table
+        messages et ne lit que la page demandée, plus une ligne indiquant
+        s'il en reste.
+
+        :param id_salon_public: L'ID du salon public.
+        :param sens: "AVANT" ou "DEPUIS".
+        :param id_message: L'ID de message servant de curseur (0 pour
+        les plus récents avec "AVANT").
+        :param nombre: Le nombre de messages souhaité.
+        :return: Un tuple (messages, encore) : les paires [id, message
+        formaté] triées par ID croissant, et True s'il reste des messages
+        au-delà de la page.
+        """
+
+        if sens == "AVANT":
+
+            requete = "page_historique_avant"
+            id_message = id_message or 2 ** 63 - 1
+
+        else:
+
+            requete = "page_historique_depuis"
+
+        resultats = self.acces_donnees.tous(
+            requete, (id_salon_public, id_message, nombre + 1))
+
+        encore = len(resultats) > nombre
+        resultats = resultats[:nombre]
+
+        if sens == "AVANT":
+
+            resultats = resultats[::-1]
+
+        messages = [
+            [id_ligne, f"[{horodatage:%Y-%m-%d %H:%M:%S}] "
+                       f"{nom}/{prenom} : {contenu}"]
+            for id_ligne, horodatage, nom, prenom, contenu in resultats]
+
+        return messages, encore
+
+    def envoi_historique_salons_prives(self, connexion, email_client):
+        """
+        Cette méthode envoie l'historique des messages des salons privés
+        dans lesquels le client spécifié est impliqué, trié par horodatage.
+
+        L'historique est lu page par page (après le dernier id_message
+        envoyé) et envoyé par blocs de taille_bloc_flux messages :
+        "[PROTOCOLE]BLOC_MESSAGES_PRIVES:["[horodatage] contenu", ...]",
+        puis "[PROTOCOLE]FIN_MESSAGES_PRIVES:<nombre de messages>". Chaque
+        bloc attend que le client ait lu les précédents : la mémoire
+        utilisée ne dépend pas de la taille de l'historique.
+
+        Chaque page est lue par une requête courte, la connexion rendue au
+        pool avant d'attendre le client : un client lent ne bloque aucune
+        connexion. L'envoi est abandonné après DUREE_MAX_FLUX secondes.
+
+        :param connexion: La connexion du client.
+        :param email_client: L'adresse e-mail du client.
+        """
+
+        nombre = 0
+        dernier_id = 0
+        limite = time.monotonic() + self.DUREE_MAX_FLUX
+
+        try:
+
+            while True:
+
+                lignes = self.acces_donnees.tous(
+                    "page_historique_prive",
+                    (email_client, email_client, dernier_id,
+                     self.taille_bloc_flux))
+
+                if not lignes:
+
+                    break
+
+                dernier_id = lignes[-1][0]
+                messages = [f"[{horodatage:%Y-%m-%d %H:%M:%S}] {contenu}"
+                            for _, contenu, horodatage in lignes]
+                delai = limite - time.monotonic()
+
+                if not (delai > 0
+                        and connexion.attendre_place(min(delai, 30))
+                        and connexion.envoyer(
+                            f"[PROTOCOLE]BLOC_MESSAGES_PRIVES:"
+                            f"{json.dumps(messages)}")):
+
+                    traces.warning("Envoi de l'historique privé interrompu",
+                                   extra=champs(ip=connexion.ip_client,
+                                                messages=nombre))
+                    return
+
+                nombre += len(messages)
+
+                if len(lignes) < self.taille_bloc_flux:
+
+                    break
+
+            connexion.envoyer(f"[PROTOCOLE]FIN_MESSAGES_PRIVES:{nombre}")
+
+        except Exception as erreur:
+
+            traces.error("Erreur de récupération de l'historique privé",
+                         extra=champs(ip=connexion.ip_client, erreur=erreur))
+            connexion.envoyer("[PROTOCOLE]ERREUR_HISTORIQUE_PRIVE")
+
+    def est_banni(self, email, ip_client):
+        """
+        Cette méthode vérifie si un client est actuellement banni
+        en se basant sur son adresse e-mail et son adresse IP.
+        Elle renvoie True si le client est banni et False sinon.
+
+        :param email: L'adresse e-mail du client.
+        :param ip_client: L'adresse IP du client.
+        :return: True si le client est banni, False sinon.
+        """
+
+        return self.registre_sanctions.expiration(
+            "ban", email, ip_client) is not None
+
+    def est_kick(self, email_client, type_sanction):
+        """
+        Cette méthode consulte le registre des sanctions pour vérifier si
+        le client spécifié est actuellement sous une sanction de type "kick"
+        encore active.
+
+        :param email_client: L'adresse e-mail du client à vérifier.
+        :param type_sanction: Le type de sanction à vérifier ('kick').
+
+        :return: Un tuple (est_sous_sanction, date_expiration) où :
+            - est_sous_sanction est True si le client est sous sanction,
+            sinon False.
+            - date_expiration est la date d'expiration de la sanction
+            si elle est à durée définie, sinon None.
+        """
+
+        expiration = self.registre_sanctions.expiration(type_sanction,
+                                                        email_client)
+
+        if expiration is None:
+
+            return False, None  # Pas de sanction, ou sanction expirée
+
+        if expiration == datetime.datetime.max:
+
+            return True, None  # Sanction à durée indéfinie
+
+        return True, expiration  # Sanction non expirée
+
+    def creation_salon_prive(self, email_client1, email_client2):
+        """
+        Cette méthode crée un salon de discussion privée en enregistrant
+        les adresses e-mail des deux clients participants
+        dans la base de données.
+
+        :param email_client1: L'adresse e-mail du premier client participant.
+        :param email_client2: L'adresse e-mail du deuxième client participant.
+        :return: L'ID du salon de discussion privée créé.
+        """
+
+        with self.acces_donnees.transaction() as transaction:
+
+            transaction.executer("insertion_salon_prive",
+                                 (email_client1, email_client2))
+            transaction.valider()
+            return transaction.dernier_id
+
+    def envoi_message_prive(self, email_expediteur, email_destinataire, 
+                            message):
+        """
+        Cette méthode envoie un message privé entre deux clients en utilisant 
+        leurs adresses e-mail. Elle crée également un salon de discussion 
+        privée si nécessaire. Le message est stocké par l'écriture différée.
+
+        :param email_expediteur: L'adresse e-mail de l'expéditeur du MP.
+        :param email_destinataire: L'adresse e-mail du destinataire du MP.
+        :param message: Le contenu du MP.
+        """
+        
+        if email_expediteur and email_destinataire:
+            
+            id_salon_prive = self.obtenir_creation_salon_prive(
+                email_expediteur, email_destinataire)
+            identite = self.obtenir_identite_par_email(email_expediteur)
+            id_expediteur = identite[0] if identite else None
+            horodatage = datetime.datetime.now().replace(microsecond=0)
+            id_message = self.allouer_id_message()
+            self.metriques.compter("sae_messages_prives_total")
+            self.ecriture_messages.ajouter(
+                (id_message, id_expediteur, message, horodatage, None,
+                 id_salon_prive))
+            entete = f"[{horodatage:%Y-%m-%d %H:%M:%S}] "
+            self.indexation_message(id_message, -id_salon_prive,
+                                    entete + message, len(entete))
+
+            self.retransmettre_message_prive(email_expediteur, 
+                                             email_destinataire, message)
+
+        else:
+            
+            traces.warning("Message privé : email introuvable",
+                           extra=champs(expediteur=email_expediteur,
+                                        destinataire=email_destinataire))
+
+    def retransmettre_message_prive(self, email_expediteur, email_destinataire,
+                                    contenu):
+        """
+        Cette méthode formate un message privé avec les informations fournies
+        (adresse e-mail de l'expéditeur, adresse e-mail du destinataire,
+        contenu) et le retransmet au client destinataire spécifié,
+        quel que soit le processus qui le sert.
+
+        :param email_expediteur: L'adresse e-mail de l'expéditeur du MP.
+        :param email_destinataire: L'adresse e-mail du destinataire du MP.
+        :param contenu: Le contenu du MP.
+        """
+
+        message_formate = f"[MP de {email_expediteur}] {contenu}"
+
+        self.diffusion_locale_message_prive(email_expediteur,
+                                            email_destinataire,
+                                            message_formate)
+        self.publier_bus({"type": "prive", "expediteur": email_expediteur,
+                          "destinataire": email_destinataire,
+                          "message": message_formate})
+
+    def diffusion_locale_message_prive(self, email_expediteur,
+                                       email_destinataire, message_formate):
+        """
+        Envoie un message privé déjà formaté au destinataire, s'il est
+        connecté à ce processus.
+
+        :param email_expediteur: L'adresse e-mail de l'expéditeur du MP.
+        :param email_destinataire: L'adresse e-mail du destinataire du MP.
+        :param message_formate: Le message formaté à retransmettre.
+        """
+
+        for ip_client, session in list(self.sessions.items()):
+            
+            if session.email_client == email_destinataire:
+                
+                try:
+                    
+                    connexion = self.clients[ip_client]
+                    connexion.envoyer(f"[PROTOCOLE]NOUVEAU_MESSAGE_PRIVE:"
+                                      f"{email_expediteur}:{message_formate}")
+                    
+                except Exception as erreur:
+                    
+                    traces.warning("Erreur lors de l'envoi du MP",
+                                   extra=champs(ip=ip_client, erreur=erreur))
+
+    def obtenir_email_par_id(self, id_client):
+        """
+        Obtenir l'adresse e-mail d'un client par son ID.
+
+        Cette méthode récupère l'adresse e-mail d'un client à partir de son ID.
+
+        :param id_client: L'ID du client.
+        :return: L'adresse e-mail du client ou None si non trouvée.
+        """
+
+        identite = self.obtenir_identite_par_id(id_client)
+        return identite[3] if identite else None
+
+    def obtenir_creation_salon_prive(self, email_client1, email_client2):
+        """
+        Cette méthode vérifie si un salon de discussion privée existe déjà
+        entre les deux clients en utilisant leurs adresses e-mail.
+        Si le salon existe, son ID est renvoyé. Sinon, un nouveau
+        salon de discussion privée est créé et son ID est renvoyé.
+
+        :param email_client1: L'adresse e-mail du premier client participant.
+        :param email_client2: L'adresse e-mail du deuxième client participant.
+        :return: L'ID du salon de discussion privée existant ou créé.
+        """
+
+        resultat = self.acces_donnees.un(
+            "id_salon_prive",
+            (email_client1, email_client2, email_client2, email_client1))
+
+        if resultat:
+
+            return resultat[0]
+
+        else:
+
+            return self.creation_salon_prive(email_client1, email_client2)
+
+    def ajouter_acces_salon_public(self, id_client, nom_salon):
+        """
+        Cette méthode permet à un client d'obtenir l'accès à un salon public
+        spécifique en utilisant son ID et le nom du salon. Si le client
+        n'a pas déjà accès au salon, l'accès est ajouté.
+
+        :param id_client: L'ID du client auquel ajouter l'accès.
+        :param nom_salon: Le nom du salon public auquel ajouter l'accès.
+        """
+
+        try:
+
+            if not self.verifier_acces_salon_public(id_client, nom_salon):
+
+                lignes_ajoutees = self.acces_donnees.executer(
+                    "insertion_membre_par_nom_salon", (id_client, nom_salon))
+
+                if lignes_ajoutees:
+
+                    self.mise_a_jour_acces_salon(id_client, nom_salon, True)
+
+        except Exception as erreur:
+
+            traces.error("Erreur lors de l'ajout de l'accès au salon",
+                         extra=champs(erreur=erreur))
+
+    def verifier_acces_salon_public(self, id_client, nom_salon):
+        """
+        Vérifie si un client a accès à un salon public.
+
+        La réponse provient de l'index des salons, tenu à jour à chaque
+        ajout ou retrait d'accès : aucune requête n'est exécutée.
+
+        :param id_client: L'ID du client à vérifier.
+        :param nom_salon: Le nom du salon public à vérifier.
+        :return: True si le client a accès au salon, False sinon.
+        """
+
+        return self.index_salons.est_membre(id_client, nom_salon)
+
+    def obtenir_salons_autorises(self, id_client):
+        """
+        Obtient la liste des salons publics auxquels un client a accès.
+
+        :param id_client: L'ID du client dont on veut connaître
+        les salons autorisés.
+        :return: Une liste des noms des salons publics auxquels
+        le client a accès.
+        """
+
+        try:
+
+            resultats = self.acces_donnees.tous("salons_autorises",
+                                                (id_client,))
+            return [nom_salon for (nom_salon,) in resultats]
+
+        except Exception as erreur:
+
+            traces.error("Erreur de l'obtention des salons accessibles",
+                         extra=champs(client=id_client, erreur=erreur))
+            return []
+
+    def gestion_acces_salons(self, ip_client, nom_salon):
+        """
+        Gère l'accès d'un client à un salon.
+
+        L'accès aux salons soumis à l'administrateur n'est pas décidé
+        ici : la demande est enregistrée et le client en sera informé
+        par "[PROTOCOLE]ACCES_ACCORDE" ou "[PROTOCOLE]ACCES_REFUSE" une
+        fois la décision prise. Un travailleur transmet la demande au
+        maître par le bus.
+
+        :param ip_client: L'adresse IP du client.
+        :param nom_salon: Le nom du salon auquel le client veut accéder.
+        :return: Un message indiquant si l'accès a été accordé, s'il est
+        en attente de décision ou si le salon est inconnu.
+        """
+
+        id_client = self.sessions[ip_client].id_client
+        email_client = self.sessions[ip_client].email_client
+
+        if self.verifier_acces_salon_public(id_client, nom_salon):
+
+            return f"[PROTOCOLE]ACCES_DEJA_ACCORDE:{nom_salon}"
+
+        if nom_salon == "Blabla":
+
+            self.ajouter_acces_salon_public(id_client, nom_salon)
+            return "[PROTOCOLE]ACCES_ACCORDE:Blabla"
+
+        elif nom_salon in ["Comptabilite", "Informatique", "Marketing"]:
+
+            if self.role == "travailleur":
+
+                self.publier_bus({"type": "demande_acces",
+                                  "id_client": id_client,
+                                  "email": email_client, "ip": ip_client,
+                                  "salon": nom_salon})
+
+            else:
+
+                self.enregistrement_demande_acces(id_client, email_client,
+                                                  ip_client, nom_salon)
+
+            return f"[PROTOCOLE]ACCES_EN_ATTENTE:{nom_salon}"
+
+        else:
+
+            return "[PROTOCOLE]SALON_INCONNU"
+
+    def enregistrement_demande_acces(self, id_client, email_client,
+                                     ip_client, nom_salon):
+        """
+        Enregistre une demande d'accès à un salon et la signale à
+        l'administrateur, sauf si la même demande est déjà en attente.
+
+        :param id_client: L'ID du client demandeur.
+        :param email_client: L'adresse e-mail du client demandeur.
+        :param ip_client: L'adresse IP de la connexion du demandeur.
+        :param nom_salon: Le nom du salon demandé.
+        """
+
+        demande = self.demandes_acces.ajouter(id_client, email_client,
+                                              ip_client, nom_salon)
+
+        if demande is not None:
+
+            self.file_admin.put(("demande", demande))
+
+    def lecture_console_admin(self):
+        """
+        Lit les commandes de l'administrateur sur l'entrée standard et les
+        place dans la file de l'administrateur.
+
+        C'est le seul thread à lire la console, une fois l'administrateur
+        authentifié.
+        """
+
+        while True:
+
+            commande = self.lecture_ligne_console(
+                "[ADMIN] Entrez une commande : ")
+
+            if commande is None:
+
+                break
+
+            self.file_admin.put(("commande", commande))
+
+            if commande == "/kill":
+
+                break
+
+    def lecture_ligne_console(self, invite):
+        """
+        Lit une ligne de la console d'administration.
+
+        L'entrée standard est lue directement sur son descripteur, en
+        vérifiant chaque seconde si le serveur s'arrête : un thread resté
+        bloqué dans input() empêcherait l'interpréteur de se terminer
+        (arrêt par signal ou par le bus).
+
+        :param invite: Le texte affiché avant la saisie.
+        :return: La ligne lue, ou None en fin d'entrée ou à l'arrêt.
+        """
+
+        print(invite, end="", flush=True)
+
+        if sys.platform == "win32":
+
+            # select n'accepte pas l'entrée standard sous Windows
+            try:
+
+                return input()
+
+            except EOFError:
+
+                return None
+
+        while b"\n" not in self.tampon_console:
+
+            if self.arret_serveur or self.fin_console:
+
+                if self.fin_console and self.tampon_console:
+
+                    break
+
+                return None
+
+            prets, _, _ = select.select([sys.stdin], [], [], 1)
+
+            if prets:
+
+                donnees = os.read(sys.stdin.fileno(), 4096)
+                self.tampon_console += donnees
+                self.fin_console = not donnees
+
+        ligne, _, self.tampon_console = self.tampon_console.partition(b"\n")
+        return ligne.decode(errors="replace").rstrip("\r")
+
+    def annonce_demande_acces(self, demande):
+        """
+        Signale une nouvelle demande d'accès à l'administrateur.
+
+        :param demande: La demande, telle qu'enregistrée par
+        DemandesAcces.
+        """
+
+        print(f"\nDemande d'accès n°{demande['id']} au salon "
+              f"{demande['salon']} par {demande['ip']}, "
+              f"{demande['email']} : /accorder {demande['id']} ou "
+              f"/refuser {demande['id']}")
+
+    def affichage_demandes_acces(self):
+        """
+        Affiche les demandes d'accès en attente, de la plus ancienne à la
+        plus récente.
+        """
+
+        demandes = self.demandes_acces.en_attente()
+
+        if not demandes:
+
+            print("\nAucune demande d'accès en attente.")
+
+        for demande in demandes:
+
+            attente = (datetime.datetime.now()
+                       - demande["horodatage"]).total_seconds()
+            print(f"n°{demande['id']} : {demande['email']} "
+                  f"({demande['ip']}) -> {demande['salon']}, "
+                  f"depuis {attente:.0f} s")
+
+    def decision_demande_acces(self, id_demande, accorde):
+        """
+        Applique la décision de l'administrateur sur une demande d'accès
+        et en informe le client demandeur.
+
+        :param id_demande: Le numéro de la demande.
+        :param accorde: True si l'accès est accordé, False sinon.
+        """
+
+        demande = self.demandes_acces.retirer(id_demande)
+
+        if demande is None:
+
+            print(f"\nAucune demande d'accès n°{id_demande} en attente.")
+            return
+
+        nom_salon = demande["salon"]
+
+        if accorde:
+
+            self.ajouter_acces_salon_public(demande["id_client"], nom_salon)
+            reponse = f"[PROTOCOLE]ACCES_ACCORDE:{nom_salon}"
+            print(f"\nAccès au salon {nom_salon} accordé à "
+                  f"{demande['email']}.")
+
+        else:
+
+            reponse = f"[PROTOCOLE]ACCES_REFUSE:{nom_salon}"
+            print(f"\nAccès au salon {nom_salon} refusé à "
+                  f"{demande['email']}.")
+
+        self.envoi_message_client(demande["ip"], demande["email"], reponse)
+
+    def envoi_message_client(self, ip_client, email_client, message):
+        """
+        Envoie un message à la connexion d'un client, quel que soit le
+        processus qui la sert.
+
+        :param ip_client: L'adresse IP de la connexion.
+        :param email_client: L'adresse e-mail attendue sur la connexion :
+        rien n'est envoyé si la connexion a changé de client.
+        :param message: Le message à envoyer.
+        """
+
+        self.envoi_local_message_client(ip_client, email_client, message)
+        self.publier_bus({"type": "message_client", "ip": ip_client,
+                          "email": email_client, "message": message})
+
+    def envoi_local_message_client(self, ip_client, email_client, message):
+        """
+        Envoie un message à la connexion d'un client, si elle est servie
+        par ce processus.
+
+        :param ip_client: L'adresse IP de la connexion.
+        :param email_client: L'adresse e-mail attendue sur la connexion.
+        :param message: Le message à envoyer.
+        """
+
+        session = self.sessions.get(ip_client)
+        connexion = self.clients.get(ip_client)
+
+        if (session is None or connexion is None
+                or session.email_client != email_client):
+
+            return
+
+        try:
+
+            connexion.envoyer(message)
+
+        except Exception as erreur:
+
+            traces.warning("Erreur d'envoi",
+                           extra=champs(ip=ip_client, erreur=erreur))
+
+
+class TrameTropGrande(Exception):
+    """
+    Levée lorsqu'un client annonce ou envoie un message dépassant
+    la taille maximale autorisée.
+    """
+
+
+class TamponReception:
+    """
+    Tampon de réception réutilisable d'une connexion.
+
+    Les données sont écrites directement dans un bytearray préalloué
+    (recv_into), puis découpées en messages à travers une memoryview,
+    sans copie intermédiaire. Le découpage se fait sur les octets : un
+    caractère UTF-8 coupé entre deux réceptions n'est décodé qu'une fois
+    complet.
+
+    Deux modes de tramage :
+    - "ligne" : format historique, messages terminés par "\n" ;
+    - "longueur" : chaque message est précédé de sa taille sur 4 octets
+    (big-endian) et peut contenir des retours à la ligne.
+
+    En mode "ligne", la recherche du "\n" reprend là où la précédente
+    s'est arrêtée (analyse) : une ligne reçue par petits morceaux n'est
+    parcourue qu'une fois.
+    """
+
+    def __init__(self, taille_tampon=65536, taille_max_trame=1048576):
+        """
+        Constructeur de la classe TamponReception.
+
+        :param taille_tampon: La taille initiale du tampon, en octets.
+        :param taille_max_trame: La taille maximale d'un message ; au-delà,
+        TrameTropGrande est levée pour protéger la mémoire du serveur.
+        """
+
+        self.tampon = bytearray(taille_tampon)
+        self.vue = memoryview(self.tampon)
+        self.debut = 0
+        self.fin = 0
+        self.analyse = 0
+        self.mode = "ligne"
+        self.taille_max_trame = taille_max_trame
+
+    def zone_libre(self):
+        """
+        Renvoie la partie libre du tampon, où écrire les prochaines données.
+        Les données restantes sont ramenées au début du tampon quand il est
+        plein, et le tampon est agrandi si un message en cours ne tient pas.
+
+        :return: Une memoryview sur la zone libre.
+        """
+
+        if self.fin == len(self.tampon):
+
+            restant = self.fin - self.debut
+
+            if self.debut == 0:
+
+                self.agrandir()
+
+            else:
+
+                self.tampon[:restant] = self.tampon[self.debut:self.fin]
+                self.analyse = max(self.analyse - self.debut, 0)
+                self.debut, self.fin = 0, restant
+
+        return self.vue[self.fin:]
+
+    def agrandir(self):
+        """
+        Double la taille du tampon, dans la limite d'un message maximal.
+        """
+
+        taille_limite = self.taille_max_trame + 4
+
+        if len(self.tampon) >= taille_limite:
+
+            raise TrameTropGrande(f"Message de plus de "
+                                  f"{self.taille_max_trame} octets.")
+
+        nouveau = bytearray(min(len(self.tampon) * 2, taille_limite))
+        nouveau[:self.fin] = self.vue[:self.fin]
+        self.vue.release()
+        self.tampon = nouveau
+        self.vue = memoryview(self.tampon)
+
+    def avancer(self, octets):
+        """
+        Prend en compte des octets écrits dans la zone libre.
+
+        :param octets: Le nombre d'octets reçus.
+        """
+
+        self.fin += octets
+
+    def alimenter(self, donnees):
+        """
+        Copie des octets reçus par un autre moyen que recv_into
+        (mode asyncio).
+
+        :param donnees: Les octets reçus.
+        """
+
+        while donnees:
+
+            zone = self.zone_libre()
+            taille = min(len(zone), len(donnees))
+            zone[:taille] = donnees[:taille]
+            self.avancer(taille)
+            donnees = donnees[taille:]
+
+    def extraire(self):
+        """
+        Extrait le prochain message complet du tampon.
+
+        :return: Le message décodé, ou None s'il n'est pas encore complet.
+        """
+
+        if self.mode == "longueur":
+
+            if self.fin - self.debut < 4:
+
+                return None
+
+            longueur = int.from_bytes(self.vue[self.debut:self.debut + 4],
+                                      "big")
+
+            if longueur > self.taille_max_trame:
+
+                raise TrameTropGrande(f"Message annoncé de {longueur} "
+                                      f"octets.")
+
+            if self.fin - self.debut < 4 + longueur:
+
+                return None
+
+            message = str(self.vue[self.debut + 4:self.debut + 4 + longueur],
+                          "utf-8")
+            self.debut += 4 + longueur
+
+        else:
+
+            position = self.tampon.find(b"\n", max(self.debut, self.analyse),
+                                        self.fin)
+
+            if position == -1:
+
+                self.analyse = self.fin
+
+                if self.fin - self.debut > self.taille_max_trame:
+
+                    raise TrameTropGrande(f"Ligne de plus de "
+                                          f"{self.taille_max_trame} octets.")
+
+                return None
+
+            message = str(self.vue[self.debut:position], "utf-8").strip()
+            self.debut = position + 1
+
+        if self.debut == self.fin:
+
+            self.debut = self.fin = self.analyse = 0
+
+        return message
+
+
+class ConnexionClient:
+    """
+    Connexion d'un client dotée d'une file d'envoi bornée.
+
+    Les méthodes de retransmission déposent leurs messages dans la file
+    sans jamais écrire sur la socket : c'est l'écrivain propre à chaque
+    connexion qui la vide. Un client lent ne bloque donc plus l'expéditeur
+    ni les autres destinataires.
+
+    Lorsque la file dépasse seuil_haut octets, la connexion est considérée
+    saturée jusqu'à ce qu'elle redescende sous seuil_bas. Pendant ce temps,
+    la politique choisie s'applique aux nouveaux messages :
+    - "abandon" : les nouveaux messages sont ignorés ;
+    - "fusion" : un message portant une clé de fusion remplace le message
+    en attente de même clé, les autres sont ignorés ;
+    - "deconnexion" : le client est déconnecté.
+    """
+
+    def __init__(self, ip_client, seuil_haut=1048576, seuil_bas=262144,
+                 politique="abandon"):
+        """
+        Constructeur de la classe ConnexionClient.
+
+        :param ip_client: L'adresse IP du client.
+        :param seuil_haut: Taille de file (octets) déclenchant la saturation.
+        :param seuil_bas: Taille de file (octets) mettant fin à la saturation.
+        :param politique: "abandon", "fusion" ou "deconnexion".
+        """
+
+        self.ip_client = ip_client
+        self.seuil_haut = seuil_haut
+        self.seuil_bas = seuil_bas
+        self.politique = politique
+        self.file = collections.deque()
+        self.octets_en_attente = 0
+        self.messages_abandonnes = 0
+        self.saturee = False
+        self.fermee = False
+        self.verrou_file = threading.Lock()
+        self.place_liberee = threading.Condition(self.verrou_file)
+        self.mode_trame = "ligne"
+        self.tampon_reception = None
+
+    def envoyer(self, message, cle_fusion=None):
+        """
+        Dépose un message dans la file d'envoi de la connexion.
+
+        :param message: Le message à envoyer.
+        :param cle_fusion: Clé identifiant les messages dont seul
+        le plus récent importe (politique "fusion").
+        :return: True si le message a été mis en file, False sinon.
+        """
+
+        donnees = message.encode()
+
+        with self.verrou_file:
+
+            if self.fermee:
+
+                return False
+
+            if self.mode_trame == "longueur":
+
+                donnees = len(donnees).to_bytes(4, "big") + donnees
+
+            if (not self.saturee and self.octets_en_attente + len(donnees)
+                    > self.seuil_haut):
+
+                self.saturee = True
+
+            if self.saturee:
+
+                if self.politique == "deconnexion":
+
+                    deconnecter = True
+
+                elif (self.politique == "fusion" and cle_fusion is not None
+                      and self.remplacer_message(donnees, cle_fusion)):
+
+                    return True
+
+                else:
+
+                    self.messages_abandonnes += 1
+                    return False
+
+            else:
+
+                deconnecter = False
+                self.file.append([donnees, cle_fusion])
+                self.octets_en_attente += len(donnees)
+
+        if deconnecter:
+
+            traces.warning("Client trop lent déconnecté",
+                           extra=champs(ip=self.ip_client))
+            self.interrompre()
+            return False
+
+        self.reveiller_ecrivain()
+        return True
+
+    def activer_tramage_longueur(self):
+        """
+        Passe la connexion en tramage par longueur, dans les deux sens :
+        chaque message est précédé de sa taille sur 4 octets (big-endian).
+        """
+
+        with self.verrou_file:
+
+            self.mode_trame = "longueur"
+
+        self.tampon_reception.mode = "longueur"
+
+    def remplacer_message(self, donnees, cle_fusion):
+        """
+        Remplace le message en attente portant la même clé de fusion.
+        Doit être appelée avec verrou_file acquis.
+
+        :return: True si un message a été remplacé, False sinon.
+        """
+
+        for element in self.file:
+
+            if element[1] == cle_fusion:
+
+                self.octets_en_attente += len(donnees) - len(element[0])
+                element[0] = donnees
+                return True
+
+        return False
+
+    def extraire_messages(self):
+        """
+        Retire de la file tous les messages en attente. Ils restent
+        comptés dans octets_en_attente jusqu'à confirmer_envoi.
+
+        :return: La liste des messages (en octets) à écrire.
+        """
+
+        with self.verrou_file:
+
+            messages = [donnees for donnees, _ in self.file]
+            self.file.clear()
+            return messages
+
+    def confirmer_envoi(self, octets):
+        """
+        Signale que des octets ont été écrits sur la socket, et met fin
+        à la saturation une fois la file redescendue sous seuil_bas.
+
+        :param octets: Le nombre d'octets écrits.
+        """
+
+        with self.verrou_file:
+
+            self.octets_en_attente -= octets
+
+            if self.saturee and self.octets_en_attente <= self.seuil_bas:
+
+                self.saturee = False
+
+            if self.octets_en_attente <= self.seuil_bas:
+
+                self.place_liberee.notify_all()
+
+    def attendre_place(self, delai=30):
+        """
+        Attend que la file redescende sous seuil_bas, pour qu'un envoi en
+        plusieurs blocs avance au rythme du client au lieu d'accumuler
+        ses blocs en mémoire.
+
+        :param delai: L'attente maximale, en secondes.
+        :return: True si la file peut recevoir un bloc, False si la
+        connexion est fermée ou que le client n'a rien lu pendant delai.
+        """
+
+        with self.place_liberee:
+
+            return self.place_liberee.wait_for(
+                lambda: self.fermee or self.octets_en_attente
+                <= self.seuil_bas, delai) and not self.fermee
+
+    def profondeur_file(self):
+        """
+        :return: Un tuple (messages en attente, octets en attente,
+        messages abandonnés).
+        """
+
+        with self.verrou_file:
+
+            return (len(self.file), self.octets_en_attente,
+                    self.messages_abandonnes)
+
+    def reveiller_ecrivain(self):
+        """
+        Signale à l'écrivain de la connexion que la file a des messages à
+        envoyer. À redéfinir par chaque type de connexion (thread
+        écrivain, tâche asyncio).
+        """
+
+        raise NotImplementedError
+
+    def fermer(self):
+        """
+        Marque la connexion comme fermée : plus aucun message
+        n'est accepté.
+        """
+
+        with self.verrou_file:
+
+            self.fermee = True
+            self.place_liberee.notify_all()
+
+    def interrompre(self):
+        """
+        Ferme la connexion sans attendre l'envoi des messages en attente.
+        """
+
+        self.fermer()
+
+
+class ConnexionThread(ConnexionClient):
+    """
+    Connexion du mode "threads" : la file est vidée par un thread
+    écrivain dédié, seul à appeler sendall sur la socket.
+    """
+
+    def __init__(self, socket_client, ip_client, **file_envoi):
+        super().__init__(ip_client, **file_envoi)
+        self.socket_client = socket_client
+        self.condition = threading.Condition()
+        self.thread_ecrivain = threading.Thread(target=self.ecriture,
+                                                daemon=True)
+        self.thread_ecrivain.start()
+
+    def reveiller_ecrivain(self):
+        """
+        Réveille le thread écrivain.
+        """
+
+        with self.condition:
+
+            self.condition.notify()
+
+    def ecriture(self):
+        """
+        Boucle du thread écrivain : attend des messages et les écrit
+        sur la socket, dans l'ordre de leur mise en file.
+        """
+
+        try:
+
+            while True:
+
+                with self.condition:
+
+                    while not self.file and not self.fermee:
+
+                        self.condition.wait()
+
+                if self.fermee:
+
+                    break
+
+                messages = self.extraire_messages()
+
+                if self.mode_trame == "longueur":
+
+                    # Les trames se délimitent d'elles-mêmes : le lot
+                    # peut partir en un seul appel système
+                    messages = [b"".join(messages)]
+
+                for donnees in messages:
+
+                    self.socket_client.sendall(donnees)
+                    self.confirmer_envoi(len(donnees))
+
+        except OSError as erreur:
+
+            if not self.fermee:
+
+                traces.warning("Erreur d'envoi",
+                               extra=champs(ip=self.ip_client, erreur=erreur))
+                self.fermer()
+
+    def fermer(self):
+        """
+        Ferme la connexion. Le shutdown réveille aussi le thread
+        bloqué dans recv sur cette socket.
+        """
+
+        super().fermer()
+        self.reveiller_ecrivain()
+
+        try:
+
+            self.socket_client.shutdown(socket.SHUT_RDWR)
+
+        except OSError:
+
+            pass  # Socket déjà fermée par le client
+
+        self.socket_client.close()
+
+
+class ConnexionAsyncio(ConnexionClient):
+    """
+    Connexion du mode "asyncio" : la file est vidée par une tâche
+    de la boucle d'événements, qui attend que le tampon d'écriture
+    se vide (drain) avant d'écrire le lot suivant. Les autres threads
+    ne font que déposer des messages et réveiller cette tâche.
+    """
+
+    def __init__(self, boucle, ecrivain, ip_client, **file_envoi):
+        super().__init__(ip_client, **file_envoi)
+        self.boucle = boucle
+        self.ecrivain = ecrivain
+        self.evenement_ecriture = asyncio.Event()
+        self.tache_ecriture = boucle.create_task(self.ecriture())
+
+    def reveiller_ecrivain(self):
+        """
+        Réveille la tâche écrivaine, depuis n'importe quel thread.
+        """
+
+        try:
+
+            self.boucle.call_soon_threadsafe(self.evenement_ecriture.set)
+
+        except RuntimeError:
+
+            pass  # Boucle déjà fermée
+
+    async def ecriture(self):
+        """
+        Tâche écrivain : écrit les messages en attente puis attend
+        que le client les ait absorbés.
+        """
+
+        try:
+
+            while not self.fermee:
+
+                await self.evenement_ecriture.wait()
+                self.evenement_ecriture.clear()
+
+                messages = self.extraire_messages()
+
+                for donnees in messages:
+
+                    self.ecrivain.write(donnees)
+
+                await self.ecrivain.drain()
+                self.confirmer_envoi(sum(len(donnees) for donnees in messages))
+
+        except (ConnectionError, OSError) as erreur:
+
+            traces.warning("Erreur d'envoi",
+                           extra=champs(ip=self.ip_client, erreur=erreur))
+            self.fermer()
+
+    def fermer(self):
+
+        super().fermer()
+
+        try:
+
+            self.boucle.call_soon_threadsafe(self.ecrivain.close)
+            self.reveiller_ecrivain()
+
+        except RuntimeError:
+
+            pass  # Boucle déjà fermée
+
+    def interrompre(self):
+        """
+        Abandonne la connexion : close() attendrait que le client lent
+        ait lu tout le tampon d'écriture.
+        """
+
+        super().fermer()
+
+        try:
+
+            self.boucle.call_soon_threadsafe(self.ecrivain.transport.abort)
+            self.reveiller_ecrivain()
+
+        except RuntimeError:
+
+            pass  # Boucle déjà fermée
+
+
+class BusInterProcessus:
+    """
+    Bus local reliant le processus maître aux processus travailleurs
+    par des sockets Unix.
+
+    Les événements sont des dictionnaires sérialisés en JSON, un par ligne.
+    Le maître joue le rôle de concentrateur : il relaie chaque événement
+    reçu d'un travailleur à tous les autres, et ceux qu'il publie lui-même
+    à tous les travailleurs.
+
+    Chaque pair a sa file d'envoi, vidée par un thread dédié : un pair qui
+    ne lit plus ne bloque pas les autres. Au-delà de TAILLE_FILE_MAX
+    événements en attente, il est déconnecté du bus.
+    """
+
+    TAILLE_FILE_MAX = 10000
+
+    def __init__(self, chemin, traitement, perte_concentrateur=None):
+        """
+        Constructeur de la classe BusInterProcessus.
+
+        :param chemin: Le chemin de la socket Unix du concentrateur.
+        :param traitement: La fonction appelée pour chaque événement reçu.
+        :param perte_concentrateur: Côté travailleur, la fonction appelée
+        lorsque la connexion au concentrateur est perdue (arrêt ou mort
+        du maître).
+        """
+
+        self.chemin = chemin
+        self.traitement = traitement
+        self.perte_concentrateur = perte_concentrateur
+        self.socket_bus = None
+        self.pairs = {}
+        self.verrou = threading.Lock()
+
+    def ouvrir_concentrateur(self):
+        """
+        Côté maître : ouvre la socket d'écoute du bus. Elle est ouverte
+        avant la création des travailleurs pour qu'ils puissent s'y
+        connecter dès leur démarrage.
+        """
+
+        if os.path.exists(self.chemin):
+
+            os.remove(self.chemin)
+
+        self.socket_bus = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket_bus.bind(self.chemin)
+        self.socket_bus.listen()
+
+    def demarrer_concentrateur(self):
+        """
+        Côté maître : démarre le thread d'acceptation des travailleurs.
+        """
+
+        threading.Thread(target=self.acceptation_pairs, daemon=True).start()
+
+    def acceptation_pairs(self):
+
+        while True:
+
+            try:
+
+                socket_pair, _ = self.socket_bus.accept()
+
+            except OSError:
+
+                break
+
+            self.ajouter_pair(socket_pair)
+
+    def connecter(self):
+        """
+        Côté travailleur : se connecte au concentrateur du maître.
+        """
+
+        self.socket_bus.close()
+        self.socket_bus = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket_bus.connect(self.chemin)
+        self.pairs = {}
+        self.ajouter_pair(self.socket_bus)
+
+    def ajouter_pair(self, socket_pair):
+        """
+        Enregistre un pair et démarre ses threads de lecture et d'envoi.
+
+        :param socket_pair: La socket du pair.
+        """
+
+        file_envoi = queue.Queue(self.TAILLE_FILE_MAX)
+
+        with self.verrou:
+
+            self.pairs[socket_pair] = file_envoi
+
+        threading.Thread(target=self.envoi_pair,
+                         args=(socket_pair, file_envoi), daemon=True).start()
+        threading.Thread(target=self.lecture, args=(socket_pair,),
+                         daemon=True).start()
+
+    def retirer_pair(self, socket_pair):
+        """
+        Oublie un pair, arrête son thread d'envoi et ferme sa socket (ce
+        qui termine aussi sa lecture).
+
+        :param socket_pair: La socket du pair.
+        """
+
+        with self.verrou:
+
+            file_envoi = self.pairs.pop(socket_pair, None)
+
+        if file_envoi is None:
+
+            return
+
+        try:
+
+            file_envoi.put_nowait(None)
+
+        except queue.Full:
+
+            pass  # Le thread d'envoi s'arrête sur la socket fermée
+
+        try:
+
+            socket_pair.shutdown(socket.SHUT_RDWR)
+
+        except OSError:
+
+            pass
+
+        socket_pair.close()
+
+    def publier(self, evenement, source=None):
+        """
+        Dépose un événement dans la file d'envoi de tous les pairs, sauf
+        de celui dont il provient.
+
+        :param evenement: Le dictionnaire à publier.
+        :param source: La socket du pair émetteur, à exclure du relais.
+        """
+
+        donnees = (json.dumps(evenement) + "\n").encode()
+        satures = []
+
+        with self.verrou:
+
+            for socket_pair, file_envoi in self.pairs.items():
+
+                if socket_pair is source:
+
+                    continue
+
+                try:
+
+                    file_envoi.put_nowait(donnees)
+
+                except queue.Full:
+
+                    satures.append(socket_pair)
+
+        for socket_pair in satures:
+
+            traces.error("Pair du bus saturé, déconnecté",
+                         extra=champs(en_attente=self.TAILLE_FILE_MAX))
+            self.retirer_pair(socket_pair)
+
+    def envoi_pair(self, socket_pair, file_envoi):
+        """
+        Thread d'envoi d'un pair : écrit ses événements dans l'ordre.
+
+        :param socket_pair: La socket du pair.
+        :param file_envoi: Sa file d'envoi (None pour arrêter).
+        """
+
+        while True:
+
+            donnees = file_envoi.get()
+
+            if donnees is None:
+
+                return
+
+            try:
+
+                socket_pair.sendall(donnees)
+
+            except OSError as erreur:
+
+                traces.error("Erreur d'envoi sur le bus",
+                             extra=champs(erreur=erreur))
+                self.retirer_pair(socket_pair)
+                return
+
+    def lecture(self, socket_pair):
+        """
+        Lit les événements d'un pair, les relaie (côté maître)
+        et les transmet à la fonction de traitement.
+
+        :param socket_pair: La socket du pair à lire.
+        """
+
+        try:
+
+            with socket_pair.makefile("rb") as flux:
+
+                for ligne in flux:
+
+                    evenement = json.loads(ligne)
+
+                    if socket_pair is not self.socket_bus:
+
+                        self.publier(evenement, source=socket_pair)
+
+                    try:
+
+                        self.traitement(evenement)
+
+                    except Exception as erreur:
+
+                        traces.error(
+                            "Erreur de traitement d'un événement du bus",
+                            extra=champs(erreur=erreur))
+
+        except (OSError, ValueError):
+
+            pass  # Socket fermée par retirer_pair
+
+        concentrateur = socket_pair is self.socket_bus
+        self.retirer_pair(socket_pair)
+
+        # Sans concentrateur, le travailleur ne recevrait plus rien des
+        # autres processus (messages, sanctions, arrêt) : il s'arrête
+        if concentrateur and self.perte_concentrateur is not None:
+
+            self.perte_concentrateur()
+
+    def fermer(self):
+        """
+        Ferme le bus et, côté maître, supprime le fichier de la socket.
+        """
+
+        self.socket_bus.close()
+
+        if os.path.exists(self.chemin):
+
+            os.remove(self.chemin)
+
+
+class IndexSalons:
+    """
+    Index en mémoire des salons publics d'un processus.
+
+    Il reflète la table membres_salons_publics (membres de chaque salon)
+    et associe à chaque salon l'ensemble des connexions authentifiées
+    de ses membres, afin que la retransmission d'un message ne parcoure
+    que les membres connectés du salon.
+
+    Chaque changement effectif de la liste des membres incrémente une
+    version, qui permet aux clients de détecter un changement manqué.
+    """
+
+    def __init__(self):
+        """
+        Constructeur de la classe IndexSalons.
+        """
+
+        self.verrou = threading.Lock()
+        self.ids_salons = {}
+        self.membres = collections.defaultdict(set)
+        self.salons_client = collections.defaultdict(set)
+        self.connexions = collections.defaultdict(set)
+        self.connexions_client = collections.defaultdict(set)
+        self.client_connexion = {}
+        self.etiquettes = {}
+        self.version = 0
+        self.instantane = None
+
+    def charger(self, lignes):
+        """
+        Remplace les membres connus par ceux lus en BDD.
+
+        :param lignes: Les tuples (nom_salon, id_client, nom, prenom,
+        email).
+        """
+
+        with self.verrou:
+
+            self.membres.clear()
+            self.salons_client.clear()
+
+            for nom_salon, id_client, nom, prenom, email in lignes:
+
+                self.membres[nom_salon].add(id_client)
+                self.salons_client[id_client].add(nom_salon)
+                self.etiquettes[id_client] = f"{nom} {prenom}:{email}"
+
+            self.version += 1
+            self.instantane = None
+
+    def charger_salons(self, lignes):
+        """
+        Remplace les salons publics connus par ceux lus en BDD.
+
+        :param lignes: Les paires (nom_salon, id_salon_public).
+        """
+
+        with self.verrou:
+
+            self.ids_salons = dict(lignes)
+
+    def id_salon(self, nom_salon):
+        """
+        Donne l'ID d'un salon public à partir de son nom.
+
+        :param nom_salon: Le nom du salon public.
+        :return: L'ID du salon, ou None s'il n'existe pas.
+        """
+
+        return self.ids_salons.get(nom_salon)
+
+    def ajouter_membre(self, id_client, nom_salon, etiquette=None):
+        """
+        Ajoute un membre à un salon, ainsi que ses connexions ouvertes.
+
+        :param id_client: L'ID du client.
+        :param nom_salon: Le nom du salon public.
+        :param etiquette: Le libellé "Nom Prenom:email" du client, s'il
+        n'est pas encore connu de l'index.
+        :return: La nouvelle version des membres, ou None si le client
+        était déjà membre du salon.
+        """
+
+        with self.verrou:
+
+            if etiquette is not None:
+
+                self.etiquettes[id_client] = etiquette
+
+            if id_client in self.membres[nom_salon]:
+
+                return None
+
+            self.membres[nom_salon].add(id_client)
+            self.salons_client[id_client].add(nom_salon)
+            self.connexions[nom_salon].update(
+                self.connexions_client.get(id_client, ()))
+            self.version += 1
+            self.instantane = None
+            return self.version
+
+    def retirer_membre(self, id_client, nom_salon):
+        """
+        Retire un membre d'un salon, ainsi que ses connexions ouvertes.
+
+        :param id_client: L'ID du client.
+        :param nom_salon: Le nom du salon public.
+        :return: La nouvelle version des membres, ou None si le client
+        n'était pas membre du salon.
+        """
+
+        with self.verrou:
+
+            if id_client not in self.membres.get(nom_salon, ()):
+
+                return None
+
+            self.membres[nom_salon].discard(id_client)
+            self.salons_client[id_client].discard(nom_salon)
+            self.connexions[nom_salon].difference_update(
+                self.connexions_client.get(id_client, ()))
+            self.version += 1
+            self.instantane = None
+            return self.version
+
+    def etiquette(self, id_client):
+        """
+        Donne le libellé d'un membre tel qu'envoyé aux clients.
+
+        :param id_client: L'ID du client.
+        :return: La chaîne "Nom Prenom:email", ou None si le client
+        n'est pas connu de l'index.
+        """
+
+        with self.verrou:
+
+            return self.etiquettes.get(id_client)
+
+    def instantane_membres(self):
+        """
+        Donne la liste complète des membres de chaque salon, avec sa
+        version. Le JSON est gardé en cache jusqu'au prochain changement.
+
+        :return: Le couple (version, JSON de la liste
+        [[nom_salon, ["Nom Prenom:email", ...]], ...]).
+        """
+
+        with self.verrou:
+
+            if self.instantane is None:
+
+                salons = [
+                    [nom_salon, sorted(self.etiquettes.get(id_client, "")
+                                       for id_client in membres)]
+                    for nom_salon, membres in sorted(self.membres.items())
+                    if membres]
+                self.instantane = (self.version, json.dumps(salons))
+
+            return self.instantane
+
+    def est_membre(self, id_client, nom_salon):
+        """
+        Indique si un client est membre d'un salon public.
+
+        :param id_client: L'ID du client.
+        :param nom_salon: Le nom du salon public.
+        :return: True si le client est membre du salon, False sinon.
+        """
+
+        with self.verrou:
+
+            return id_client in self.membres.get(nom_salon, ())
+
+    def connecter(self, connexion, id_client):
+        """
+        Enregistre une connexion authentifiée dans les salons du client.
+
+        :param connexion: La connexion du client.
+        :param id_client: L'ID du client authentifié.
+        """
+
+        self.deconnecter(connexion)
+
+        with self.verrou:
+
+            self.client_connexion[connexion] = id_client
+            self.connexions_client[id_client].add(connexion)
+
+            for nom_salon in self.salons_client.get(id_client, ()):
+
+                self.connexions[nom_salon].add(connexion)
+
+    def deconnecter(self, connexion):
+        """
+        Retire une connexion de tous les salons.
+
+        :param connexion: La connexion fermée.
+        """
+
+        with self.verrou:
+
+            id_client = self.client_connexion.pop(connexion, None)
+
+            if id_client is None:
+
+                return
+
+            self.connexions_client[id_client].discard(connexion)
+
+            if not self.connexions_client[id_client]:
+
+                del self.connexions_client[id_client]
+
+            for nom_salon in self.salons_client.get(id_client, ()):
+
+                self.connexions[nom_salon].discard(connexion)
+
+    def connexions_salon(self, nom_salon):
+        """
+        Donne les destinataires d'un message publié dans un salon.
+
+        :param nom_salon: Le nom du salon public.
+        :return: Une copie des connexions des membres connectés du salon.
+        """
+
+        with self.verrou:
+
+            return list(self.connexions.get(nom_salon, ()))
+
+    def voisins(self, id_client):
+        """
+        Donne les clients qui partagent au moins un salon avec un client.
+
+        :param id_client: L'ID du client.
+        :return: L'ensemble des IDs des membres de ses salons.
+        """
+
+        with self.verrou:
+
+            voisins = set()
+
+            for nom_salon in self.salons_client.get(id_client, ()):
+
+                voisins.update(self.membres.get(nom_salon, ()))
+
+            return voisins
+
+    def salons_membre(self, id_client):
+        """
+        Donne les IDs des salons publics dont un client est membre.
+
+        :param id_client: L'ID du client.
+        :return: L'ensemble des IDs de ses salons.
+        """
+
+        with self.verrou:
+
+            return {self.ids_salons[nom_salon]
+                    for nom_salon in self.salons_client.get(id_client, ())
+                    if nom_salon in self.ids_salons}
+
+    def connexions_voisins(self, id_client):
+        """
+        Donne les connexions des membres connectés des salons d'un client.
+
+        :param id_client: L'ID du client.
+        :return: L'ensemble des connexions concernées.
+        """
+
+        with self.verrou:
+
+            connexions = set()
+
+            for nom_salon in self.salons_client.get(id_client, ()):
+
+                connexions.update(self.connexions.get(nom_salon, ()))
+
+            return connexions
+
+    def connexions_authentifiees(self):
+        """
+        Donne toutes les connexions authentifiées de ce processus.
+
+        :return: Une copie de la liste des connexions.
+        """
+
+        with self.verrou:
+
+            return list(self.client_connexion)
+
+
+class CacheIdentites:
+    """
+    Cache LRU des identités des clients (id, nom, prénom, email),
+    consultable par ID comme par adresse e-mail.
+
+    Ces données ne changent presque jamais : elles sont lues une fois en
+    BDD puis servies depuis la mémoire. Au-delà de taille_max entrées,
+    le client utilisé le moins récemment est oublié.
+    """
+
+    def __init__(self, taille_max=10000):
+        """
+        Constructeur de la classe CacheIdentites.
+
+        :param taille_max: Le nombre maximal de clients gardés en cache.
+        """
+
+        self.taille_max = taille_max
+        self.par_id = collections.OrderedDict()
+        self.id_par_email = {}
+        self.succes = 0
+        self.echecs = 0
+        self.verrou = threading.Lock()
+
+    def obtenir_par_id(self, id_client):
+        """
+        Cherche un client dans le cache par son ID.
+
+        :param id_client: L'ID du client.
+        :return: Le tuple (id_client, nom, prenom, email), ou None s'il
+        n'est pas en cache.
+        """
+
+        with self.verrou:
+
+            identite = self.par_id.get(id_client)
+
+            if identite is None:
+
+                self.echecs += 1
+                return None
+
+            self.par_id.move_to_end(id_client)
+            self.succes += 1
+            return identite
+
+    def obtenir_par_email(self, email_client):
+        """
+        Cherche un client dans le cache par son adresse e-mail.
+
+        :param email_client: L'adresse e-mail du client.
+        :return: Le tuple (id_client, nom, prenom, email), ou None s'il
+        n'est pas en cache.
+        """
+
+        with self.verrou:
+
+            id_client = self.id_par_email.get(email_client)
+
+            if id_client is None:
+
+                self.echecs += 1
+                return None
+
+            self.par_id.move_to_end(id_client)
+            self.succes += 1
+            return self.par_id[id_client]
+
+    def ajouter(self, id_client, nom, prenom, email):
+        """
+        Place ou remplace l'identité d'un client dans le cache.
+
+        :param id_client: L'ID du client.
+        :param nom: Le nom du client.
+        :param prenom: Le prénom du client.
+        :param email: L'adresse e-mail du client.
+        :return: Le tuple (id_client, nom, prenom, email) mis en cache.
+        """
+
+        identite = (id_client, nom, prenom, email)
+
+        with self.verrou:
+
+            ancienne = self.par_id.pop(id_client, None)
+
+            if ancienne is not None:
+
+                self.id_par_email.pop(ancienne[3], None)
+
+            self.par_id[id_client] = identite
+            self.id_par_email[email] = id_client
+
+            while len(self.par_id) > self.taille_max:
+
+                _, oubliee = self.par_id.popitem(last=False)
+                self.id_par_email.pop(oubliee[3], None)
+
+        return identite
+
+    def invalider(self, id_client=None, email_client=None):
+        """
+        Oublie un client, désigné par son ID ou son adresse e-mail.
+
+        :param id_client: L'ID du client.
+        :param email_client: L'adresse e-mail du client.
+        """
+
+        with self.verrou:
+
+            if id_client is None:
+
+                id_client = self.id_par_email.get(email_client)
+
+            identite = self.par_id.pop(id_client, None)
+
+            if identite is not None:
+
+                self.id_par_email.pop(identite[3], None)
+
+    def statistiques(self):
+        """
+        Donne l'occupation du cache et ses compteurs, pour le dimensionner.
+
+        :return: Un tuple (entrées en cache, succès, échecs).
+        """
+
+        with self.verrou:
+
+            return len(self.par_id), self.succes, self.echecs
+
+
+class DemandesAcces:
+    """
+    Registre des demandes d'accès aux salons en attente de la décision de
+    l'administrateur.
+
+    Chaque demande reçoit un numéro, par lequel l'administrateur y répond.
+    Une demande identique (même client, même salon) à une demande encore
+    en attente n'est pas enregistrée une seconde fois.
+    """
+
+    def __init__(self):
+        """
+        Constructeur de la classe DemandesAcces.
+        """
+
+        self.verrou = threading.Lock()
+        self.numeros = itertools.count(1)
+        self.demandes = {}
+        self.par_client = {}
+
+    def ajouter(self, id_client, email_client, ip_client, nom_salon):
+        """
+        Enregistre une demande d'accès.
+
+        :param id_client: L'ID du client demandeur.
+        :param email_client: L'adresse e-mail du client demandeur.
+        :param ip_client: L'adresse IP de la connexion du demandeur.
+        :param nom_salon: Le nom du salon demandé.
+        :return: La demande enregistrée (dictionnaire), ou None si la
+        même demande est déjà en attente.
+        """
+
+        with self.verrou:
+
+            if (id_client, nom_salon) in self.par_client:
+
+                demande = self.demandes[self.par_client[id_client,
+                                                        nom_salon]]
+                # La réponse ira à la connexion la plus récente
+                demande["ip"] = ip_client
+                return None
+
+            demande = {"id": next(self.numeros), "id_client": id_client,
+                       "email": email_client, "ip": ip_client,
+                       "salon": nom_salon,
+                       "horodatage": datetime.datetime.now()}
+            self.demandes[demande["id"]] = demande
+            self.par_client[id_client, nom_salon] = demande["id"]
+            return demande
+
+    def retirer(self, id_demande):
+        """
+        Retire une demande traitée.
+
+        :param id_demande: Le numéro de la demande.
+        :return: La demande, ou None si elle n'est pas en attente.
+        """
+
+        with self.verrou:
+
+            demande = self.demandes.pop(id_demande, None)
+
+            if demande is not None:
+
+                del self.par_client[demande["id_client"], demande["salon"]]
+
+            return demande
+
+    def en_attente(self):
+        """
+        Donne les demandes en attente.
+
+        :return: La liste des demandes, de la plus ancienne à la plus
+        récente.
+        """
+
+        with self.verrou:
+
+            return list(self.demandes.values())
+
+
+class RegistreSanctions:
+    """
+    Registre en mémoire des sanctions actives (ban, kick, mute).
+
+    Chaque sanction est indexée par email et par IP : une vérification
+    n'est qu'une lecture de dictionnaire. Les sanctions à durée limitée
+    sont aussi rangées dans un tas trié par date d'expiration, d'où elles
+    sont retirées au fil des vérifications, sans requête à la BDD.
+    """
+
+    def __init__(self):
+        """
+        Constructeur de la classe RegistreSanctions.
+        """
+
+        self.verrou = threading.Lock()
+        self.par_email = collections.defaultdict(dict)
+        self.par_ip = collections.defaultdict(dict)
+        self.echeances = []
+
+    def charger(self, lignes):
+        """
+        Remplace les sanctions connues par celles lues en BDD.
+
+        :param lignes: Les tuples (type_sanction, email_client, ip_client,
+        horodatage_sanction, duree_sanction).
+        """
+
+        with self.verrou:
+
+            self.par_email.clear()
+            self.par_ip.clear()
+            self.echeances.clear()
+
+        for ligne in lignes:
+
+            self.ajouter(*ligne)
+
+    def ajouter(self, type_sanction, email_client, ip_client,
+                horodatage=None, duree=None):
+        """
+        Enregistre une sanction.
+
+        :param type_sanction: "ban", "kick" ou "mute".
+        :param email_client: L'adresse e-mail du client sanctionné.
+        :param ip_client: L'adresse IP associée à la sanction.
+        :param horodatage: La date de début de la sanction.
+        :param duree: La durée en minutes, ou None si elle est indéfinie.
+        """
+
+        if duree is None:
+
+            expiration = datetime.datetime.max
+
+        else:
+
+            expiration = horodatage + datetime.timedelta(minutes=duree)
+
+            if expiration <= datetime.datetime.now():
+
+                return
+
+        with self.verrou:
+
+            for index, cle, autre in (
+                    (self.par_email, email_client, ip_client),
+                    (self.par_ip, ip_client, email_client)):
+
+                sanctions = index[type_sanction].setdefault(cle, {})
+                sanctions[autre] = max(expiration,
+                                       sanctions.get(autre, expiration))
+
+            if duree is not None:
+
+                heapq.heappush(self.echeances, (expiration, type_sanction,
+                                                email_client, ip_client))
+
+    def retirer(self, type_sanction, email_client):
+        """
+        Retire toutes les sanctions d'un type visant un email.
+
+        :param type_sanction: "ban", "kick" ou "mute".
+        :param email_client: L'adresse e-mail du client.
+        """
+
+        with self.verrou:
+
+            for ip_client in list(
+                    self.par_email[type_sanction].get(email_client, ())):
+
+                self.suppression(type_sanction, email_client, ip_client)
+
+    def expiration(self, type_sanction, email_client=None, ip_client=None):
+        """
+        Cherche une sanction active visant un email ou une IP.
+
+        :param type_sanction: "ban", "kick" ou "mute".
+        :param email_client: L'adresse e-mail à vérifier.
+        :param ip_client: L'adresse IP à vérifier.
+        :return: La date d'expiration la plus lointaine (datetime.max pour
+        une sanction indéfinie), ou None si aucune sanction n'est active.
+        """
+
+        with self.verrou:
+
+            self.purge_echeances()
+            expirations = []
+
+            if email_client is not None:
+
+                expirations.extend(
+                    self.par_email[type_sanction].get(email_client,
+                                                      {}).values())
+
+            if ip_client is not None:
+
+                expirations.extend(
+                    self.par_ip[type_sanction].get(ip_client, {}).values())
+
+            return max(expirations) if expirations else None
+
+    def purge_echeances(self):
+        """
+        Retire les sanctions arrivées à expiration, en tête du tas.
+        Doit être appelée verrou acquis.
+        """
+
+        maintenant = datetime.datetime.now()
+
+        while self.echeances and self.echeances[0][0] <= maintenant:
+
+            expiration, type_sanction, email_client, ip_client = (
+                heapq.heappop(self.echeances))
+
+            # Une sanction plus longue a pu remplacer celle-ci
+            if (self.par_email[type_sanction].get(email_client, {})
+                    .get(ip_client) == expiration):
+
+                self.suppression(type_sanction, email_client, ip_client)
+
+    def suppression(self, type_sanction, email_client, ip_client):
+        """
+        Retire une sanction des deux index. Doit être appelée verrou acquis.
+        """
+
+        for index, cle, autre in (
+                (self.par_email, email_client, ip_client),
+                (self.par_ip, ip_client, email_client)):
+
+            sanctions = index[type_sanction].get(cle)
+
+            if sanctions is not None:
+
+                sanctions.pop(autre, None)
+
+                if not sanctions:
+
+                    del index[type_sanction][cle]
+
+
+class LimiteurDebit:
+    """
+    Limitation du débit des commandes clients par seaux à jetons.
+
+    Chaque catégorie de commandes (discussion, historique,
+    authentification) a ses règles : jusqu'à trois seaux, chacun défini
+    par sa capacité (la rafale tolérée) et son débit de remplissage
+    (jetons par seconde) :
+    - "connexion" : un seau par connexion ;
+    - "utilisateur" : un seau par email, pour un client authentifié ;
+    - "adresse" : un seau par IP, pour les commandes sans utilisateur
+    établi (authentification, inscription, ou avant authentification).
+    Tous les clients derrière une même IP (NAT) le partagent : sa
+    capacité doit en tenir compte.
+    Un message prend un jeton dans chacun des seaux de sa catégorie ; s'il
+    en manque, la politique s'applique :
+    - "retard" : le message attend ses jetons, au plus attente_max
+    secondes, puis est refusé au-delà ;
+    - "abandon" : le message est refusé ;
+    - "mute" : le message est refusé et, après seuil_mute refus en moins
+    de fenetre_mute secondes pour un même utilisateur, ses messages de
+    discussion valent un mute automatique. Les messages acceptés entre
+    deux refus ne remettent pas ce compte à zéro : un flot soutenu, dont
+    un message passe à chaque jeton regagné, est muté lui aussi.
+
+    Les refus et retards sont comptés par utilisateur (ou par IP) et par
+    catégorie.
+
+    Les seaux "utilisateur" et "adresse" sont rangés du moins au plus
+    récemment utilisé : ceux restés inutilisés assez longtemps pour être
+    de nouveau pleins (jetons réservés par les messages retardés
+    compris), donc identiques à un nouveau seau, sont retirés au fil des
+    contrôles, comme les compteurs sans limitation depuis
+    retention_compteurs secondes. La mémoire reste ainsi proportionnelle
+    aux utilisateurs actifs.
+    """
+
+    CATEGORIES = {
+        "DISCUSSION_PUBLIQUE": "discussion",
+        "DISCUSSION_PRIVEE": "discussion",
+        "REQUETE_HISTORIQUE_SALON": "historique",
+        "REQUETE_HISTORIQUE_SALONS_PRIVES": "historique",
+        "RECHERCHE": "historique",
+        "AUTHENTIFICATION": "authentification",
+        "INSCRIPTION": "authentification",
+    }
+
+    def __init__(self, regles=None, politique="retard", attente_max=2.0,
+                 seuil_mute=20, fenetre_mute=10, duree_mute=5,
+                 retention_compteurs=3600):
+        """
+        Constructeur de la classe LimiteurDebit.
+
+        :param regles: Pour chaque catégorie, les paires (capacité, débit)
+        de ses seaux "connexion", "utilisateur" et "adresse".
+        :param politique: "retard", "abandon" ou "mute".
+        :param attente_max: L'attente maximale d'un message retardé, en
+        secondes.
+        :param seuil_mute: Le nombre de refus menant au mute automatique.
+        :param fenetre_mute: La durée en secondes dans laquelle ces refus
+        doivent survenir.
+        :param duree_mute: La durée du mute automatique, en minutes.
+        :param retention_compteurs: La durée en secondes pendant laquelle
+        les compteurs d'un utilisateur sans nouvelle limitation sont
+        gardés pour /limites.
+        """
+
+        self.regles = regles or {}
+        self.politique = politique
+        self.attente_max = attente_max
+        self.seuil_mute = seuil_mute
+        self.fenetre_mute = fenetre_mute
+        self.duree_mute = duree_mute
+        self.retention_compteurs = retention_compteurs
+        self.verrou = threading.Lock()
+        self.seaux = {"connexion": {},
+                      "utilisateur": collections.OrderedDict(),
+                      "adresse": collections.OrderedDict()}
+
+        # Clé -> instant où tous ses seaux seront de nouveau pleins
+        self.instant_plein = {"utilisateur": {}, "adresse": {}}
+
+        # Clé -> instants de ses seuil_mute derniers refus, de la clé la
+        # moins récemment refusée à la plus récente
+        self.refus = collections.OrderedDict()
+
+        # Clé -> [dernière limitation, Counter {(catégorie, issue): nombre}]
+        self.compteurs = collections.OrderedDict()
+
+    def controler(self, categorie, connexion, utilisateur, adresse):
+        """
+        Décide du sort d'un message d'une catégorie limitée.
+
+        :param categorie: La catégorie de la commande.
+        :param connexion: La connexion qui l'a envoyée.
+        :param utilisateur: L'email du client authentifié, ou None pour
+        une commande sans utilisateur établi (seau "adresse").
+        :param adresse: L'IP de la connexion.
+        :return: Le tuple (issue, attente) : issue "accepte", "retarde",
+        "refuse" ou "mute", et attente le délai en secondes avant de
+        traiter un message retardé.
+        """
+
+        regle = self.regles.get(categorie)
+
+        if regle is None:
+
+            return "accepte", 0.0
+
+        maintenant = time.monotonic()
+        cle = utilisateur if utilisateur is not None else adresse
+
+        with self.verrou:
+
+            self.expiration(maintenant)
+            seaux = []
+            seau_cle = None
+
+            for portee, cle_seau in (
+                    ("connexion", connexion),
+                    ("utilisateur" if utilisateur is not None
+                     else "adresse", cle)):
+
+                if portee not in regle:
+
+                    continue
+
+                capacite, debit = regle[portee]
+                seaux_portee = self.seaux[portee]
+                seau = seaux_portee.setdefault(cle_seau, {}).setdefault(
+                    categorie, [capacite, maintenant])
+                seau[0] = min(capacite,
+                              seau[0] + (maintenant - seau[1]) * debit)
+                seau[1] = maintenant
+                seaux.append((seau, capacite, debit))
+
+                if portee != "connexion":
+
+                    seaux_portee.move_to_end(cle_seau)
+                    seau_cle = (portee, cle_seau, seau, capacite, debit)
+
+            attente = max([max(0.0, (1 - seau[0]) / debit)
+                           for seau, _, debit in seaux], default=0.0)
+            issue = "refuse"
+
+            if attente == 0 or (self.politique == "retard"
+                                and attente <= self.attente_max):
+
+                # Un message retardé réserve ses jetons : le suivant
+                # attendra les siens après lui
+                for seau, _, _ in seaux:
+
+                    seau[0] -= 1
+
+                issue = "accepte" if attente == 0 else "retarde"
+
+            if seau_cle is not None:
+
+                # Les seaux des autres catégories de la clé ne changent
+                # pas : ils seront pleins au plus tard à l'instant connu
+                portee, cle_seau, seau, capacite, debit = seau_cle
+                instants = self.instant_plein[portee]
+                instants[cle_seau] = max(
+                    instants.get(cle_seau, maintenant),
+                    maintenant + (capacite - seau[0]) / debit)
+
+            if issue == "accepte":
+
+                return "accepte", 0.0
+
+            if issue == "retarde":
+
+                self.compter(cle, categorie, "retarde", maintenant)
+                return "retarde", attente
+
+            self.compter(cle, categorie, "refuse", maintenant)
+            refus = self.refus.setdefault(
+                cle, collections.deque(maxlen=self.seuil_mute))
+            refus.append(maintenant)
+            self.refus.move_to_end(cle)
+
+            if (self.politique == "mute" and categorie == "discussion"
+                    and len(refus) == self.seuil_mute
+                    and maintenant - refus[0] <= self.fenetre_mute):
+
+                refus.clear()
+                self.compter(cle, categorie, "mute", maintenant)
+                return "mute", 0.0
+
+            return "refuse", 0.0
+
+    def compter(self, cle, categorie, issue, maintenant):
+        """
+        Compte une limitation. Doit être appelée verrou acquis.
+        """
+
+        entree = self.compteurs.get(cle)
+
+        if entree is None:
+
+            entree = self.compteurs[cle] = [maintenant,
+                                            collections.Counter()]
+
+        entree[0] = maintenant
+        entree[1][categorie, issue] += 1
+        self.compteurs.move_to_end(cle)
+
+    def expiration(self, maintenant):
+        """
+        Retire les seaux par utilisateur et par adresse redevenus pleins,
+        les refus sortis de la fenêtre du mute et les compteurs trop
+        anciens. Les plus anciens étant en tête,
+        chaque appel ne parcourt que ce qu'il retire. Doit être appelée
+        verrou acquis.
+
+        :param maintenant: L'instant du contrôle (time.monotonic()).
+        """
+
+        for portee, instants in self.instant_plein.items():
+
+            seaux_portee = self.seaux[portee]
+
+            while seaux_portee:
+
+                cle = next(iter(seaux_portee))
+
+                if maintenant < instants[cle]:
+
+                    break
+
+                del seaux_portee[cle]
+                del instants[cle]
+
+        while self.refus:
+
+            cle, refus = next(iter(self.refus.items()))
+
+            if refus and maintenant - refus[-1] <= self.fenetre_mute:
+
+                break
+
+            del self.refus[cle]
+
+        while self.compteurs:
+
+            cle, (derniere_limitation, _) = next(
+                iter(self.compteurs.items()))
+
+            if maintenant - derniere_limitation < self.retention_compteurs:
+
+                break
+
+            del self.compteurs[cle]
+
+    def oublier(self, connexion):
+        """
+        Retire les seaux d'une connexion fermée. Ceux de son utilisateur
+        expirent d'eux-mêmes une fois pleins.
+
+        :param connexion: La connexion fermée.
+        """
+
+        with self.verrou:
+
+            self.seaux["connexion"].pop(connexion, None)
+
+    def statistiques(self, nombre=10):
+        """
+        Donne les totaux des messages retardés, refusés et mutés, et les
+        utilisateurs les plus limités, sur les retention_compteurs
+        dernières secondes d'activité de chacun.
+
+        :param nombre: Le nombre d'utilisateurs à donner.
+        :return: Le tuple (totaux par issue, [(utilisateur, {(catégorie,
+        issue): nombre}), ...]) trié par nombre de limitations décroissant.
+        """
+
+        with self.verrou:
+
+            self.expiration(time.monotonic())
+            totaux = collections.Counter()
+            par_utilisateur = []
+
+            for utilisateur, (_, compteurs) in self.compteurs.items():
+
+                for (_, issue), total in compteurs.items():
+
+                    totaux[issue] += total
+
+                par_utilisateur.append((utilisateur, dict(compteurs)))
+
+        plus_limites = sorted(par_utilisateur,
+                              key=lambda paire: -sum(paire[1].values()))
+        return dict(totaux), plus_limites[:nombre]
+
+
+class Stockage:
+    """
+    Moteur de stockage : tout ce qui dépend de la BDD utilisée.
+
+    Les requêtes nommées de AccesDonnees, groupées par domaine (clients,
+    salons publics et leurs membres, messages, salons privés, sanctions
+    et historique des IP), forment l'interface commune aux moteurs. Un
+    moteur fournit :
+    - ouvrir() : une nouvelle connexion au sens de pymysql (curseurs
+    utilisables dans un bloc with et paramètres %s, commit, rollback,
+    ping, open et close), prêtée ensuite par le pool ;
+    - REQUETES : les requêtes de AccesDonnees réécrites dans son
+    dialecte, s'il y a lieu ;
+    - CLASSE_CURSEUR_FLUX : la classe de curseur des lectures en flux ;
+    - la création du schéma et des index, pour MigrationsSchema.
+    """
+
+    nom = None
+    REQUETES = {}
+    CLASSE_CURSEUR_FLUX = None
+    REQUETE_TABLE_VERSIONS = None
+
+    def ouvrir(self):
+        """
+        Ouvre une nouvelle connexion à la BDD. À redéfinir par chaque
+        moteur.
+
+        :return: La connexion, au sens de pymysql.
+        """
+
+        raise NotImplementedError
+
+    def creation_schema(self, curseur):
+        """
+        Crée les tables manquantes du schéma. À redéfinir par chaque
+        moteur.
+
+        :param curseur: Un curseur de la BDD.
+        """
+
+        raise NotImplementedError
+
+    def index_existe(self, curseur, table, nom_index):
+        """
+        Vérifie si un index existe déjà sur une table. À redéfinir par
+        chaque moteur.
+
+        :param curseur: Un curseur de la BDD.
+        :param table: Le nom de la table.
+        :param nom_index: Le nom de l'index.
+        :return: True si l'index existe, False sinon.
+        """
+
+        raise NotImplementedError
+
+    def creation_index(self, curseur, table, nom_index, unique, colonnes):
+        """
+        Crée un index sur une table. À redéfinir par chaque moteur.
+
+        :param curseur: Un curseur de la BDD.
+        :param table: Le nom de la table.
+        :param nom_index: Le nom de l'index.
+        :param unique: True pour un index d'unicité.
+        :param colonnes: Les colonnes indexées.
+        """
+
+        raise NotImplementedError
+
+
+class StockageMySQL(Stockage):
+    """
+    Moteur de stockage MySQL, via pymysql. Le schéma est importé depuis
+    BDD/bdd_sae_302.sql.
+    """
+
+    nom = "MySQL"
+    CLASSE_CURSEUR_FLUX = pymysql.cursors.SSCursor
+    REQUETE_TABLE_VERSIONS = """
+        CREATE TABLE IF NOT EXISTS versions_schema (
+            version INT NOT NULL PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            horodatage_application DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+    """
+
+    def __init__(self, parametres):
+        """
+        Constructeur de la classe StockageMySQL.
+
+        :param parametres: Les paramètres de pymysql.connect (host, port,
+        user, password, db).
+        """
+
+        self.parametres = parametres
+
+    def ouvrir(self):
+        """
+        Ouvre une connexion au serveur MySQL.
+
+        :return: La connexion pymysql.
+        """
+
+        return pymysql.connect(**self.parametres)
+
+    def creation_schema(self, curseur):
+        """
+        Rien à créer : les tables viennent de l'import du fichier SQL.
+
+        :param curseur: Un curseur de la BDD.
+        """
+
+    def index_existe(self, curseur, table, nom_index):
+        """
+        Vérifie si un index existe déjà sur une table.
+
+        :param curseur: Un curseur de la BDD.
+        :param table: Le nom de la table.
+        :param nom_index: Le nom de l'index.
+        :return: True si l'index existe, False sinon.
+        """
+
+        curseur.execute("""
+            SELECT COUNT(*) FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            AND INDEX_NAME = %s
+        """, (table, nom_index))
+        (nombre,) = curseur.fetchone()
+
+        return nombre > 0
+
+    def creation_index(self, curseur, table, nom_index, unique, colonnes):
+        """
+        Crée un index sur une table.
+
+        :param curseur: Un curseur de la BDD.
+        :param table: Le nom de la table.
+        :param nom_index: Le nom de l'index.
+        :param unique: True pour un index d'unicité.
+        :param colonnes: Les colonnes indexées.
+        """
+
+        curseur.execute(f"ALTER TABLE {table} ADD "
+                        f"{'UNIQUE ' if unique else ''}INDEX {nom_index} "
+                        f"({', '.join(colonnes)})")
+
+
+class StockageSQLite(Stockage):
+    """
+    Moteur de stockage SQLite embarqué : toute la BDD tient dans un
+    fichier, sans serveur à installer.
+
+    La base est ouverte en mode WAL : les lectures ne bloquent pas
+    l'écriture, et plusieurs connexions du pool, voire plusieurs
+    processus travailleurs, peuvent la partager. Le schéma, repris de
+    BDD/bdd_sae_302.sql, et ses données initiales sont créés au premier
+    démarrage.
+    """
+
+    nom = "SQLite"
+    # Les curseurs sqlite3 lisent déjà les lignes à la demande
+    CLASSE_CURSEUR_FLUX = None
+    REQUETE_TABLE_VERSIONS = """
+        CREATE TABLE IF NOT EXISTS versions_schema (
+            version INTEGER NOT NULL PRIMARY KEY,
+            description TEXT NOT NULL,
+            horodatage_application DATETIME
+            DEFAULT (datetime('now', 'localtime'))
+        )
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS clients (
+            id_client INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom VARCHAR(255) NOT NULL,
+            prenom VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            mot_de_passe VARCHAR(255) NOT NULL,
+            permission VARCHAR(255) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS historique_ip (
+            id_historique INTEGER PRIMARY KEY AUTOINCREMENT,
+            ip_client VARCHAR(16) NOT NULL,
+            email_client VARCHAR(255) NOT NULL,
+            horodatage_connexion DATETIME
+            DEFAULT (datetime('now', 'localtime'))
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS salons_publics (
+            id_salon_public INTEGER PRIMARY KEY AUTOINCREMENT,
+            nom_salon VARCHAR(255) NOT NULL,
+            description VARCHAR(255) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS membres_salons_publics (
+            id_membre INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_client INTEGER NOT NULL REFERENCES clients (id_client),
+            id_salon_public INTEGER NOT NULL
+            REFERENCES salons_publics (id_salon_public)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS salons_prives (
+            id_salon_prive INTEGER PRIMARY KEY AUTOINCREMENT,
+            email_participant_1 VARCHAR(255) NOT NULL,
+            email_participant_2 VARCHAR(255) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id_message INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_client INTEGER NOT NULL REFERENCES clients (id_client),
+            contenu TEXT NOT NULL,
+            horodatage DATETIME NOT NULL,
+            id_salon_public INTEGER
+            REFERENCES salons_publics (id_salon_public),
+            id_salon_prive INTEGER REFERENCES salons_prives (id_salon_prive)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sanctions (
+            id_sanction INTEGER PRIMARY KEY AUTOINCREMENT,
+            type_sanction TEXT NOT NULL
+            CHECK (type_sanction IN ('ban', 'kick', 'mute')),
+            duree_sanction INTEGER,
+            motif_sanction TEXT NOT NULL,
+            ip_client VARCHAR(16) NOT NULL,
+            email_client VARCHAR(255) NOT NULL,
+            horodatage_sanction DATETIME
+            DEFAULT (datetime('now', 'localtime'))
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS membres_id_client
+        ON membres_salons_publics (id_client)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS membres_id_salon_public
+        ON membres_salons_publics (id_salon_public)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS messages_id_client
+        ON messages (id_client)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS messages_id_salon_prive
+        ON messages (id_salon_prive)
+        """,
+    ]
+
+    DONNEES_INITIALES = [
+        """
+        INSERT OR IGNORE INTO clients VALUES
+        (1, 'admin', 'admin', 'admin@admin.com', 'admin', 'administrateur')
+        """,
+        """
+        INSERT OR IGNORE INTO salons_publics VALUES
+        (1, 'General', 'Salon par défaut.'),
+        (2, 'Blabla', 'Accès automatique sur demande.'),
+        (3, 'Comptabilite', 'Accès sur traitement de la demande.'),
+        (4, 'Informatique', 'Accès sur traitement de la demande.'),
+        (5, 'Marketing', 'Accès sur traitement de la demande.')
+        """,
+    ]
+
+    def __init__(self, chemin, delai_verrou=10):
+        """
+        Constructeur de la classe StockageSQLite.
+
+        :param chemin: Le chemin du fichier de la base.
+        :param delai_verrou: L'attente maximale, en secondes, d'une
+        écriture bloquée par une autre.
+        """
+
+        self.chemin = chemin
+        self.delai_verrou = delai_verrou
+
+        # Dates échangées au format DATETIME de MySQL
+        sqlite3.register_adapter(
+            datetime.datetime, lambda date: date.isoformat(" "))
+        sqlite3.register_converter(
+            "DATETIME",
+            lambda valeur: datetime.datetime.fromisoformat(valeur.decode()))
+
+    def ouvrir(self):
+        """
+        Ouvre une connexion à la base SQLite.
+
+        :return: Une ConnexionSQLite.
+        """
+
+        return ConnexionSQLite(self.chemin, self.delai_verrou)
+
+    def creation_schema(self, curseur):
+        """
+        Crée les tables manquantes et les données initiales (compte
+        administrateur et salons publics).
+
+        :param curseur: Un curseur de la BDD.
+        """
+
+        for requete in self.SCHEMA + self.DONNEES_INITIALES:
+
+            curseur.execute(requete)
+
+        curseur.connection.commit()
+
+    def index_existe(self, curseur, table, nom_index):
+        """
+        Vérifie si un index existe déjà sur une table.
+
+        :param curseur: Un curseur de la BDD.
+        :param table: Le nom de la table.
+        :param nom_index: Le nom de l'index.
+        :return: True si l'index existe, False sinon.
+        """
+
+        curseur.execute("""
+            SELECT COUNT(*) FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = %s AND name = %s
+        """, (table, nom_index))
+        (nombre,) = curseur.fetchone()
+
+        return nombre > 0
+
+    def creation_index(self, curseur, table, nom_index, unique, colonnes):
+        """
+        Crée un index sur une table.
+
+        :param curseur: Un curseur de la BDD.
+        :param table: Le nom de la table.
+        :param nom_index: Le nom de l'index.
+        :param unique: True pour un index d'unicité.
+        :param colonnes: Les colonnes indexées.
+        """
+
+        curseur.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX "
+                        f"{nom_index} ON {table} ({', '.join(colonnes)})")
+
+
+class ConnexionSQLite:
+    """
+    Connexion SQLite présentée comme une connexion pymysql, pour que le
+    pool, AccesDonnees et l'écriture différée s'en servent sans
+    distinction.
+    """
+
+    def __init__(self, chemin, delai_verrou):
+        """
+        Constructeur de la classe ConnexionSQLite.
+
+        :param chemin: Le chemin du fichier de la base.
+        :param delai_verrou: L'attente maximale d'un verrou d'écriture,
+        en secondes.
+        """
+
+        # La connexion est prêtée par le pool à un thread à la fois
+        self.lien = sqlite3.connect(chemin, timeout=delai_verrou,
+                                    check_same_thread=False,
+                                    detect_types=sqlite3.PARSE_DECLTYPES)
+        self.lien.execute("PRAGMA journal_mode = WAL")
+        self.lien.execute("PRAGMA synchronous = NORMAL")
+        self.lien.execute("PRAGMA foreign_keys = ON")
+        self.open = True
+
+    def cursor(self, classe=None):
+        """
+        Ouvre un curseur.
+
+        :param classe: Ignorée, pour la compatibilité avec pymysql.
+        :return: Un CurseurSQLite.
+        """
+
+        return CurseurSQLite(self)
+
+    def commit(self):
+
+        self.lien.commit()
+
+    def rollback(self):
+
+        self.lien.rollback()
+
+    def ping(self, reconnect=False):
+        """
+        Vérifie que la connexion est utilisable.
+
+        :param reconnect: Ignoré, pour la compatibilité avec pymysql.
+        :exception sqlite3.Error: Si la connexion est fermée.
+        """
+
+        self.lien.execute("SELECT 1")
+
+    def close(self):
+
+        self.open = False
+        self.lien.close()
+
+
+class CurseurSQLite:
+    """
+    Curseur SQLite acceptant les paramètres %s de pymysql.
+    """
+
+    def __init__(self, connexion):
+        """
+        Constructeur de la classe CurseurSQLite.
+
+        :param connexion: La ConnexionSQLite du curseur.
+        """
+
+        self.connection = connexion
+        self.curseur = connexion.lien.cursor()
+
+    def execute(self, requete, parametres=None):
+        """
+        Exécute une requête.
+
+        :param requete: La requête, avec des paramètres %s.
+        :param parametres: Les valeurs des paramètres.
+        :return: Le nombre de lignes modifiées (-1 pour une lecture).
+        """
+
+        self.curseur.execute(requete.replace("%s", "?"),
+                             tuple(parametres or ()))
+        return self.curseur.rowcount
+
+    def executemany(self, requete, lignes):
+        """
+        Exécute une requête pour chacune des lignes.
+
+        :param requete: La requête, avec des paramètres %s.
+        :param lignes: Les valeurs des paramètres de chaque exécution.
+        :return: Le nombre de lignes modifiées.
+        """
+
+        self.curseur.executemany(requete.replace("%s", "?"),
+                                 [tuple(ligne) for ligne in lignes])
+        return self.curseur.rowcount
+
+    def fetchone(self):
+
+        return self.curseur.fetchone()
+
+    def fetchall(self):
+
+        return self.curseur.fetchall()
+
+    def fetchmany(self, taille):
+
+        return self.curseur.fetchmany(taille)
+
+    @property
+    def lastrowid(self):
+
+        return self.curseur.lastrowid
+
+    @property
+    def rowcount(self):
+
+        return self.curseur.rowcount
+
+    def close(self):
+
+        self.curseur.close()
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exception):
+
+        self.close()
+
+
+class PoolEpuise(Exception):
+    """
+    Levée lorsqu'aucune connexion à la BDD ne se libère avant le délai
+    d'acquisition.
+    """
+
+
+class PoolConnexions:
+    """
+    Pool de connexions à la BDD partagé par tous les threads d'un
+    processus.
+
+    Chaque traitement emprunte une connexion le temps de ses requêtes puis
+    la rend au pool, ce qui permet de régler le nombre de connexions à la
+    BDD indépendamment du nombre de clients. Une connexion restée inactive
+    plus de intervalle_verification secondes est testée (ping) avant d'être
+    prêtée ; une connexion perdue en cours d'utilisation ("MySQL server has
+    gone away"...) est écartée et remplacée au prochain emprunt.
+    """
+
+    def __init__(self, ouverture, taille_min=2, taille_max=10,
+                 delai_acquisition=5, intervalle_verification=30):
+        """
+        Constructeur de la classe PoolConnexions.
+
+        :param ouverture: La fonction ouvrant une nouvelle connexion.
+        :param taille_min: Le nombre de connexions ouvertes au démarrage.
+        :param taille_max: Le nombre maximal de connexions simultanées.
+        :param delai_acquisition: L'attente maximale d'une connexion libre,
+        en secondes, avant de lever PoolEpuise.
+        :param intervalle_verification: La durée d'inactivité, en secondes,
+        au-delà de laquelle une connexion est testée avant d'être prêtée.
+        """
+
+        self.ouverture = ouverture
+        self.taille_min = taille_min
+        self.taille_max = taille_max
+        self.delai_acquisition = delai_acquisition
+        self.intervalle_verification = intervalle_verification
+        self.libres = collections.deque()
+        self.nombre_ouvertes = 0
+        self.condition = threading.Condition()
+        self.acquisitions = 0
+        self.attentes = 0
+        self.temps_attente_total = 0.0
+        self.temps_attente_max = 0.0
+        self.expirations = 0
+        self.reconnexions = 0
+
+    def remplir(self):
+        """
+        Ouvre les taille_min premières connexions.
+
+        :exception: Les erreurs de connexion à la BDD sont propagées.
+        """
+
+        while self.nombre_ouvertes < self.taille_min:
+
+            lien_bdd = self.ouverture()
+
+            with self.condition:
+
+                self.nombre_ouvertes += 1
+                self.libres.append((lien_bdd, time.monotonic()))
+
+    def acquerir(self):
+        """
+        Emprunte une connexion, en attendant au plus delai_acquisition
+        secondes qu'une connexion se libère si le pool est plein.
+
+        :return: Une connexion à la BDD utilisable.
+        :exception PoolEpuise: Si le délai d'acquisition est dépassé.
+        """
+
+        debut = time.monotonic()
+        echeance = debut + self.delai_acquisition
+
+        with self.condition:
+
+            while not self.libres and self.nombre_ouvertes >= self.taille_max:
+
+                restant = echeance - time.monotonic()
+
+                if restant <= 0:
+
+                    self.expirations += 1
+                    raise PoolEpuise(f"Aucune connexion libre après "
+                                     f"{self.delai_acquisition} s.")
+
+                self.condition.wait(restant)
+
+            attente = time.monotonic() - debut
+            self.acquisitions += 1
+            self.temps_attente_total += attente
+            self.temps_attente_max = max(self.temps_attente_max, attente)
+
+            if attente > 0.001:
+
+                self.attentes += 1
+
+            if self.libres:
+
+                # Dernière connexion rendue en premier : les plus anciennes
+                # restent inactives et sont vérifiées avant réutilisation
+                lien_bdd, dernier_usage = self.libres.pop()
+
+            else:
+
+                lien_bdd, dernier_usage = None, None
+                self.nombre_ouvertes += 1
+
+        if lien_bdd is None:
+
+            return self.ouverture_connexion()
+
+        if time.monotonic() - dernier_usage > self.intervalle_verification:
+
+            try:
+
+                lien_bdd.ping(reconnect=False)
+
+            except Exception:
+
+                self.fermeture_silencieuse(lien_bdd)
+                self.reconnexions += 1
+                return self.ouverture_connexion()
+
+        return lien_bdd
+
+    def ouverture_connexion(self):
+        """
+        Ouvre une connexion pour une place déjà réservée dans le pool,
+        et libère cette place en cas d'échec.
+
+        :return: La nouvelle connexion à la BDD.
+        """
+
+        try:
+
+            return self.ouverture()
+
+        except Exception:
+
+            with self.condition:
+
+                self.nombre_ouvertes -= 1
+                self.condition.notify()
+
+            raise
+
+    def liberer(self, lien_bdd, valide=True):
+        """
+        Rend une connexion au pool, ou l'écarte si elle n'est plus valide.
+
+        :param lien_bdd: La connexion empruntée.
+        :param valide: False si la connexion a été perdue.
+        """
+
+        if not valide:
+
+            self.fermeture_silencieuse(lien_bdd)
+
+        with self.condition:
+
+            if valide:
+
+                self.libres.append((lien_bdd, time.monotonic()))
+
+            else:
+
+                self.nombre_ouvertes -= 1
+                self.reconnexions += 1
+
+            self.condition.notify()
+
+    @contextlib.contextmanager
+    def connexion(self):
+        """
+        Emprunte une connexion pour la durée d'un bloc with.
+
+        À la fin du bloc, la transaction en cours est annulée : les
+        modifications doivent avoir été validées (commit) dans le bloc.
+        Sans cela, une erreur laisserait la transaction ouverte pour
+        l'emprunteur suivant et, après de simples lectures, la connexion
+        garderait l'instantané REPEATABLE READ d'InnoDB : les écritures
+        validées depuis sur les autres connexions du pool (inscriptions,
+        lots de messages...) lui resteraient invisibles.
+
+        :return: La connexion empruntée.
+        """
+
+        lien_bdd = self.acquerir()
+
+        try:
+
+            yield lien_bdd
+
+        finally:
+
+            # Une connexion perdue ("gone away"...) est écartée ; les
+            # autres sont rendues au pool après annulation de la transaction
+            valide = lien_bdd.open
+
+            if valide:
+
+                try:
+
+                    lien_bdd.rollback()
+
+                except Exception:
+
+                    valide = False
+
+            self.liberer(lien_bdd, valide)
+
+    @contextlib.contextmanager
+    def curseur(self, classe=None):
+        """
+        Emprunte une connexion et ouvre un curseur pour la durée d'un bloc
+        with. La connexion reste accessible par curseur.connection.
+
+        :param classe: La classe de curseur du moteur (curseur par
+        défaut si None).
+        """
+
+        with self.connexion() as lien_bdd:
+
+            with lien_bdd.cursor(classe) as curseur:
+
+                yield curseur
+
+    def statistiques(self):
+        """
+        Donne l'occupation du pool et ses métriques d'acquisition.
+
+        :return: Un dictionnaire des compteurs du pool.
+        """
+
+        with self.condition:
+
+            return {
+                'ouvertes': self.nombre_ouvertes,
+                'libres': len(self.libres),
+                'acquisitions': self.acquisitions,
+                'attentes': self.attentes,
+                'attente_moyenne_ms': (1000 * self.temps_attente_total
+                                       / max(self.acquisitions, 1)),
+                'attente_max_ms': 1000 * self.temps_attente_max,
+                'expirations': self.expirations,
+                'reconnexions': self.reconnexions,
+            }
+
+    def fermer(self):
+        """
+        Ferme les connexions libres du pool.
+        """
+
+        with self.condition:
+
+            libres = list(self.libres)
+            self.libres.clear()
+            self.nombre_ouvertes -= len(libres)
+
+        for lien_bdd, _ in libres:
+
+            self.fermeture_silencieuse(lien_bdd)
+
+    def fermeture_silencieuse(self, lien_bdd):
+        """
+        Ferme une connexion en ignorant les erreurs (connexion déjà perdue).
+        """
+
+        try:
+
+            lien_bdd.close()
+
+        except Exception:
+
+            pass
+
+
+class EcritureDifferee:
+    """
+    Écriture différée des messages en BDD (write-behind).
+
+    Les messages sont déposés dans une file en mémoire et retransmis sans
+    attendre la BDD ; un thread dédié les insère par lots, avec un seul
+    executemany et un seul commit par lot. Un lot part dès qu'il atteint
+    taille_lot messages, ou delai_lot secondes après l'arrivée de son
+    plus ancien message.
+
+    Un lot en échec est réessayé après une attente doublée à chaque essai.
+    S'il échoue encore, ses messages sont écrits un par un : seuls ceux
+    qui échouent seuls sont perdus, et chacun d'eux est tracé (ils ont
+    déjà été retransmis aux clients).
+    """
+
+    REQUETE_INSERTION = """
+        INSERT INTO messages
+        (id_message, id_client, contenu, horodatage, id_salon_public,
+        id_salon_prive)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """
+
+    def __init__(self, pool_bdd, taille_lot=500, delai_lot=0.005,
+                 tentatives=3, delai_tentative=0.1):
+        """
+        Constructeur de la classe EcritureDifferee.
+
+        :param pool_bdd: Le pool de connexions à la BDD.
+        :param taille_lot: Le nombre maximal de messages par lot.
+        :param delai_lot: L'attente maximale d'un message avant son
+        écriture, en secondes.
+        :param tentatives: Le nombre d'essais d'écriture d'un lot avant
+        de l'écrire message par message.
+        :param delai_tentative: L'attente avant le deuxième essai, en
+        secondes, doublée ensuite à chaque essai.
+        """
+
+        self.pool_bdd = pool_bdd
+        self.taille_lot = taille_lot
+        self.delai_lot = delai_lot
+        self.tentatives = tentatives
+        self.delai_tentative = delai_tentative
+        self.file = collections.deque()
+        self.condition = threading.Condition()
+        self.arret = False
+        self.thread_ecriture = threading.Thread(target=self.ecriture,
+                                                daemon=True)
+        self.lots = 0
+        self.lignes = 0
+        self.taille_max = 0
+        self.retard_total = 0.0
+        self.retard_max = 0.0
+        self.lignes_perdues = 0
+
+    def demarrer(self):
+        """
+        Démarre le thread d'écriture.
+        """
+
+        self.thread_ecriture.start()
+
+    def ajouter(self, ligne):
+        """
+        Dépose un message dans la file d'écriture.
+
+        :param ligne: Le tuple (id_message, id_client, contenu, horodatage,
+        id_salon_public, id_salon_prive) à insérer.
+        """
+
+        with self.condition:
+
+            if not self.arret:
+
+                self.file.append((time.monotonic(), ligne))
+
+                # Réveil au premier message (début du délai) ou lot complet
+                if len(self.file) in (1, self.taille_lot):
+
+                    self.condition.notify()
+
+                return
+
+        # File déjà vidée à l'arrêt : écriture immédiate
+        self.ecriture_lot([(time.monotonic(), ligne)])
+
+    def ecriture(self):
+        """
+        Boucle du thread d'écriture : attend qu'un lot soit complet ou que
+        son délai soit écoulé, puis l'écrit.
+        """
+
+        while True:
+
+            with self.condition:
+
+                while not self.file and not self.arret:
+
+                    self.condition.wait()
+
+                if not self.file:
+
+                    return
+
+                echeance = self.file[0][0] + self.delai_lot
+
+                while len(self.file) < self.taille_lot and not self.arret:
+
+                    restant = echeance - time.monotonic()
+
+                    if restant <= 0:
+
+                        break
+
+                    self.condition.wait(restant)
+
+                lot = [self.file.popleft()
+                       for _ in range(min(len(self.file), self.taille_lot))]
+
+            self.ecriture_lot(lot)
+
+    def ecriture_lot(self, lot):
+        """
+        Insère un lot de messages en une seule transaction.
+
+        :param lot: Les couples (instant de dépôt, ligne) à écrire.
+        """
+
+        lignes = [ligne for _, ligne in lot]
+
+        for tentative in range(1, self.tentatives + 1):
+
+            if tentative > 1:
+
+                time.sleep(self.delai_tentative * 2 ** (tentative - 2))
+
+            try:
+
+                with self.pool_bdd.curseur() as curseur:
+
+                    curseur.executemany(self.REQUETE_INSERTION, lignes)
+                    curseur.connection.commit()
+
+                ecrites = len(lignes)
+                break
+
+            except Exception as erreur:
+
+                traces.error("Erreur de l'écriture d'un lot de messages",
+                             extra=champs(messages=len(lignes),
+                                          essai=tentative, erreur=erreur))
+
+        else:
+
+            ecrites = self.ecriture_unitaire(lignes)
+
+        retard = time.monotonic() - lot[0][0]
+
+        with self.condition:
+
+            self.lignes_perdues += len(lignes) - ecrites
+
+            if not ecrites:
+
+                return
+
+            self.lots += 1
+            self.lignes += ecrites
+            self.taille_max = max(self.taille_max, ecrites)
+            self.retard_total += retard
+            self.retard_max = max(self.retard_max, retard)
+
+    def ecriture_unitaire(self, lignes):
+        """
+        Écrit un lot en échec message par message, une transaction chacun,
+        pour ne perdre que les messages qui échouent seuls. Chaque message
+        perdu est tracé.
+
+        :param lignes: Les lignes du lot.
+        :return: Le nombre de messages écrits.
+        """
+
+        ecrites = 0
+        restantes = collections.deque(lignes)
+
+        try:
+
+            with self.pool_bdd.curseur() as curseur:
+
+                while restantes:
+
+                    ligne = restantes.popleft()
+
+                    try:
+
+                        curseur.execute(self.REQUETE_INSERTION, ligne)
+                        curseur.connection.commit()
+                        ecrites += 1
+
+                    except Exception as erreur:
+
+                        self.trace_perte(ligne, erreur)
+                        curseur.connection.rollback()
+
+        except Exception as erreur:
+
+            # Plus de connexion : le reste du lot est perdu
+            for ligne in restantes:
+
+                self.trace_perte(ligne, erreur)
+
+        return ecrites
+
+    @staticmethod
+    def trace_perte(ligne, erreur):
+        """
+        Trace un message retransmis aux clients mais perdu pour la BDD.
+
+        :param ligne: La ligne du message.
+        :param erreur: L'erreur de son écriture.
+        """
+
+        id_message, id_client, _, _, id_salon_public, id_salon_prive = ligne
+        traces.error("Message perdu, non écrit en BDD",
+                     extra=champs(id_message=id_message, client=id_client,
+                                  salon_public=id_salon_public,
+                                  salon_prive=id_salon_prive,
+                                  erreur=erreur))
+
+    def arreter(self):
+        """
+        Écrit les messages encore en file puis arrête le thread d'écriture.
+        """
+
+        with self.condition:
+
+            self.arret = True
+            self.condition.notify()
+
+        if self.thread_ecriture.is_alive():
+
+            self.thread_ecriture.join()
+
+    def statistiques(self):
+        """
+        Donne l'état de la file et les métriques des lots écrits.
+
+        :return: Un dictionnaire des compteurs de l'écriture différée.
+        """
+
+        with self.condition:
+
+            return {
+                'en_attente': len(self.file),
+                'lots': self.lots,
+                'lignes': self.lignes,
+                'taille_moyenne': self.lignes / max(self.lots, 1),
+                'taille_max': self.taille_max,
+                'retard_moyen_ms': (1000 * self.retard_total
+                                    / max(self.lots, 1)),
+                'retard_max_ms': 1000 * self.retard_max,
+                'lignes_perdues': self.lignes_perdues,
+            }
+
+
+class HistoriqueRecent:
+    """
+    Historique récent des salons publics, gardé en mémoire.
+
+    Chaque salon conserve ses capacite derniers messages formatés, triés
+    par ID, alimentés par la retransmission des messages publics. Les pages
+    d'historique couvertes par ces messages sont servies sans requête à la
+    BDD, et leur encodage JSON est gardé jusqu'au message suivant du salon.
+    """
+
+    def __init__(self, capacite=200):
+        """
+        Constructeur de la classe HistoriqueRecent.
+
+        :param capacite: Le nombre de messages gardés par salon.
+        """
+
+        self.capacite = capacite
+        self.verrou = threading.Lock()
+        self.messages = collections.defaultdict(list)
+        self.complets = set()
+        self.pages = collections.defaultdict(dict)
+        self.pages_max = 64
+        self.succes = 0
+        self.echecs = 0
+
+    def charger(self, nom_salon, messages, complet):
+        """
+        Remplace l'historique d'un salon par ses derniers messages lus en
+        BDD.
+
+        :param nom_salon: Le nom du salon public.
+        :param messages: Les paires (id_message, message formaté), triées
+        par ID croissant, au plus capacite.
+        :param complet: True si le salon ne contient pas d'autres messages.
+        """
+
+        with self.verrou:
+
+            self.messages[nom_salon] = [tuple(message)
+                                        for message in messages]
+            self.pages[nom_salon].clear()
+
+            if complet:
+
+                self.complets.add(nom_salon)
+
+            else:
+
+                self.complets.discard(nom_salon)
+
+    def ajouter(self, nom_salon, id_message, message):
+        """
+        Ajoute un message retransmis à l'historique de son salon.
+
+        Les messages arrivent presque toujours dans l'ordre de leurs ID ;
+        ceux d'un autre processus peuvent arriver en retard et sont
+        insérés à leur place.
+
+        :param nom_salon: Le nom du salon public.
+        :param id_message: L'ID du message.
+        :param message: Le message formaté.
+        """
+
+        with self.verrou:
+
+            messages = self.messages[nom_salon]
+
+            if not messages or messages[-1][0] < id_message:
+
+                messages.append((id_message, message))
+
+            else:
+
+                bisect.insort(messages, (id_message, message))
+
+            if len(messages) > self.capacite:
+
+                del messages[0]
+                self.complets.discard(nom_salon)
+
+            self.pages[nom_salon].clear()
+
+    def page(self, nom_salon, sens, id_message, nombre):
+        """
+        Sert une page d'historique depuis la mémoire, si les messages
+        gardés la couvrent entièrement.
+
+        :param nom_salon: Le nom du salon public.
+        :param sens: "AVANT" ou "DEPUIS".
+        :param id_message: L'ID de message servant de curseur (0 pour
+        les plus récents avec "AVANT").
+        :param nombre: Le nombre de messages souhaité.
+        :return: La page encodée en JSON, ou None s'il faut la lire en BDD.
+        """
+
+        cle = (sens, id_message, nombre)
+
+        with self.verrou:
+
+            page = self.pages[nom_salon].get(cle)
+
+            if page is not None:
+
+                self.succes += 1
+                return page
+
+            messages = self.messages[nom_salon]
+            complet = nom_salon in self.complets
+
+            if sens == "AVANT":
+
+                fin = (bisect.bisect_left(messages, (id_message,))
+                       if id_message else len(messages))
+                debut = max(0, fin - nombre)
+
+                # Les messages plus anciens ont pu être oubliés
+                if fin - debut < nombre and not complet:
+
+                    self.echecs += 1
+                    return None
+
+                encore = debut > 0 or not complet
+
+            else:
+
+                # Des messages suivant le curseur ont pu être oubliés
+                if not complet and (not messages
+                                    or messages[0][0] > id_message):
+
+                    self.echecs += 1
+                    return None
+
+                debut = bisect.bisect_left(messages, (id_message + 1,))
+                fin = min(len(messages), debut + nombre)
+                encore = fin < len(messages)
+
+            page = json.dumps({"messages": messages[debut:fin],
+                               "encore": encore})
+
+            if len(self.pages[nom_salon]) >= self.pages_max:
+
+                self.pages[nom_salon].clear()
+
+            self.pages[nom_salon][cle] = page
+            self.succes += 1
+
+            return page
+
+    def statistiques(self):
+        """
+        Donne l'occupation de l'historique et ses compteurs.
+
+        :return: Un tuple (messages gardés, pages servies depuis la
+        mémoire, pages lues en BDD).
+        """
+
+        with self.verrou:
+
+            return (sum(len(messages) for messages in self.messages.values()),
+                    self.succes, self.echecs)
+
+
+class MigrationImpossible(Exception):
+    """
+    Levée lorsqu'une migration ne peut pas s'appliquer sans une
+    intervention manuelle sur les données.
+    """
+
+
+class MigrationsSchema:
+    """
+    Mise à jour versionnée du schéma de la BDD.
+
+    Chaque migration porte un numéro de version. Celles dont le numéro
+    dépasse la version enregistrée dans la table versions_schema sont
+    appliquées dans l'ordre, puis leur version y est enregistrée. Un index
+    déjà présent n'est pas recréé : une migration interrompue peut être
+    relancée sans erreur, sur une BDD existante comme sur une BDD neuve.
+
+    Les vérifications d'une migration portent sur des données que le
+    serveur ne peut pas corriger seul : si l'une d'elles renvoie des
+    lignes, la migration est abandonnée (MigrationImpossible) avec la
+    liste des valeurs en cause.
+    """
+
+    # (version, description, vérifications préalables sous la forme
+    # (requête renvoyant les valeurs en conflit, nature du conflit,
+    # correction à faire),
+    # requêtes de nettoyage préalables, index à créer sous la forme
+    # (table, nom, unique, colonnes))
+    MIGRATIONS = [
+        (1, "Index des requêtes fréquentes et contraintes d'unicité", [
+            # Deux comptes sur le même email empêcheraient la contrainte
+            # d'unicité, et le bon compte à garder ne peut être que choisi
+            # par l'administrateur (messages, salons et sanctions y sont
+            # rattachés)
+            ("""
+            SELECT email, COUNT(*) FROM clients
+            GROUP BY email HAVING COUNT(*) > 1 ORDER BY email
+            """, "email(s) utilisé(s) par plusieurs clients",
+             "ne garder qu'un compte par email dans la table clients, puis "
+             "relancer le serveur"),
+        ], [
+            # Les accès en double empêcheraient la contrainte d'unicité
+            """
+            DELETE FROM membres_salons_publics
+            WHERE id_membre NOT IN (
+                SELECT id_membre FROM (
+                    SELECT MIN(id_membre) AS id_membre
+                    FROM membres_salons_publics
+                    GROUP BY id_client, id_salon_public
+                ) AS membres_conserves
+            )
+            """,
+        ], [
+            ("clients", "email_unique", True, ("email",)),
+            ("salons_publics", "nom_salon", False, ("nom_salon",)),
+            ("salons_prives", "participants", False,
+             ("email_participant_1", "email_participant_2")),
+            ("messages", "salon_public_message", False,
+             ("id_salon_public", "id_message")),
+            ("sanctions", "email_type_sanction", False,
+             ("email_client", "type_sanction")),
+            ("historique_ip", "email_ip", False,
+             ("email_client", "ip_client")),
+            ("membres_salons_publics", "membre_salon_unique", True,
+             ("id_client", "id_salon_public")),
+        ]),
+    ]
+
+    def __init__(self, pool_bdd, stockage):
+        """
+        Constructeur de la classe MigrationsSchema.
+
+        :param pool_bdd: Le pool de connexions à la BDD.
+        :param stockage: Le moteur de stockage, qui fournit le dialecte
+        des créations de tables et d'index.
+        """
+
+        self.pool_bdd = pool_bdd
+        self.stockage = stockage
+
+    def version_actuelle(self, curseur):
+        """
+        Lit la version du schéma, en créant au besoin la table des versions.
+
+        :param curseur: Un curseur de la BDD.
+        :return: La dernière version appliquée, 0 si aucune.
+        """
+
+        curseur.execute(self.stockage.REQUETE_TABLE_VERSIONS)
+        curseur.execute(
+            "SELECT COALESCE(MAX(version), 0) FROM versions_schema")
+        (version,) = curseur.fetchone()
+
+        return version
+
+    def appliquer(self):
+        """
+        Applique les migrations qui ne l'ont pas encore été.
+
+        Une migration en échec interrompt les suivantes et n'est pas
+        enregistrée : elle sera retentée au prochain démarrage.
+
+        :return: La version du schéma après application.
+        """
+
+        with self.pool_bdd.curseur() as curseur:
+
+            self.stockage.creation_schema(curseur)
+            version = self.version_actuelle(curseur)
+
+            for (numero, description, verifications, nettoyages,
+                 liste_index) in self.MIGRATIONS:
+
+                if numero <= version:
+
+                    continue
+
+                for requete, conflit, correction in verifications:
+
+                    curseur.execute(requete)
+                    valeurs = [str(ligne[0]) for ligne in curseur.fetchall()]
+
+                    if valeurs:
+
+                        raise MigrationImpossible(
+                            f"migration {numero} impossible, {len(valeurs)} "
+                            f"{conflit} ({', '.join(valeurs[:20])}"
+                            f"{', ...' if len(valeurs) > 20 else ''}). "
+                            f"Correction : {correction}.")
+
+                for requete in nettoyages:
+
+                    curseur.execute(requete)
+
+                curseur.connection.commit()
+
+                for table, nom_index, unique, colonnes in liste_index:
+
+                    if self.stockage.index_existe(curseur, table, nom_index):
+
+                        continue
+
+                    self.stockage.creation_index(curseur, table, nom_index,
+                                                 unique, colonnes)
+
+                curseur.execute(
+                    "INSERT INTO versions_schema (version, description) "
+                    "VALUES (%s, %s)", (numero, description))
+                curseur.connection.commit()
+                version = numero
+                print(f"Migration du schéma appliquée : version {numero} "
+                      f"({description}).")
+
+        return version
+
+
+class BudgetRequetesDepasse(Exception):
+    """
+    Levée, en mode contrôle, lorsqu'une commande exécute plus de requêtes
+    que son budget.
+    """
+
+
+class AccesDonnees:
+    """
+    Couche d'accès aux données du serveur.
+
+    Toutes les requêtes SQL du serveur y sont déclarées une seule fois,
+    nommées et paramétrées, puis exécutées par leur nom sur une connexion
+    du pool. Chaque exécution est comptée, avec sa durée, pour la commande
+    du protocole en cours de traitement dans le thread.
+
+    Chaque commande peut recevoir un budget de requêtes. En mode contrôle,
+    une commande qui le dépasse lève BudgetRequetesDepasse : une
+    modification qui ferait, par exemple, une requête par destinataire
+    dans DISCUSSION_PUBLIQUE échoue dès les tests.
+    """
+
+    REQUETES = {
+        # Chargements au démarrage
+        "salons_publics": """
+            SELECT nom_salon, id_salon_public FROM salons_publics
+        """,
+        "membres_salons": """
+            SELECT nom_salon, clients.id_client, nom, prenom, email
+            FROM membres_salons_publics
+            JOIN clients
+            ON membres_salons_publics.id_client = clients.id_client
+            JOIN salons_publics ON
+            membres_salons_publics.id_salon_public =
+            salons_publics.id_salon_public
+        """,
+        "id_message_max": """
+            SELECT COALESCE(MAX(id_message), 0) FROM messages
+        """,
+        "messages_a_indexer": """
+            SELECT id_message, horodatage, nom, prenom, contenu,
+            id_salon_public, id_salon_prive
+            FROM messages
+            JOIN clients ON messages.id_client = clients.id_client
+            WHERE id_message > %s
+            ORDER BY id_message
+        """,
+        "sanctions": """
+            SELECT type_sanction, email_client, ip_client,
+            horodatage_sanction, duree_sanction FROM sanctions
+        """,
+        # Clients
+        "authentification": """
+            SELECT id_client, mot_de_passe, permission, nom, prenom
+            FROM clients WHERE email = %s
+        """,
+        "identite_par_id": """
+            SELECT id_client, nom, prenom, email FROM clients
+            WHERE id_client = %s
+        """,
+        "identite_par_email": """
+            SELECT id_client, nom, prenom, email FROM clients
+            WHERE email = %s
+        """,
+        "nombre_clients_email": """
+            SELECT COUNT(*) FROM clients WHERE email = %s
+        """,
+        "insertion_client": """
+            INSERT INTO clients (nom, prenom, email, mot_de_passe, permission)
+            VALUES (%s, %s, %s, %s, %s)
+        """,
+        "insertion_historique_ip": """
+            INSERT INTO historique_ip (email_client, ip_client)
+            SELECT * FROM (SELECT %s, %s) AS tmp
+            WHERE NOT EXISTS (
+                SELECT email_client, ip_client FROM historique_ip
+                WHERE email_client = %s AND ip_client = %s
+            )
+        """,
+        "ips_client": """
+            SELECT DISTINCT ip_client FROM historique_ip
+            WHERE email_client = %s
+        """,
+        # Sanctions
+        "insertion_ban": """
+            INSERT INTO sanctions
+            (type_sanction, motif_sanction, email_client, ip_client)
+            VALUES ('ban', %s, %s,
+            (SELECT ip_client FROM historique_ip WHERE email_client = %s))
+        """,
+        "insertion_mute": """
+            INSERT INTO sanctions
+            (type_sanction, duree_sanction, motif_sanction,
+            email_client, ip_client)
+            VALUES ('mute', %s, %s, %s, COALESCE(%s,
+            (SELECT ip_client FROM historique_ip WHERE email_client = %s
+            LIMIT 1)))
+        """,
+        "insertion_kick": """
+            INSERT INTO sanctions
+            (type_sanction, duree_sanction, motif_sanction,
+            email_client, ip_client)
+            VALUES ('kick', %s, %s, %s,
+            (SELECT ip_client FROM historique_ip WHERE email_client = %s))
+        """,
+        "sanction_par_id": """
+            SELECT type_sanction, email_client, ip_client,
+            horodatage_sanction, duree_sanction FROM sanctions
+            WHERE id_sanction = %s
+        """,
+        "nombre_sanctions": """
+            SELECT COUNT(*) FROM sanctions
+            WHERE type_sanction = %s AND email_client = %s
+        """,
+        "suppression_sanctions": """
+            DELETE FROM sanctions
+            WHERE type_sanction = %s AND email_client = %s
+        """,
+        # Salons publics
+        "id_salon_public": """
+            SELECT id_salon_public FROM salons_publics WHERE nom_salon = %s
+        """,
+        "id_client_par_email": """
+            SELECT id_client FROM clients WHERE email = %s
+        """,
+        "nombre_membres": """
+            SELECT COUNT(*) FROM membres_salons_publics
+            WHERE id_client = %s AND id_salon_public = %s
+        """,
+        "insertion_membre": """
+            INSERT INTO membres_salons_publics (id_client, id_salon_public)
+            VALUES (%s, %s)
+        """,
+        "insertion_membre_par_nom_salon": """
+            INSERT INTO membres_salons_publics (id_client, id_salon_public)
+            SELECT %s, id_salon_public
+            FROM salons_publics WHERE nom_salon = %s
+        """,
+        "suppression_membre": """
+            DELETE FROM membres_salons_publics
+            WHERE id_client = %s AND id_salon_public = %s
+        """,
+        "salons_autorises": """
+            SELECT nom_salon FROM salons_publics
+            JOIN membres_salons_publics ON
+            salons_publics.id_salon_public =
+            membres_salons_publics.id_salon_public
+            WHERE id_client = %s
+        """,
+        # Historique
+        "page_historique_avant": """
+            SELECT id_message, horodatage, nom, prenom, contenu
+            FROM messages
+            JOIN clients ON messages.id_client = clients.id_client
+            WHERE id_salon_public = %s AND id_message < %s
+            ORDER BY id_message DESC
+            LIMIT %s
+        """,
+        "page_historique_depuis": """
+            SELECT id_message, horodatage, nom, prenom, contenu
+            FROM messages
+            JOIN clients ON messages.id_client = clients.id_client
+            WHERE id_salon_public = %s AND id_message > %s
+            ORDER BY id_message ASC
+            LIMIT %s
+        """,
+        "page_historique_prive": """
+            SELECT id_message, contenu, horodatage
+            FROM messages
+            JOIN salons_prives ON
+            messages.id_salon_prive = salons_prives.id_salon_prive
+            WHERE (email_participant_1 = %s OR email_participant_2 = %s)
+              AND id_message > %s
+            ORDER BY id_message
+            LIMIT %s
+        """,
+        # Salons privés
+        "salons_prives_client": """
+            SELECT id_salon_prive, email_participant_1, email_participant_2
+            FROM salons_prives
+            WHERE email_participant_1 = %s OR email_participant_2 = %s
+        """,
+        "id_salon_prive": """
+            SELECT id_salon_prive
+            FROM salons_prives
+            WHERE (email_participant_1 = %s AND email_participant_2 = %s)
+               OR (email_participant_1 = %s AND email_participant_2 = %s)
+        """,
+        "insertion_salon_prive": """
+            INSERT INTO salons_prives
+            (email_participant_1, email_participant_2)
+            VALUES (%s, %s)
+        """,
+    }
+
+    # Nombre maximal de requêtes par commande du protocole
+    BUDGETS = {
+        "TRAMAGE": 0,
+        "AUTHENTIFICATION": 2,
+        "INSCRIPTION": 3,
+        "REQUETE_MEMBRES_SALONS_PUBLICS": 0,
+        "REQUETE_HISTORIQUE_SALON": 1,
+        # Une requête par bloc : dépend de la taille de l'historique
+        "REQUETE_HISTORIQUE_SALONS_PRIVES": None,
+        "ACCES_SALON": 1,
+        "VERIFICATION_SALONS_AUTORISES": 1,
+        "DISCUSSION_PUBLIQUE": 1,
+        "DISCUSSION_PRIVEE": 3,
+        "REQUETE_PRESENCE": 0,
+        "RECHERCHE": 1,
+        "MESSAGE": 0,
+    }
+
+    def __init__(self, pool_bdd, stockage, controle_budgets=False,
+                 metriques=None):
+        """
+        Constructeur de la classe AccesDonnees.
+
+        :param pool_bdd: Le pool de connexions à la BDD.
+        :param stockage: Le moteur de stockage, dont les requêtes
+        remplacent celles de même nom dans REQUETES.
+        :param controle_budgets: True pour lever BudgetRequetesDepasse
+        lorsqu'une commande dépasse son budget (mode test).
+        :param metriques: Les métriques du serveur, où ajouter la durée
+        et les erreurs des requêtes (None pour ne pas les mesurer).
+        """
+
+        self.pool_bdd = pool_bdd
+        self.stockage = stockage
+        self.requetes = dict(self.REQUETES, **stockage.REQUETES)
+        self.controle_budgets = controle_budgets
+        self.metriques = metriques
+        self.local = threading.local()
+        self.verrou = threading.Lock()
+        self.mesures = collections.defaultdict(
+            lambda: {"appels": 0, "requetes": 0, "requetes_max": 0,
+                     "duree": 0.0, "depassements": 0})
+
+    @staticmethod
+    def nom_commande(message):
+        """
+        Donne le nom de la commande du protocole portée par un message.
+
+        :param message: Le message reçu d'un client.
+        :return: Le nom de la commande ("DISCUSSION_PUBLIQUE"...), ou
+        "MESSAGE" pour un message hors protocole.
+        """
+
+        if message.startswith("[PROTOCOLE]"):
+
+            return message[len("[PROTOCOLE]"):].split(":")[0]
+
+        return "MESSAGE"
+
+    @contextlib.contextmanager
+    def commande(self, nom_commande):
+        """
+        Attribue à une commande les requêtes exécutées par ce thread
+        pendant son traitement, puis vérifie son budget.
+
+        :param nom_commande: Le nom de la commande traitée.
+        """
+
+        precedente = getattr(self.local, "commande", None)
+        self.local.commande = [nom_commande, 0, 0.0]
+
+        try:
+
+            yield
+
+        finally:
+
+            _, requetes, duree = self.local.commande
+            self.local.commande = precedente
+            budget = self.BUDGETS.get(nom_commande)
+            depassement = budget is not None and requetes > budget
+
+            with self.verrou:
+
+                mesure = self.mesures[nom_commande]
+                mesure["appels"] += 1
+                mesure["requetes"] += requetes
+                mesure["requetes_max"] = max(mesure["requetes_max"], requetes)
+                mesure["duree"] += duree
+                mesure["depassements"] += depassement
+
+        if depassement and self.controle_budgets:
+
+            raise BudgetRequetesDepasse(
+                f"{nom_commande} : {requetes} requête(s) pour un budget "
+                f"de {budget}")
+
+    def mesure(self, duree):
+        """
+        Compte une requête exécutée pour la commande en cours, ou hors
+        commande (chargements, administration) s'il n'y en a pas.
+
+        :param duree: La durée de la requête, en secondes.
+        """
+
+        commande = getattr(self.local, "commande", None)
+
+        if self.metriques is not None:
+
+            nom_commande = commande[0] if commande else "(hors commande)"
+            self.metriques.observer("sae_bdd_requete_duree_secondes", duree,
+                                    (("commande", nom_commande),))
+
+        if commande is not None:
+
+            commande[1] += 1
+            commande[2] += duree
+            return
+
+        with self.verrou:
+
+            mesure = self.mesures["(hors commande)"]
+            mesure["appels"] += 1
+            mesure["requetes"] += 1
+            mesure["requetes_max"] = 1
+            mesure["duree"] += duree
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Prête une connexion du pool pour une suite de requêtes.
+
+        Les modifications sont validées par TransactionDonnees.valider ;
+        celles qui ne l'ont pas été sont annulées à la fin du bloc.
+
+        :return: Une TransactionDonnees, utilisable dans un bloc with.
+        """
+
+        with self.pool_bdd.curseur() as curseur:
+
+            yield TransactionDonnees(self, curseur)
+
+    def un(self, nom, parametres=()):
+        """
+        Exécute une requête de lecture et renvoie sa première ligne.
+
+        :param nom: Le nom de la requête dans REQUETES.
+        :param parametres: Les paramètres de la requête.
+        :return: La première ligne, ou None.
+        """
+
+        with self.transaction() as transaction:
+
+            return transaction.un(nom, parametres)
+
+    def tous(self, nom, parametres=()):
+        """
+        Exécute une requête de lecture et renvoie toutes ses lignes.
+
+        :param nom: Le nom de la requête dans REQUETES.
+        :param parametres: Les paramètres de la requête.
+        :return: Les lignes lues.
+        """
+
+        with self.transaction() as transaction:
+
+            return transaction.tous(nom, parametres)
+
+    def flux(self, nom, parametres=(), taille_bloc=500):
+        """
+        Exécute une requête de lecture avec le curseur de flux du moteur
+        (SSCursor côté serveur pour MySQL) et renvoie ses lignes bloc par
+        bloc, sans jamais charger tout le résultat en mémoire.
+
+        La connexion reste empruntée jusqu'à la fin du parcours ; un
+        parcours interrompu lit et jette les lignes restantes.
+
+        :param nom: Le nom de la requête dans REQUETES.
+        :param parametres: Les paramètres de la requête.
+        :param taille_bloc: Le nombre maximal de lignes par bloc.
+        :return: Un générateur de listes de lignes.
+        """
+
+        with self.pool_bdd.curseur(
+                self.stockage.CLASSE_CURSEUR_FLUX) as curseur:
+
+            TransactionDonnees(self, curseur).executer(nom, parametres)
+
+            while True:
+
+                lignes = curseur.fetchmany(taille_bloc)
+
+                if not lignes:
+
+                    break
+
+                yield lignes
+
+    def executer(self, nom, parametres=()):
+        """
+        Exécute une requête d'écriture et la valide aussitôt.
+
+        :param nom: Le nom de la requête dans REQUETES.
+        :param parametres: Les paramètres de la requête.
+        :return: Le nombre de lignes modifiées.
+        """
+
+        with self.transaction() as transaction:
+
+            lignes = transaction.executer(nom, parametres)
+            transaction.valider()
+
+            return lignes
+
+    def statistiques(self):
+        """
+        Donne, pour chaque commande, ses appels, ses requêtes et le temps
+        passé en BDD.
+
+        :return: Un dictionnaire {commande: mesures}, les mesures étant
+        appels, requetes, requetes_max, duree (s), depassements et budget.
+        """
+
+        with self.verrou:
+
+            return {nom: dict(mesure, budget=self.BUDGETS.get(nom))
+                    for nom, mesure in self.mesures.items()}
+
+
+class TransactionDonnees:
+    """
+    Suite de requêtes nommées exécutées sur une même connexion du pool.
+    """
+
+    def __init__(self, acces_donnees, curseur):
+        """
+        Constructeur de la classe TransactionDonnees.
+
+        :param acces_donnees: La couche d'accès aux données.
+        :param curseur: Le curseur emprunté au pool.
+        """
+
+        self.acces_donnees = acces_donnees
+        self.curseur = curseur
+
+    def executer(self, nom, parametres=()):
+        """
+        Exécute une requête nommée et la compte pour la commande en cours.
+
+        :param nom: Le nom de la requête dans AccesDonnees.REQUETES.
+        :param parametres: Les paramètres de la requête.
+        :return: Le nombre de lignes lues ou modifiées.
+        """
+
+        debut = time.perf_counter()
+
+        try:
+
+            return self.curseur.execute(self.acces_donnees.requetes[nom],
+                                        parametres)
+
+        except Exception:
+
+            if self.acces_donnees.metriques is not None:
+
+                self.acces_donnees.metriques.compter(
+                    "sae_bdd_erreurs_total", (("requete", nom),))
+
+            raise
+
+        finally:
+
+            self.acces_donnees.mesure(time.perf_counter() - debut)
+
+    def un(self, nom, parametres=()):
+        """
+        Exécute une requête de lecture et renvoie sa première ligne.
+
+        :param nom: Le nom de la requête.
+        :param parametres: Les paramètres de la requête.
+        :return: La première ligne, ou None.
+        """
+
+        self.executer(nom, parametres)
+        return self.curseur.fetchone()
+
+    def tous(self, nom, parametres=()):
+        """
+        Exécute une requête de lecture et renvoie toutes ses lignes.
+
+        :param nom: Le nom de la requête.
+        :param parametres: Les paramètres de la requête.
+        :return: Les lignes lues.
+        """
+
+        self.executer(nom, parametres)
+        return self.curseur.fetchall()
+
+    @property
+    def dernier_id(self):
+        """
+        L'ID AUTO_INCREMENT attribué par la dernière insertion.
+        """
+
+        return self.curseur.lastrowid
+
+    def valider(self):
+        """
+        Valide (commit) les modifications de la transaction.
+        """
+
+        self.curseur.connection.commit()
+
+
+class RegistrePresence:
+    """
+    Présence en ligne des clients.
+
+    Chaque processus compte les connexions authentifiées de chaque client,
+    les siennes comme celles annoncées par les autres processus via le
+    bus : un client est en ligne tant qu'il lui reste une connexion.
+
+    Les changements ne sont pas poussés un par un : un thread les regroupe
+    toutes les `delai` secondes en ne gardant que l'état final de chaque
+    client. Une vague de reconnexions produit ainsi au plus un changement
+    par client, et aucun pour un client reconnecté dans l'intervalle.
+    """
+
+    def __init__(self, delai=0.5):
+        """
+        Constructeur de la classe RegistrePresence.
+
+        :param delai: L'intervalle de regroupement des changements, en
+        secondes.
+        """
+
+        self.delai = delai
+        self.verrou = threading.Lock()
+        self.connexions = {}
+        self.compteurs = collections.Counter()
+        self.emails = {}
+        self.annonces = set()
+        self.modifies = set()
+        self.evenement_arret = threading.Event()
+        self.thread_diffusion = None
+        self.diffusions = 0
+        self.changements = 0
+
+    def connecter(self, connexion, id_client, email):
+        """
+        Compte une connexion authentifiée d'un client de ce processus.
+
+        :param connexion: La connexion du client.
+        :param id_client: L'ID du client.
+        :param email: L'adresse e-mail du client.
+        :return: Les variations (id_client, email, variation) à annoncer
+        aux autres processus.
+        """
+
+        variations = self.deconnecter(connexion)
+
+        with self.verrou:
+
+            self.connexions[connexion] = (id_client, email)
+
+        self.appliquer(id_client, email, 1)
+        variations.append((id_client, email, 1))
+        return variations
+
+    def deconnecter(self, connexion):
+        """
+        Retire une connexion de ce processus, si elle était comptée.
+
+        :param connexion: La connexion fermée.
+        :return: Les variations (id_client, email, variation) à annoncer
+        aux autres processus.
+        """
+
+        with self.verrou:
+
+            entree = self.connexions.pop(connexion, None)
+
+        if entree is None:
+
+            return []
+
+        id_client, email = entree
+        self.appliquer(id_client, email, -1)
+        return [(id_client, email, -1)]
+
+    def appliquer(self, id_client, email, variation):
+        """
+        Ajoute ou retire une connexion au compte d'un client.
+
+        :param id_client: L'ID du client.
+        :param email: L'adresse e-mail du client.
+        :param variation: 1 pour une connexion ouverte, -1 pour une
+        connexion fermée.
+        """
+
+        with self.verrou:
+
+            self.compteurs[id_client] += variation
+
+            if self.compteurs[id_client] <= 0:
+
+                del self.compteurs[id_client]
+
+            self.emails[id_client] = email
+            self.modifies.add(id_client)
+
+    def extraire_changements(self):
+        """
+        Donne les clients dont l'état a changé depuis le dernier appel,
+        et les note comme annoncés.
+
+        :return: Les tuples (id_client, email, en_ligne).
+        """
+
+        with self.verrou:
+
+            changements = []
+
+            for id_client in self.modifies:
+
+                en_ligne = id_client in self.compteurs
+
+                if en_ligne != (id_client in self.annonces):
+
+                    changements.append(
+                        (id_client, self.emails[id_client], en_ligne))
+
+                    if en_ligne:
+
+                        self.annonces.add(id_client)
+
+                    else:
+
+                        self.annonces.discard(id_client)
+
+            self.modifies.clear()
+            self.diffusions += 1
+            self.changements += len(changements)
+            return changements
+
+    def en_ligne(self, ids_clients):
+        """
+        Donne, parmi des clients, ceux annoncés en ligne.
+
+        :param ids_clients: Les IDs des clients.
+        :return: La liste triée de leurs adresses e-mail.
+        """
+
+        with self.verrou:
+
+            return sorted(self.emails[id_client] for id_client in ids_clients
+                          if id_client in self.annonces)
+
+    def demarrer(self, diffusion):
+        """
+        Démarre le thread qui appelle la diffusion toutes les `delai`
+        secondes.
+
+        :param diffusion: La fonction qui pousse les changements.
+        """
+
+        def boucle():
+
+            while not self.evenement_arret.wait(self.delai):
+
+                try:
+
+                    diffusion()
+
+                except Exception as erreur:
+
+                    traces.error("Erreur de la diffusion de la présence",
+                                 extra=champs(erreur=erreur))
+
+        self.thread_diffusion = threading.Thread(target=boucle, daemon=True)
+        self.thread_diffusion.start()
+
+    def arreter(self):
+        """
+        Arrête le thread de diffusion.
+        """
+
+        self.evenement_arret.set()
+
+        if self.thread_diffusion is not None:
+
+            self.thread_diffusion.join()
+
+    def statistiques(self):
+        """
+        Donne le nombre de clients en ligne et le volume des diffusions.
+
+        :return: Le tuple (clients en ligne, diffusions, changements
+        poussés).
+        """
+
+        with self.verrou:
+
+            return len(self.compteurs), self.diffusions, self.changements
+
+
+class SegmentJournal:
+    """
+    Segment du journal des messages : un fichier en ajout seul et l'index
+    en mémoire de ses enregistrements.
+
+    Chaque enregistrement est un en-tête (longueur, CRC32, ID du message)
+    suivi du message en JSON. L'index garde, triés par ID, les IDs et les
+    positions des enregistrements dans le fichier ; les lectures passent
+    par une projection mmap du fichier.
+    """
+
+    ENTETE = struct.Struct(">IIQ")
+
+    def __init__(self, chemin, premier_id):
+        """
+        Constructeur de la classe SegmentJournal.
+
+        :param chemin: Le chemin du fichier du segment.
+        :param premier_id: L'ID du premier message du segment, qui donne
+        son nom au fichier.
+        """
+
+        self.chemin = chemin
+        self.premier_id = premier_id
+        self.ids = array.array("q")
+        self.positions = array.array("q")
+        self.taille = 0
+        self.descripteur = None
+        self.carte = None
+        self.taille_carte = 0
+        self.modifie = False
+
+    @classmethod
+    def encoder(cls, id_message, id_client, message_formate):
+        """
+        Construit l'enregistrement d'un message.
+
+        :param id_message: L'ID du message.
+        :param id_client: L'ID de l'auteur.
+        :param message_formate: Le message tel qu'affiché aux clients.
+        :return: L'enregistrement, en octets.
+        """
+
+        contenu = json.dumps([id_client, message_formate]).encode("utf-8")
+        return cls.ENTETE.pack(len(contenu), zlib.crc32(contenu),
+                               id_message) + contenu
+
+    def indexer(self, id_message, position):
+        """
+        Ajoute un enregistrement à l'index, à sa place dans l'ordre des ID.
+
+        Les ID sont attribués avant l'ajout : deux messages concurrents
+        peuvent arriver dans le désordre.
+
+        :param id_message: L'ID du message.
+        :param position: La position de l'enregistrement dans le fichier.
+        """
+
+        if not self.ids or id_message > self.ids[-1]:
+
+            self.ids.append(id_message)
+            self.positions.append(position)
+            return
+
+        indice = bisect.bisect(self.ids, id_message)
+        self.ids.insert(indice, id_message)
+        self.positions.insert(indice, position)
+
+    def reconstruire(self):
+        """
+        Reconstruit l'index en parcourant le fichier, et le tronque après
+        le dernier enregistrement complet et intact (écriture interrompue
+        par un arrêt brutal).
+
+        :return: Le nombre d'octets retirés de la fin du fichier.
+        """
+
+        with open(self.chemin, "rb") as fichier:
+
+            donnees = fichier.read()
+
+        position = 0
+
+        while position + self.ENTETE.size <= len(donnees):
+
+            longueur, controle, id_message = self.ENTETE.unpack_from(
+                donnees, position)
+            debut = position + self.ENTETE.size
+            contenu = donnees[debut:debut + longueur]
+
+            if len(contenu) < longueur or zlib.crc32(contenu) != controle:
+
+                break
+
+            self.indexer(id_message, position)
+            position = debut + longueur
+
+        if position < len(donnees):
+
+            os.truncate(self.chemin, position)
+
+        self.taille = position
+        return len(donnees) - position
+
+    def ouvrir_ajout(self):
+        """
+        Ouvre le fichier du segment en ajout.
+        """
+
+        if self.descripteur is None:
+
+            self.descripteur = os.open(
+                self.chemin, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def ajouter(self, id_message, enregistrement):
+        """
+        Écrit un enregistrement à la fin du segment, en un seul appel
+        système.
+
+        :param id_message: L'ID du message.
+        :param enregistrement: L'enregistrement encodé.
+        """
+
+        self.ouvrir_ajout()
+        os.write(self.descripteur, enregistrement)
+        self.indexer(id_message, self.taille)
+        self.taille += len(enregistrement)
+        self.modifie = True
+
+    def synchroniser(self):
+        """
+        Force l'écriture sur disque des ajouts du segment.
+
+        :return: True si des ajouts ont été synchronisés.
+        """
+
+        if self.descripteur is None or not self.modifie:
+
+            return False
+
+        self.modifie = False
+        os.fsync(self.descripteur)
+        return True
+
+    def lire(self, indice):
+        """
+        Lit un enregistrement de l'index.
+
+        La projection mmap est refaite quand le fichier a grandi depuis.
+
+        :param indice: La place de l'enregistrement dans l'index.
+        :return: Le tuple (ID du message, ID de l'auteur, message formaté).
+        """
+
+        if self.carte is None or self.taille_carte < self.taille:
+
+            self.fermer_carte()
+
+            with open(self.chemin, "rb") as fichier:
+
+                self.carte = mmap.mmap(fichier.fileno(), self.taille,
+                                       access=mmap.ACCESS_READ)
+
+            self.taille_carte = self.taille
+
+        position = self.positions[indice]
+        longueur, _, id_message = self.ENTETE.unpack_from(self.carte,
+                                                          position)
+        debut = position + self.ENTETE.size
+        id_client, message_formate = json.loads(
+            self.carte[debut:debut + longueur])
+        return id_message, id_client, message_formate
+
+    def enregistrement_brut(self, donnees, indice):
+        """
+        Extrait un enregistrement encodé des octets du segment.
+
+        :param donnees: Le contenu du fichier du segment.
+        :param indice: La place de l'enregistrement dans l'index.
+        :return: L'enregistrement, en octets.
+        """
+
+        position = self.positions[indice]
+        longueur, _, _ = self.ENTETE.unpack_from(donnees, position)
+        return donnees[position:position + self.ENTETE.size + longueur]
+
+    def contenu_dans(self, autre):
+        """
+        Indique si tous les enregistrements du segment sont aussi dans un
+        autre segment.
+
+        :param autre: L'autre segment.
+        :return: True si le segment n'est pas vide et que tous ses ID
+        sont dans l'index de l'autre.
+        """
+
+        for id_message in self.ids:
+
+            indice = bisect.bisect_left(autre.ids, id_message)
+
+            if indice == len(autre.ids) or autre.ids[indice] != id_message:
+
+                return False
+
+        return bool(self.ids)
+
+    def fermer_carte(self):
+        """
+        Libère la projection mmap du segment.
+        """
+
+        if self.carte is not None:
+
+            self.carte.close()
+            self.carte = None
+            self.taille_carte = 0
+
+    def sceller(self):
+        """
+        Ferme le fichier en ajout après avoir synchronisé ses derniers
+        enregistrements : le segment n'est plus que lu.
+        """
+
+        if self.descripteur is not None:
+
+            self.synchroniser()
+            os.close(self.descripteur)
+            self.descripteur = None
+
+    def fermer(self):
+        """
+        Ferme le fichier et la projection du segment.
+        """
+
+        self.sceller()
+        self.fermer_carte()
+
+
+class JournalMessages:
+    """
+    Stockage des messages publics dans un journal en ajout seul.
+
+    Chaque salon a son dossier de segments, nommés d'après l'ID de leur
+    premier message. Un message est ajouté d'une seule écriture à la fin
+    du segment actif, qui est scellé et remplacé une fois taille_segment
+    octets atteints. Les pages d'historique sont lues via l'index en
+    mémoire des segments, sans parcourir les fichiers.
+
+    Un thread de maintenance synchronise les segments sur disque toutes
+    les delai_synchronisation secondes (à chaque message si 0) et
+    compacte les segments scellés toutes les intervalle_compactage
+    secondes : les petits segments consécutifs sont fusionnés, leurs
+    enregistrements réécrits dans l'ordre des ID. Un segment n'étant
+    scellé qu'une fois taille_segment octets atteints, il n'y a de petits
+    segments qu'après une augmentation de taille_segment (ou des ajouts
+    concurrents désordonnés à réordonner).
+    """
+
+    def __init__(self, dossier, taille_segment=16777216,
+                 delai_synchronisation=1.0, intervalle_compactage=3600):
+        """
+        Constructeur de la classe JournalMessages.
+
+        :param dossier: Le dossier du journal.
+        :param taille_segment: La taille au-delà de laquelle un segment est
+        scellé, en octets.
+        :param delai_synchronisation: L'intervalle des fsync, en secondes
+        (0 pour un fsync par message).
+        :param intervalle_compactage: L'intervalle du compactage, en
+        secondes.
+        """
+
+        self.dossier = dossier
+        self.taille_segment = taille_segment
+        self.delai_synchronisation = delai_synchronisation
+        self.intervalle_compactage = intervalle_compactage
+        self.verrou = threading.Lock()
+        self.salons = {}
+        self.verrous_salons = {}
+        self.evenement_arret = threading.Event()
+        self.thread_maintenance = None
+        self.ajouts = 0
+        self.synchronisations = 0
+        self.compactages = 0
+        self.octets_tronques = 0
+
+    def ouvrir(self):
+        """
+        Ouvre le journal : reconstruit l'index de chaque segment existant.
+        """
+
+        os.makedirs(self.dossier, exist_ok=True)
+
+        for nom_dossier in sorted(os.listdir(self.dossier)):
+
+            if not nom_dossier.startswith("salon_"):
+
+                continue
+
+            id_salon_public = int(nom_dossier.removeprefix("salon_"))
+            chemin_salon = os.path.join(self.dossier, nom_dossier)
+            segments = []
+            precedent = None
+
+            for nom_fichier in sorted(os.listdir(chemin_salon)):
+
+                chemin = os.path.join(chemin_salon, nom_fichier)
+
+                if nom_fichier.endswith(".tmp"):
+
+                    # Compactage interrompu : les segments d'origine sont
+                    # toujours en place
+                    os.remove(chemin)
+                    continue
+
+                if not nom_fichier.endswith(".seg"):
+
+                    continue
+
+                segment = SegmentJournal(chemin,
+                                         int(nom_fichier.removesuffix(".seg")))
+                self.octets_tronques += segment.reconstruire()
+
+                # Compactage interrompu après le remplacement du premier
+                # segment de la suite : les suivants, déjà recopiés dans
+                # le segment fusionné, restent à supprimer
+                if (precedent is not None
+                        and segment.contenu_dans(precedent)):
+
+                    os.remove(chemin)
+                    continue
+
+                segments.append(segment)
+                precedent = segment
+
+            self.salons[id_salon_public] = segments
+            self.verrous_salons[id_salon_public] = threading.Lock()
+
+    def verrou_salon(self, id_salon_public):
+        """
+        Donne le verrou des segments d'un salon, créé au premier message.
+
+        :param id_salon_public: L'ID du salon public.
+        :return: Le verrou du salon.
+        """
+
+        with self.verrou:
+
+            if id_salon_public not in self.verrous_salons:
+
+                self.verrous_salons[id_salon_public] = threading.Lock()
+                self.salons[id_salon_public] = []
+
+            return self.verrous_salons[id_salon_public]
+
+    def ajouter(self, id_salon_public, id_message, id_client,
+                message_formate):
+        """
+        Ajoute un message à la fin du segment actif de son salon.
+
+        :param id_salon_public: L'ID du salon public.
+        :param id_message: L'ID du message.
+        :param id_client: L'ID de l'auteur.
+        :param message_formate: Le message tel qu'affiché aux clients.
+        """
+
+        enregistrement = SegmentJournal.encoder(id_message, id_client,
+                                                message_formate)
+
+        with self.verrou_salon(id_salon_public):
+
+            segments = self.salons[id_salon_public]
+
+            if not segments or segments[-1].taille >= self.taille_segment:
+
+                if segments:
+
+                    segments[-1].sceller()
+
+                chemin_salon = os.path.join(self.dossier,
+                                            f"salon_{id_salon_public}")
+                os.makedirs(chemin_salon, exist_ok=True)
+                segments.append(SegmentJournal(
+                    os.path.join(chemin_salon, f"{id_message:020d}.seg"),
+                    id_message))
+
+            segment = segments[-1]
+            segment.ajouter(id_message, enregistrement)
+            synchronise = (not self.delai_synchronisation
+                           and segment.synchroniser())
+
+        with self.verrou:
+
+            self.ajouts += 1
+            self.synchronisations += synchronise
+
+    def page(self, id_salon_public, sens, id_message, nombre):
+        """
+        Lit une page de l'historique d'un salon dans le journal.
+
+        :param id_salon_public: L'ID du salon public.
+        :param sens: "AVANT" ou "DEPUIS".
+        :param id_message: L'ID de message servant de curseur (0 pour les
+        plus récents avec "AVANT").
+        :param nombre: Le nombre de messages souhaité.
+        :return: Un tuple (messages, encore) : les paires [id, message
+        formaté] triées par ID croissant, et True s'il reste des messages
+        au-delà de la page dans le journal.
+        """
+
+        with self.verrou_salon(id_salon_public):
+
+            segments = self.salons[id_salon_public]
+            candidats = []
+
+            if sens == "AVANT":
+
+                id_message = id_message or 2 ** 63
+
+                for rang in range(len(segments) - 1, -1, -1):
+
+                    segment = segments[rang]
+                    fin = bisect.bisect_left(segment.ids, id_message)
+                    candidats.extend((segment.ids[indice], segment, indice)
+                                     for indice in range(
+                                         max(0, fin - nombre - 1), fin))
+                    candidats.sort(reverse=True, key=lambda c: c[0])
+                    del candidats[nombre + 1:]
+
+                    # Les segments précédents n'ont que des ID plus petits,
+                    # sauf aux rares frontières d'ajouts concurrents
+                    if (len(candidats) > nombre and rang > 0
+                            and segments[rang - 1].ids
+                            and segments[rang - 1].ids[-1]
+                            < candidats[-1][0]):
+
+                        break
+
+                encore = len(candidats) > nombre
+                candidats = candidats[:nombre][::-1]
+
+            else:
+
+                for rang, segment in enumerate(segments):
+
+                    debut = bisect.bisect_right(segment.ids, id_message)
+                    candidats.extend((segment.ids[indice], segment, indice)
+                                     for indice in range(
+                                         debut, min(len(segment.ids),
+                                                    debut + nombre + 1)))
+                    candidats.sort(key=lambda c: c[0])
+                    del candidats[nombre + 1:]
+
+                    if (len(candidats) > nombre and rang + 1 < len(segments)
+                            and segments[rang + 1].ids
+                            and segments[rang + 1].ids[0]
+                            > candidats[-1][0]):
+
+                        break
+
+                encore = len(candidats) > nombre
+                candidats = candidats[:nombre]
+
+            messages = []
+
+            for _, segment, indice in candidats:
+
+                id_ligne, _, message_formate = segment.lire(indice)
+                messages.append([id_ligne, message_formate])
+
+            return messages, encore
+
+    def premier_id(self):
+        """
+        Donne le plus petit ID de message du journal, tous salons
+        confondus : les messages d'ID inférieur sont en BDD.
+
+        :return: L'ID, ou None si le journal est vide.
+        """
+
+        with self.verrou:
+
+            premiers = [segment.ids[0]
+                        for segments in self.salons.values()
+                        for segment in segments if segment.ids]
+
+        return min(premiers, default=None)
+
+    def id_max(self):
+        """
+        Donne le plus grand ID de message du journal.
+
+        :return: L'ID, ou 0 si le journal est vide.
+        """
+
+        with self.verrou:
+
+            return max((segment.ids[-1]
+                        for segments in self.salons.values()
+                        for segment in segments if segment.ids), default=0)
+
+    def synchroniser(self):
+        """
+        Force l'écriture sur disque des segments modifiés depuis le
+        dernier appel.
+        """
+
+        with self.verrou:
+
+            salons = list(self.salons)
+
+        for id_salon_public in salons:
+
+            with self.verrou_salon(id_salon_public):
+
+                for segment in self.salons[id_salon_public]:
+
+                    if segment.synchroniser():
+
+                        with self.verrou:
+
+                            self.synchronisations += 1
+
+    def compacter(self):
+        """
+        Fusionne les suites de petits segments scellés de chaque salon
+        en segments d'au plus taille_segment octets.
+
+        Les segments scellés n'étant plus modifiés, le segment fusionné est
+        écrit dans un fichier temporaire sans bloquer les ajouts au salon ;
+        le verrou du salon n'est pris que pour remplacer le premier
+        segment de la suite et supprimer les autres. Un arrêt avant ce
+        remplacement laisse les segments d'origine intacts (le fichier
+        temporaire est supprimé à l'ouverture), un arrêt après laisse des
+        segments entièrement recopiés, supprimés par ouvrir().
+        """
+
+        with self.verrou:
+
+            salons = list(self.salons)
+
+        for id_salon_public in salons:
+
+            with self.verrou_salon(id_salon_public):
+
+                segments = list(self.salons[id_salon_public])
+
+            suites = []
+            suite = []
+
+            # Le dernier segment est actif et n'est jamais compacté
+            for segment in segments[:-1]:
+
+                if (suite and sum(s.taille for s in suite)
+                        + segment.taille > self.taille_segment):
+
+                    suites.append(suite)
+                    suite = []
+
+                suite.append(segment)
+
+            if suite:
+
+                suites.append(suite)
+
+            for suite in suites:
+
+                fusion = self.fusion_segments(suite)
+
+                if fusion is None:
+
+                    continue
+
+                with self.verrou_salon(id_salon_public):
+
+                    for segment in suite:
+
+                        segment.fermer()
+
+                    os.replace(fusion.chemin + ".tmp", fusion.chemin)
+
+                    for segment in suite[1:]:
+
+                        os.remove(segment.chemin)
+
+                    segments = self.salons[id_salon_public]
+                    rang = segments.index(suite[0])
+                    segments[rang:rang + len(suite)] = [fusion]
+                    self.compactages += 1
+
+    def fusion_segments(self, suite):
+        """
+        Réécrit une suite de segments scellés dans l'ordre des ID, dans le
+        fichier temporaire (".tmp") du premier segment de la suite.
+
+        Les enregistrements sont recopiés tels quels depuis les fichiers,
+        sans passer par les projections mmap utilisées par les lectures.
+
+        :param suite: Les segments, dans l'ordre.
+        :return: Le segment fusionné, indexé, à mettre en place sous le
+        chemin du premier segment ; None si la suite n'est qu'un segment
+        déjà trié.
+        """
+
+        # L'index est trié par ID : des positions croissantes signifient
+        # que le fichier l'est aussi
+        if len(suite) == 1 and all(
+                a < b for a, b in zip(suite[0].positions,
+                                      suite[0].positions[1:])):
+
+            return None
+
+        enregistrements = []
+
+        for segment in suite:
+
+            with open(segment.chemin, "rb") as fichier:
+
+                donnees = fichier.read(segment.taille)
+
+            enregistrements.extend(
+                (segment.ids[indice],
+                 segment.enregistrement_brut(donnees, indice))
+                for indice in range(len(segment.ids)))
+
+        enregistrements.sort(key=lambda enregistrement: enregistrement[0])
+        premier = suite[0]
+        fusion = SegmentJournal(premier.chemin, premier.premier_id)
+
+        with open(premier.chemin + ".tmp", "wb") as fichier:
+
+            for id_message, enregistrement in enregistrements:
+
+                fichier.write(enregistrement)
+                fusion.indexer(id_message, fusion.taille)
+                fusion.taille += len(enregistrement)
+
+            fichier.flush()
+            os.fsync(fichier.fileno())
+
+        return fusion
+
+    def demarrer(self):
+        """
+        Démarre le thread de maintenance (synchronisation et compactage).
+        """
+
+        def boucle():
+
+            delai = self.delai_synchronisation or self.intervalle_compactage
+            prochain_compactage = time.monotonic() + self.intervalle_compactage
+
+            while not self.evenement_arret.wait(delai):
+
+                try:
+
+                    self.synchroniser()
+
+                    if time.monotonic() >= prochain_compactage:
+
+                        self.compacter()
+                        prochain_compactage = (time.monotonic()
+                                               + self.intervalle_compactage)
+
+                except Exception as erreur:
+
+                    traces.error("Erreur de la maintenance du journal des "
+                                 "messages", extra=champs(erreur=erreur))
+
+        self.thread_maintenance = threading.Thread(target=boucle,
+                                                   daemon=True)
+        self.thread_maintenance.start()
+
+    def fermer(self):
+        """
+        Arrête le thread de maintenance, puis synchronise et ferme tous
+        les segments.
+        """
+
+        self.evenement_arret.set()
+
+        if self.thread_maintenance is not None:
+
+            self.thread_maintenance.join()
+
+        with self.verrou:
+
+            salons = list(self.salons)
+
+        for id_salon_public in salons:
+
+            with self.verrou_salon(id_salon_public):
+
+                for segment in self.salons[id_salon_public]:
+
+                    segment.fermer()
+
+    def statistiques(self):
+        """
+        Donne l'état du journal.
+
+        :return: Le tuple (segments, messages, octets, ajouts,
+        synchronisations, compactages).
+        """
+
+        with self.verrou:
+
+            segments = [segment for liste in self.salons.values()
+                        for segment in liste]
+
+        return (len(segments), sum(len(s.ids) for s in segments),
+                sum(s.taille for s in segments), self.ajouts,
+                self.synchronisations, self.compactages)
+
+
+class IndexRecherche:
+    """
+    Index inversé des messages, pour la recherche plein texte.
+
+    Chaque terme (mot d'au moins deux caractères, en minuscules et sans
+    accents) a la liste triée des ID des messages qui le contiennent.
+
+    Les messages indexés sont ajoutés au fichier messages.idx, une ligne
+    JSON [id, portée, message affiché, début du contenu] par message :
+    l'index y est reconstruit au démarrage et les résultats y sont lus
+    via mmap. La portée d'un message est l'ID de son salon public, ou
+    l'opposé de l'ID de son salon privé.
+    """
+
+    MOT = re.compile(r"\w{2,}")
+
+    def __init__(self, dossier):
+        """
+        Constructeur de la classe IndexRecherche.
+
+        :param dossier: Le dossier du fichier de l'index.
+        """
+
+        self.dossier = dossier
+        self.chemin = os.path.join(dossier, "messages.idx")
+        self.verrou = threading.Lock()
+        self.termes = {}
+        self.ids = array.array("q")
+        self.portees = array.array("q")
+        self.positions = array.array("q")
+        self.taille = 0
+        self.descripteur = None
+        self.carte = None
+        self.taille_carte = 0
+        self.recherches = 0
+        self.duree = 0.0
+
+    @classmethod
+    def termes_texte(cls, texte):
+        """
+        Découpe un texte en termes d'index.
+
+        :param texte: Le texte.
+        :return: L'ensemble des termes, en minuscules et sans accents.
+        """
+
+        texte = texte.lower()
+
+        if not texte.isascii():
+
+            texte = "".join(
+                caractere
+                for caractere in unicodedata.normalize("NFKD", texte)
+                if not unicodedata.combining(caractere))
+
+        return set(cls.MOT.findall(texte))
+
+    def ouvrir(self):
+        """
+        Reconstruit l'index à partir de son fichier, tronqué après la
+        dernière ligne complète, puis l'ouvre en ajout.
+        """
+
+        os.makedirs(self.dossier, exist_ok=True)
+
+        if os.path.exists(self.chemin):
+
+            with open(self.chemin, "rb") as fichier:
+
+                donnees = fichier.read()
+
+            position = 0
+
+            while True:
+
+                fin = donnees.find(b"\n", position)
+
+                if fin < 0:
+
+                    break
+
+                id_message, portee, message, debut_contenu = json.loads(
+                    donnees[position:fin])
+                self.indexer(id_message, portee, position,
+                             self.termes_texte(message[debut_contenu:]))
+                position = fin + 1
+
+            if position < len(donnees):
+
+                os.truncate(self.chemin, position)
+
+            self.taille = position
+
+        self.descripteur = os.open(
+            self.chemin, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def indexer(self, id_message, portee, position, termes):
+        """
+        Ajoute un message à l'index en mémoire, à sa place dans l'ordre
+        des ID.
+
+        :param id_message: L'ID du message.
+        :param portee: La portée du message.
+        :param position: La position de sa ligne dans le fichier.
+        :param termes: Les termes de son contenu.
+        """
+
+        rang = len(self.ids)
+
+        if self.ids and id_message < self.ids[-1]:
+
+            rang = bisect.bisect(self.ids, id_message)
+
+        self.ids.insert(rang, id_message)
+        self.portees.insert(rang, portee)
+        self.positions.insert(rang, position)
+
+        for terme in termes:
+
+            ids_terme = self.termes.get(terme)
+
+            if ids_terme is None:
+
+                self.termes[terme] = array.array("q", (id_message,))
+
+            elif id_message > ids_terme[-1]:
+
+                ids_terme.append(id_message)
+
+            else:
+
+                ids_terme.insert(bisect.bisect(ids_terme, id_message),
+                                 id_message)
+
+    def ajouter(self, id_message, portee, message, debut_contenu):
+        """
+        Indexe un message et l'ajoute au fichier de l'index.
+
+        :param id_message: L'ID du message.
+        :param portee: L'ID du salon public, ou l'opposé de l'ID du salon
+        privé.
+        :param message: Le message tel qu'affiché dans les résultats.
+        :param debut_contenu: La position du contenu dans le message :
+        seul le contenu est indexé, pas l'horodatage ni l'auteur.
+        """
+
+        ligne = (json.dumps([id_message, portee, message, debut_contenu])
+                 + "\n").encode("utf-8")
+        termes = self.termes_texte(message[debut_contenu:])
+
+        with self.verrou:
+
+            os.write(self.descripteur, ligne)
+            self.indexer(id_message, portee, self.taille, termes)
+            self.taille += len(ligne)
+
+    def id_max(self):
+        """
+        Donne le plus grand ID de message indexé.
+
+        :return: L'ID, ou 0 si l'index est vide.
+        """
+
+        with self.verrou:
+
+            return self.ids[-1] if self.ids else 0
+
+    def lire(self, rang):
+        """
+        Lit un message indexé dans le fichier de l'index.
+
+        :param rang: La place du message dans l'index.
+        :return: Le tuple (ID du message, portée, message affiché).
+        """
+
+        if self.carte is None or self.taille_carte < self.taille:
 
-            print(f"\nErreur lors de l'ajout de l'accès au salon : {erreur}")
+            if self.carte is not None:
 
-    def verifier_acces_salon_public(self, id_client, nom_salon):
+                self.carte.close()
+
+            with open(self.chemin, "rb") as fichier:
+
+                self.carte = mmap.mmap(fichier.fileno(), self.taille,
+                                       access=mmap.ACCESS_READ)
+
+            self.taille_carte = self.taille
+
+        position = self.positions[rang]
+        id_message, portee, message, _ = json.loads(
+            self.carte[position:self.carte.find(b"\n", position)])
+        return id_message, portee, message
+
+    def chercher(self, texte, portees, curseur, nombre):
+        """
+        Cherche les messages contenant tous les termes d'un texte, du plus
+        récent au plus ancien.
+
+        La liste d'ID la plus courte parmi celles des termes est parcourue
+        à partir du curseur ; chaque ID est cherché par dichotomie dans
+        les autres listes, bornée par la position de l'ID précédent.
+
+        :param texte: Le texte recherché.
+        :param portees: Les portées autorisées au demandeur.
+        :param curseur: L'ID en dessous duquel chercher (0 pour les plus
+        récents).
+        :param nombre: Le nombre de résultats souhaité.
+        :return: Un tuple (résultats, encore) : les tuples (ID, portée,
+        message affiché), et True s'il reste des résultats au-delà.
         """
-        Vérifie si un client a accès à un salon public.
 
-        :param id_client: L'ID du client à vérifier.
-        :param nom_salon: Le nom du salon public à vérifier.
-        :return: True si le client a accès au salon, False sinon.
+        termes = self.termes_texte(texte)
+        debut = time.perf_counter()
+
+        with self.verrou:
+
+            listes = [self.termes.get(terme) for terme in termes]
+            rangs = []
+
+            if listes and None not in listes:
+
+                listes.sort(key=len)
+                plus_courte, autres = listes[0], listes[1:]
+                indice = bisect.bisect_left(plus_courte, curseur or 2 ** 63)
+                bornes = [len(ids) for ids in autres]
+
+                while indice > 0 and len(rangs) <= nombre:
+
+                    indice -= 1
+                    id_message = plus_courte[indice]
+                    present = True
+
+                    for rang_liste, ids in enumerate(autres):
+
+                        # Les ID parcourus décroissent : la suite de la
+                        # recherche reste sous cette position
+                        position = bisect.bisect_left(
+                            ids, id_message, 0, bornes[rang_liste])
+                        bornes[rang_liste] = position
+
+                        if (position == len(ids)
+                                or ids[position] != id_message):
+
+                            present = False
+                            break
+
+                    if not present:
+
+                        continue
+
+                    rang = bisect.bisect_left(self.ids, id_message)
+
+                    if self.portees[rang] in portees:
+
+                        rangs.append(rang)
+
+            resultats = [self.lire(rang) for rang in rangs[:nombre]]
+            self.recherches += 1
+            self.duree += time.perf_counter() - debut
+
+        return resultats, len(rangs) > nombre
+
+    def fermer(self):
+        """
+        Synchronise et ferme le fichier de l'index.
         """
 
-        try:
+        with self.verrou:
 
-            with self.lien_mysql.cursor() as curseur:
+            if self.descripteur is not None:
 
-                curseur.execute("""
-                    SELECT COUNT(*) FROM membres_salons_publics
-                    JOIN salons_publics ON 
-                    membres_salons_publics.id_salon_public = 
-                    salons_publics.id_salon_public 
-                    WHERE id_client = %s AND nom_salon = %s
-                """, (id_client, nom_salon))
-                (count,) = curseur.fetchone()
-                print(f"\nNombre de correspondances trouvées: {count}")
-                return count > 0
+                os.fsync(self.descripteur)
+                os.close(self.descripteur)
+                self.descripteur = None
 
-        except Exception as erreur:
+            if self.carte is not None:
 
-            print(f"\nErreur de la vérification de l'accès au salon : "
-                  f"{erreur}")
-            return False
+                self.carte.close()
+                self.carte = None
 
-    def obtenir_salons_autorises(self, id_client):
+    def statistiques(self):
         """
-        Obtient la liste des salons publics auxquels un client a accès.
+        Donne la taille de l'index et la durée moyenne des recherches.
 
-        :param id_client: L'ID du client dont on veut connaître
-        les salons autorisés.
-        :return: Une liste des noms des salons publics auxquels
-        le client a accès.
+        :return: Le tuple (messages, termes, octets, recherches, durée
+        moyenne en secondes).
         """
 
-        try:
+        with self.verrou:
 
-            with self.lien_mysql.cursor() as curseur:
+            return (len(self.ids), len(self.termes), self.taille,
+                    self.recherches, self.duree / (self.recherches or 1))
 
-                curseur.execute("""
-                    SELECT nom_salon FROM salons_publics
-                    JOIN membres_salons_publics ON 
-                    salons_publics.id_salon_public = 
-                    membres_salons_publics.id_salon_public
-                    WHERE id_client = %s
-                """, (id_client,))
-                resultats = curseur.fetchall()
-                return [nom_salon for (nom_salon,) in resultats]
 
-        except Exception as erreur:
+class Metriques:
+    """
+    Métriques du serveur, exposées au format texte de Prometheus.
 
-            print(
-                f"\nErreur de l'obtention des salons accessibles : {erreur}")
-            return []
+    Les compteurs et histogrammes sont tenus par thread : chaque thread
+    écrit dans son propre magasin, sans verrou, et les magasins ne sont
+    fusionnés qu'à la lecture des métriques. Les magasins des threads
+    terminés sont alors versés dans un magasin commun.
 
-    def gestion_acces_salons(self, ip_client, nom_salon):
+    Les jauges (clients connectés, files d'envoi...) sont calculées à la
+    lecture par les fonctions enregistrées avec ajouter_jauges.
+    """
+
+    # Bornes des histogrammes, en secondes pour les durées
+    BORNES_DUREE = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+    BORNES_NOMBRE = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+    DESCRIPTIONS = {
+        "sae_clients_connectes": (
+            "gauge", "Connexions clients ouvertes."),
+        "sae_sessions": (
+            "gauge", "Sessions clients, authentifiées ou anonymes."),
+        "sae_messages_publics_total": (
+            "counter", "Messages publics reçus, par salon."),
+        "sae_messages_prives_total": (
+            "counter", "Messages privés reçus."),
+        "sae_commande_duree_secondes": (
+            "histogram", "Durée de traitement des commandes du protocole."),
+        "sae_bdd_requete_duree_secondes": (
+            "histogram", "Durée des requêtes à la BDD, par commande."),
+        "sae_bdd_erreurs_total": (
+            "counter", "Requêtes à la BDD en erreur."),
+        "sae_file_envoi_messages": (
+            "gauge", "Messages en attente dans les files d'envoi."),
+        "sae_file_envoi_octets": (
+            "gauge", "Octets en attente dans les files d'envoi."),
+        "sae_file_envoi_octets_max": (
+            "gauge", "Octets en attente dans la file d'envoi la plus "
+                     "chargée."),
+        "sae_diffusion_destinataires": (
+            "histogram", "Destinataires d'une diffusion de message public."),
+        "sae_diffusion_duree_secondes": (
+            "histogram", "Durée d'une diffusion de message public."),
+    }
+
+    def __init__(self):
+        """
+        Constructeur de la classe Metriques.
         """
-        Gère l'accès d'un client à un salon.
 
-        :param ip_client: L'adresse IP du client.
-        :param nom_salon: Le nom du salon auquel le client veut accéder.
-        :return: Un message indiquant si l'accès a été accordé,
-        refusé ou si le salon est inconnu.
+        self.local = threading.local()
+        self.verrou = threading.Lock()
+        self.magasins = []
+        self.retraites = {"compteurs": {}, "histogrammes": {}}
+        self.jauges = []
+
+    def magasin(self):
+        """
+        Donne le magasin du thread courant, créé à son premier usage.
+
+        :return: Le dictionnaire {"compteurs", "histogrammes"} du thread.
         """
 
-        with self.verrou_requete_acces:
+        magasin = getattr(self.local, "magasin", None)
 
-            id_client = self.sessions[ip_client].id_client
-            email_client = self.sessions[ip_client].email_client
+        if magasin is None:
+
+            magasin = {"compteurs": {}, "histogrammes": {}}
+            self.local.magasin = magasin
+
+            with self.verrou:
+
+                self.magasins.append((weakref.ref(threading.current_thread()),
+                                      magasin))
+
+        return magasin
+
+    def compter(self, nom, etiquettes=(), valeur=1):
+        """
+        Incrémente un compteur.
+
+        :param nom: Le nom de la métrique.
+        :param etiquettes: Les paires (étiquette, valeur).
+        :param valeur: L'incrément.
+        """
 
-            if self.verifier_acces_salon_public(id_client, nom_salon):
+        compteurs = self.magasin()["compteurs"]
+        cle = (nom, etiquettes)
+        compteurs[cle] = compteurs.get(cle, 0) + valeur
 
-                return f"[PROTOCOLE]ACCES_DEJA_ACCORDE:{nom_salon}"
+    def observer(self, nom, valeur, etiquettes=(), bornes=BORNES_DUREE):
+        """
+        Ajoute une observation à un histogramme.
+
+        :param nom: Le nom de la métrique.
+        :param valeur: La valeur observée.
+        :param etiquettes: Les paires (étiquette, valeur).
+        :param bornes: Les bornes supérieures des intervalles.
+        """
+
+        histogrammes = self.magasin()["histogrammes"]
+        cle = (nom, etiquettes)
+        histogramme = histogrammes.get(cle)
+
+        if histogramme is None:
+
+            histogramme = histogrammes[cle] = [bornes,
+                                               [0] * (len(bornes) + 1), 0.0]
+
+        histogramme[1][bisect.bisect_left(bornes, valeur)] += 1
+        histogramme[2] += valeur
+
+    def ajouter_jauges(self, fonction):
+        """
+        Enregistre une fonction de calcul de jauges, appelée à chaque
+        lecture des métriques.
+
+        :param fonction: Une fonction sans paramètre donnant une liste de
+        tuples (nom, étiquettes, valeur).
+        """
+
+        self.jauges.append(fonction)
+
+    @staticmethod
+    def verser(destination, source):
+        """
+        Ajoute les valeurs d'un magasin à celles d'un autre.
+
+        :param destination: Le magasin complété.
+        :param source: Le magasin ajouté.
+        """
 
-            if nom_salon == "Blabla":
+        for cle, valeur in list(source["compteurs"].items()):
 
-                self.ajouter_acces_salon_public(id_client, nom_salon)
-                return "[PROTOCOLE]ACCES_ACCORDE:Blabla"
+            destination["compteurs"][cle] = (
+                destination["compteurs"].get(cle, 0) + valeur)
 
-            elif nom_salon in ["Comptabilite", "Informatique", "Marketing"]:
+        for cle, (bornes, intervalles, somme) in list(
+                source["histogrammes"].items()):
 
-                self.etat_commande = "salon_access"
+            histogramme = destination["histogrammes"].get(cle)
 
-                reponse = input(
-                    f"Accorder l'accès au salon {nom_salon} à "
-                    f"{ip_client}, {email_client} ? [O/N] : ")
+            if histogramme is None:
 
-                if reponse.upper() == "O":
+                histogramme = destination["histogrammes"][cle] = [
+                    bornes, [0] * len(intervalles), 0.0]
 
-                    self.ajouter_acces_salon_public(id_client, nom_salon)
-                    self.etat_commande = "commande"
-                    return f"[PROTOCOLE]ACCES_ACCORDE:{nom_salon}"
+            histogramme[1] = [total + nombre for total, nombre
+                              in zip(histogramme[1], intervalles)]
+            histogramme[2] += somme
+
+    def fusion(self):
+        """
+        Fusionne les magasins de tous les threads, après avoir versé ceux
+        des threads terminés dans le magasin commun.
+
+        :return: Le magasin fusionné.
+        """
+
+        total = {"compteurs": {}, "histogrammes": {}}
+
+        with self.verrou:
+
+            actifs = []
+
+            for reference, magasin in self.magasins:
+
+                thread = reference()
+
+                if thread is None or not thread.is_alive():
+
+                    self.verser(self.retraites, magasin)
 
                 else:
 
-                    self.etat_commande = "commande"
-                    return f"[PROTOCOLE]ACCES_REFUSE:{nom_salon}"
+                    actifs.append((reference, magasin))
+
+            self.magasins = actifs
+            self.verser(total, self.retraites)
+
+            for _, magasin in actifs:
+
+                self.verser(total, magasin)
+
+        return total
+
+    @staticmethod
+    def format_etiquettes(etiquettes):
+        """
+        Met des étiquettes au format de l'exposition.
+
+        :param etiquettes: Les paires (étiquette, valeur).
+        :return: Le texte '{a="b",...}', ou "" sans étiquette.
+        """
+
+        if not etiquettes:
+
+            return ""
+
+        return "{" + ",".join(
+            '{}="{}"'.format(cle, str(valeur).replace("\\", "\\\\")
+                             .replace('"', '\\"').replace("\n", "\\n"))
+            for cle, valeur in etiquettes) + "}"
+
+    def exposition(self):
+        """
+        Produit le texte des métriques au format d'exposition de
+        Prometheus (version 0.0.4).
+
+        :return: Le texte des métriques.
+        """
+
+        total = self.fusion()
+        series = collections.defaultdict(list)
+
+        for (nom, etiquettes), valeur in total["compteurs"].items():
+
+            series[nom].append(f"{nom}{self.format_etiquettes(etiquettes)} "
+                               f"{valeur}")
+
+        for fonction in self.jauges:
+
+            try:
+
+                for nom, etiquettes, valeur in fonction():
+
+                    series[nom].append(
+                        f"{nom}{self.format_etiquettes(etiquettes)} "
+                        f"{valeur}")
+
+            except Exception as erreur:
+
+                traces.error("Erreur du calcul des jauges",
+                             extra=champs(erreur=erreur))
+
+        for (nom, etiquettes), (bornes, intervalles, somme) in (
+                total["histogrammes"].items()):
+
+            cumul = 0
+
+            for borne, nombre in zip(bornes + ("+Inf",), intervalles):
+
+                cumul += nombre
+                series[nom].append(
+                    f"{nom}_bucket"
+                    f"{self.format_etiquettes(etiquettes + (('le', borne),))}"
+                    f" {cumul}")
+
+            series[nom].append(f"{nom}_sum{self.format_etiquettes(etiquettes)}"
+                               f" {somme}")
+            series[nom].append(
+                f"{nom}_count{self.format_etiquettes(etiquettes)} {cumul}")
+
+        lignes = []
+
+        for nom in sorted(series):
+
+            type_metrique, aide = self.DESCRIPTIONS.get(nom, ("untyped", nom))
+            lignes.append(f"# HELP {nom} {aide}")
+            lignes.append(f"# TYPE {nom} {type_metrique}")
+            lignes.extend(series[nom])
+
+        return "\n".join(lignes) + "\n"
+
+
+class GestionnaireMetriques(http.server.BaseHTTPRequestHandler):
+    """
+    Réponse HTTP aux lectures des métriques : GET /metrics.
+    """
+
+    def do_GET(self):
+        """
+        Envoie les métriques du serveur, ou une erreur 404 hors de
+        /metrics.
+        """
+
+        if self.path.split("?")[0] != "/metrics":
+
+            self.send_error(404)
+            return
+
+        corps = self.server.metriques.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type",
+                         "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+    def log_message(self, format, *args):
+        """
+        Les lectures des métriques ne sont pas journalisées.
+        """
+
+
+class FormatTraces(logging.Formatter):
+    """
+    Mise en forme des traces structurées, sur une ligne :
+    - "texte" : horodatage, niveau, événement puis champs cle=valeur ;
+    - "json" : un objet JSON par trace.
+    """
+
+    def __init__(self, format_traces="texte"):
+        """
+        Constructeur de la classe FormatTraces.
+
+        :param format_traces: "texte" ou "json".
+        """
+
+        super().__init__()
+        self.format_traces = format_traces
+
+    def format(self, record):
+        """
+        Met une trace en forme.
+
+        :param record: La trace (logging.LogRecord).
+        :return: La ligne de la trace.
+        """
+
+        horodatage = datetime.datetime.fromtimestamp(record.created)
+        valeurs = getattr(record, "champs", {})
+
+        if record.exc_info:
+
+            valeurs = dict(valeurs, exception=self.formatException(
+                record.exc_info))
+
+        if self.format_traces == "json":
+
+            return json.dumps(dict({"horodatage": horodatage.isoformat(),
+                                    "niveau": record.levelname,
+                                    "evenement": record.getMessage()},
+                                   **valeurs), default=str,
+                              ensure_ascii=False)
+
+        return " ".join(
+            [f"{horodatage:%Y-%m-%d %H:%M:%S}.{horodatage:%f}"[:23],
+             f"{record.levelname:<7}", record.getMessage()]
+            + [f"{cle}={json.dumps(str(valeur), ensure_ascii=False)}"
+               if " " in str(valeur) else f"{cle}={valeur}"
+               for cle, valeur in valeurs.items()])
 
-            else:
 
-                return "[PROTOCOLE]SALON_INCONNU"
+class FileTraces(logging.handlers.QueueHandler):
+    """
+    Dépose les traces dans la file de l'écrivain, sans les mettre en
+    forme : la mise en forme et l'écriture sont faites par le thread de
+    l'écrivain, hors du chemin des messages.
+    """
+
+    def prepare(self, record):
+        """
+        :param record: La trace.
+        :return: La trace, telle quelle.
+        """
+
+        return record
 
 
 class SessionClient:
@@ -1387,17 +9048,143 @@ class SessionClient:
     """
 
     def __init__(self, authentifie=False, id_client=None, permission=None,
-                 email_client=None):
+                 email_client=None, nom=None, prenom=None):
         self.authentifie = authentifie
         self.id_client = id_client
         self.permission = permission
         self.email_client = email_client
+        self.nom = nom
+        self.prenom = prenom
 
 
 # Paramètres de configuration du serveur
 hote_init, port_init = '0.0.0.0', 24793
 
-# Paramètres de connexion à la base de données
+# Mode de service des connexions : "threads" ou "asyncio"
+mode_init = "threads"
+nombre_executeurs_init = 4
+
+# Nombre de processus travailleurs partageant le port (SO_REUSEPORT)
+nombre_processus_init = 1
+
+# Files d'envoi par connexion : seuils en octets et politique appliquée
+# aux clients trop lents ("abandon", "fusion" ou "deconnexion")
+file_envoi_init = {
+    'seuil_haut': 1048576,
+    'seuil_bas': 262144,
+    'politique': 'abandon',
+}
+
+# Réception : taille initiale du tampon par connexion et taille maximale
+# d'un message, en octets
+tramage_init = {
+    'taille_tampon': 65536,
+    'taille_max_trame': 1048576,
+}
+
+# Nombre maximal de clients gardés dans le cache des identités
+taille_cache_identites_init = 10000
+
+# Nombre maximal de messages renvoyés par page d'historique
+taille_page_historique_init = 200
+
+# Nombre de derniers messages gardés en mémoire par salon public
+taille_historique_recent_init = 200
+
+# Erreur levée quand une commande dépasse son budget de requêtes (tests)
+controle_requetes_init = False
+
+# Nombre de lignes par bloc des résultats envoyés en flux
+taille_bloc_flux_init = 500
+
+# Intervalle de regroupement des changements de présence poussés (s)
+delai_presence_init = 0.5
+
+# Pool de connexions à la BDD : nombre de connexions ouvertes au démarrage
+# et au plus, attente maximale d'une connexion libre (s) et inactivité (s)
+# au-delà de laquelle une connexion est testée avant d'être prêtée
+pool_bdd_init = {
+    'taille_min': 2,
+    'taille_max': 10,
+    'delai_acquisition': 5,
+    'intervalle_verification': 30,
+}
+
+# Écriture différée des messages : taille maximale d'un lot et attente
+# maximale d'un message avant son écriture (s)
+persistance_init = {
+    'taille_lot': 500,
+    'delai_lot': 0.005,
+}
+
+# Journal des messages publics en segments à ajout seul : dossier (None
+# pour stocker les messages publics en BDD), taille d'un segment (octets),
+# intervalle des fsync (s, 0 pour un fsync par message) et du compactage (s)
+journal_init = {
+    'dossier': None,
+    'taille_segment': 16777216,
+    'delai_synchronisation': 1.0,
+    'intervalle_compactage': 3600,
+}
+
+# Limitation du débit des commandes clients (seaux à jetons) : capacité
+# (rafale) et débit (jetons par seconde) des seaux par connexion, par
+# utilisateur authentifié et par IP (partagé derrière un NAT) de chaque
+# catégorie, politique appliquée au trafic en excès ("retard", "abandon"
+# ou "mute"), attente maximale d'un message retardé (s), refus menant à
+# un mute automatique et fenêtre (s) dans laquelle ils doivent survenir,
+# durée du mute (min) et conservation des compteurs de /limites après la
+# dernière limitation d'un utilisateur (s)
+limites_debit_init = {
+    'regles': {
+        'discussion': {'connexion': (30, 10), 'utilisateur': (50, 15)},
+        'historique': {'connexion': (20, 4), 'utilisateur': (40, 8)},
+        'authentification': {'connexion': (5, 0.2),
+                             'adresse': (20, 1)},
+    },
+    'politique': 'retard',
+    'attente_max': 2.0,
+    'seuil_mute': 20,
+    'fenetre_mute': 10,
+    'duree_mute': 5,
+    'retention_compteurs': 3600,
+}
+
+# Dossier de l'index de recherche des messages (None pour désactiver la
+# recherche)
+dossier_recherche_init = "recherche"
+
+# Socket Unix d'administration, recevant les lots d'opérations (None pour
+# ne pas l'ouvrir)
+chemin_socket_admin_init = "serveur_admin.sock"
+
+# Point d'accès HTTP des métriques au format de Prometheus (GET /metrics),
+# local par défaut ; en plusieurs processus, le travailleur n écoute sur
+# port + n
+metriques_init = {
+    'hote': '127.0.0.1',
+    'port': 9464,
+}
+
+# Traces du serveur : niveau minimal, format ("texte" ou "json"), fichier
+# (None pour la sortie standard) et, au niveau DEBUG, un message reçu tracé
+# sur echantillonnage_messages
+traces_init = {
+    'niveau': 'INFO',
+    'format': 'texte',
+    'fichier': None,
+    'echantillonnage_messages': 100,
+}
+
+# Moteur de stockage : "mysql" (serveur MySQL) ou "sqlite" (fichier local)
+stockage_init = "mysql"
+
+# Paramètres de la base SQLite embarquée
+sqlite_init = {
+    'chemin': 'sae_302.db',
+}
+
+# Paramètres de connexion à la base de données MySQL
 mysql_init = {
     'host': 'localhost',
     'port': 3306,
@@ -1407,15 +9194,353 @@ mysql_init = {
 }
 
 
+def configuration_traces(niveau="INFO", format_traces="texte",
+                         fichier=None):
+    """
+    Configure les traces du serveur : elles sont déposées dans une file
+    par les threads qui les émettent, puis mises en forme et écrites par
+    un thread dédié, sur la sortie standard ou dans un fichier.
+
+    :param niveau: Le niveau minimal des traces ("DEBUG", "INFO"...).
+    :param format_traces: "texte" ou "json".
+    :param fichier: Le fichier des traces (None pour la sortie standard).
+    """
+
+    global ecrivain_traces
+
+    sortie = (logging.FileHandler(fichier, encoding="utf-8") if fichier
+              else logging.StreamHandler(sys.stdout))
+    sortie.setFormatter(FormatTraces(format_traces))
+    file_traces = queue.SimpleQueue()
+    traces.handlers = [FileTraces(file_traces)]
+    traces.setLevel(niveau)
+    traces.propagate = False
+    ecrivain_traces = logging.handlers.QueueListener(file_traces, sortie)
+    ecrivain_traces.start()
+
+
+def relance_traces():
+    """
+    Relance l'écrivain des traces dans un processus créé par fork, où le
+    thread de l'écrivain du parent n'existe pas.
+    """
+
+    global ecrivain_traces
+
+    if ecrivain_traces is None:
+
+        return
+
+    file_traces = queue.SimpleQueue()
+    traces.handlers = [FileTraces(file_traces)]
+    ecrivain_traces = logging.handlers.QueueListener(
+        file_traces, *ecrivain_traces.handlers)
+    ecrivain_traces.start()
+
+
+def arret_traces():
+    """
+    Écrit les traces encore en file et arrête leur écrivain.
+    """
+
+    global ecrivain_traces
+
+    if ecrivain_traces is not None:
+
+        ecrivain_traces.stop()
+        ecrivain_traces = None
+
+
+def banc_recherche(tailles=(10000, 100000, 1000000), nombre_requetes=200):
+    """
+    Mesure la latence des recherches selon la taille de l'index.
+
+    Les messages sont générés dans un dossier temporaire, avec des mots
+    tirés selon une loi de Zipf (quelques mots très fréquents, beaucoup de
+    mots rares), et répartis entre 5 salons dont 3 sont autorisés.
+    L'index grandit d'une taille à la suivante ; à chaque taille, les
+    latences médiane et au 99e centile sont mesurées pour un mot
+    fréquent, un mot rare et deux mots.
+
+    :param tailles: Les nombres de messages indexés à mesurer.
+    :param nombre_requetes: Le nombre de recherches par mesure.
+    """
+
+    aleatoire = random.Random(302)
+    vocabulaire = [f"mot{rang}" for rang in range(20000)]
+    poids_cumules = list(itertools.accumulate(
+        1 / (rang + 1) for rang in range(len(vocabulaire))))
+    portees = {1, 2, 3}
+
+    with tempfile.TemporaryDirectory() as dossier:
+
+        index = IndexRecherche(dossier)
+        index.ouvrir()
+        id_message = 0
+
+        print(f"{'messages':>10} {'termes':>8} {'requête':>14} "
+              f"{'médiane (ms)':>13} {'p99 (ms)':>9}")
+
+        for taille in tailles:
+
+            debut = time.perf_counter()
+
+            while id_message < taille:
+
+                id_message += 1
+                contenu = " ".join(aleatoire.choices(
+                    vocabulaire, cum_weights=poids_cumules, k=8))
+                index.ajouter(id_message, aleatoire.randint(1, 5), contenu,
+                              0)
+
+            print(f"{taille} messages indexés en "
+                  f"{time.perf_counter() - debut:.1f} s")
+
+            for nom_requete, texte in (
+                    ("mot fréquent", lambda: vocabulaire[0]),
+                    ("mot rare", lambda: aleatoire.choice(
+                        vocabulaire[1000:])),
+                    ("deux mots", lambda: " ".join(aleatoire.choices(
+                        vocabulaire[:200], k=2)))):
+
+                durees = []
+
+                for _ in range(nombre_requetes):
+
+                    requete = texte()
+                    debut = time.perf_counter()
+                    index.chercher(requete, portees, 0, 50)
+                    durees.append(time.perf_counter() - debut)
+
+                durees.sort()
+                print(f"{taille:>10} {len(index.termes):>8} "
+                      f"{nom_requete:>14} "
+                      f"{1000 * durees[len(durees) // 2]:>13.3f} "
+                      f"{1000 * durees[len(durees) * 99 // 100]:>9.3f}")
+
+        index.fermer()
+
+
+def envoi_lots_admin(chemin_socket, fichier):
+    """
+    Envoie des lots d'opérations à la socket d'administration d'un
+    serveur lancé, et affiche les résultats au fil de l'eau.
+
+    Exemple, pour donner accès au salon Marketing à une liste de clients :
+    {"action": "grant", "salon": "Marketing", "emails": ["a@b.fr", ...]}
+
+    :param chemin_socket: Le chemin de la socket d'administration.
+    :param fichier: Le fichier des lots, un lot JSON par ligne ("-" pour
+    l'entrée standard).
+    """
+
+    with contextlib.ExitStack() as pile:
+
+        lots = (sys.stdin if fichier == "-"
+                else pile.enter_context(open(fichier, encoding="utf-8")))
+        socket_admin = pile.enter_context(
+            socket.socket(socket.AF_UNIX, socket.SOCK_STREAM))
+        socket_admin.connect(chemin_socket)
+        lecteur = pile.enter_context(
+            socket_admin.makefile("r", encoding="utf-8"))
+
+        for ligne in lots:
+
+            if not ligne.strip():
+
+                continue
+
+            socket_admin.sendall(ligne.rstrip("\n").encode() + b"\n")
+
+            for reponse in lecteur:
+
+                print(reponse, end="")
+
+                if json.loads(reponse).get("fin"):
+
+                    break
+
+
 def execution_programme():
     """
     Fonction principale pour exécuter le serveur de messagerie.
     Crée une instance du serveur de messagerie en utilisant les paramètres
     d'hôte, de port et de base de données spécifiés, puis démarre le serveur.
+
+    Le mode de service et le moteur de stockage peuvent être choisis au
+    lancement :
+    python serveur.py --mode asyncio --stockage sqlite
     """
 
-    serveur_messagerie = ServeurDeMessagerie(hote_init, port_init, mysql_init)
-    serveur_messagerie.demarrage_serveur()
+    analyseur = argparse.ArgumentParser(description="Serveur de messagerie")
+    analyseur.add_argument("--stockage", choices=["mysql", "sqlite"],
+                           default=stockage_init,
+                           help="Moteur de stockage des données.")
+    analyseur.add_argument("--chemin-sqlite", default=sqlite_init['chemin'],
+                           help="Fichier de la base SQLite.")
+    analyseur.add_argument("--mode", choices=["threads", "asyncio"],
+                           default=mode_init,
+                           help="Mode de service des connexions clients.")
+    analyseur.add_argument("--executeurs", type=int,
+                           default=nombre_executeurs_init,
+                           help="Threads dédiés à la BDD en mode asyncio.")
+    analyseur.add_argument("--processus", type=int,
+                           default=nombre_processus_init,
+                           help="Processus travailleurs (SO_REUSEPORT).")
+    analyseur.add_argument("--politique-envoi",
+                           choices=["abandon", "fusion", "deconnexion"],
+                           default=file_envoi_init['politique'],
+                           help="Traitement des clients trop lents.")
+    analyseur.add_argument("--taille-tampon", type=int,
+                           default=tramage_init['taille_tampon'],
+                           help="Taille du tampon de réception (octets).")
+    analyseur.add_argument("--taille-max-trame", type=int,
+                           default=tramage_init['taille_max_trame'],
+                           help="Taille maximale d'un message (octets).")
+    analyseur.add_argument("--taille-cache", type=int,
+                           default=taille_cache_identites_init,
+                           help="Clients gardés dans le cache des identités.")
+    analyseur.add_argument("--pool-min", type=int,
+                           default=pool_bdd_init['taille_min'],
+                           help="Connexions à la BDD ouvertes au "
+                                "démarrage.")
+    analyseur.add_argument("--pool-max", type=int,
+                           default=pool_bdd_init['taille_max'],
+                           help="Connexions à la BDD simultanées au plus.")
+    analyseur.add_argument("--taille-lot", type=int,
+                           default=persistance_init['taille_lot'],
+                           help="Messages écrits au plus par lot.")
+    analyseur.add_argument("--delai-lot", type=float,
+                           default=persistance_init['delai_lot'],
+                           help="Attente maximale avant écriture (s).")
+    analyseur.add_argument("--taille-page", type=int,
+                           default=taille_page_historique_init,
+                           help="Messages renvoyés au plus par page "
+                                "d'historique.")
+    analyseur.add_argument("--historique-recent", type=int,
+                           default=taille_historique_recent_init,
+                           help="Derniers messages gardés en mémoire par "
+                                "salon.")
+    analyseur.add_argument("--controle-requetes", action="store_true",
+                           default=controle_requetes_init,
+                           help="Échec des commandes dépassant leur budget "
+                                "de requêtes (tests).")
+    analyseur.add_argument("--taille-bloc-flux", type=int,
+                           default=taille_bloc_flux_init,
+                           help="Lignes par bloc de l'historique envoyé en "
+                                "flux.")
+    analyseur.add_argument("--delai-presence", type=float,
+                           default=delai_presence_init,
+                           help="Regroupement des changements de présence "
+                                "(s).")
+    analyseur.add_argument("--journal", default=journal_init['dossier'],
+                           help="Dossier du journal des messages publics "
+                                "(BDD par défaut).")
+    analyseur.add_argument("--taille-segment", type=int,
+                           default=journal_init['taille_segment'],
+                           help="Taille d'un segment du journal (octets).")
+    analyseur.add_argument("--delai-synchronisation", type=float,
+                           default=journal_init['delai_synchronisation'],
+                           help="Intervalle des fsync du journal (s, 0 pour "
+                                "chaque message).")
+    analyseur.add_argument("--politique-debit",
+                           choices=["retard", "abandon", "mute"],
+                           default=limites_debit_init['politique'],
+                           help="Traitement des messages au-delà des "
+                                "limites de débit.")
+    analyseur.add_argument("--recherche", default=dossier_recherche_init,
+                           help="Dossier de l'index de recherche des "
+                                "messages (vide pour la désactiver).")
+    analyseur.add_argument("--socket-admin",
+                           default=chemin_socket_admin_init,
+                           help="Socket Unix d'administration (vide pour ne "
+                                "pas l'ouvrir).")
+    analyseur.add_argument("--port-metriques", type=int,
+                           default=metriques_init['port'],
+                           help="Port HTTP des métriques (0 pour ne pas "
+                                "l'ouvrir).")
+    analyseur.add_argument("--niveau-traces",
+                           choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                           default=traces_init['niveau'],
+                           help="Niveau minimal des traces du serveur.")
+    analyseur.add_argument("--format-traces", choices=["texte", "json"],
+                           default=traces_init['format'],
+                           help="Format des traces du serveur.")
+    analyseur.add_argument("--fichier-traces", default=traces_init['fichier'],
+                           help="Fichier des traces (sortie standard par "
+                                "défaut).")
+    analyseur.add_argument("--echantillonnage-messages", type=int,
+                           default=traces_init['echantillonnage_messages'],
+                           help="Un message reçu tracé sur N au niveau "
+                                "DEBUG.")
+    analyseur.add_argument("--lot-admin", metavar="FICHIER",
+                           help="Envoie les lots JSON du fichier ('-' pour "
+                                "l'entrée standard) à la socket "
+                                "d'administration du serveur lancé, affiche "
+                                "les résultats, puis quitte.")
+    analyseur.add_argument("--banc-recherche", action="store_true",
+                           help="Mesure la latence des recherches selon la "
+                                "taille de l'index, puis quitte.")
+    arguments = analyseur.parse_args()
+
+    if arguments.banc_recherche:
+
+        banc_recherche()
+        return
+
+    if arguments.lot_admin:
+
+        envoi_lots_admin(arguments.socket_admin, arguments.lot_admin)
+        return
+
+    file_envoi_init['politique'] = arguments.politique_envoi
+    tramage_init['taille_tampon'] = arguments.taille_tampon
+    tramage_init['taille_max_trame'] = arguments.taille_max_trame
+    pool_bdd_init['taille_min'] = arguments.pool_min
+    pool_bdd_init['taille_max'] = arguments.pool_max
+    persistance_init['taille_lot'] = arguments.taille_lot
+    persistance_init['delai_lot'] = arguments.delai_lot
+    sqlite_init['chemin'] = arguments.chemin_sqlite
+    journal_init['dossier'] = arguments.journal
+    limites_debit_init['politique'] = arguments.politique_debit
+    journal_init['taille_segment'] = arguments.taille_segment
+    journal_init['delai_synchronisation'] = arguments.delai_synchronisation
+    metriques_init['port'] = arguments.port_metriques
+    configuration_traces(arguments.niveau_traces, arguments.format_traces,
+                         arguments.fichier_traces)
+
+    if arguments.stockage == "sqlite":
+
+        stockage = StockageSQLite(**sqlite_init)
+
+    else:
+
+        stockage = StockageMySQL(mysql_init)
+
+    serveur_messagerie = ServeurDeMessagerie(
+        hote_init, port_init, stockage, mode=arguments.mode,
+        nombre_executeurs=arguments.executeurs,
+        nombre_processus=arguments.processus, file_envoi=file_envoi_init,
+        tramage=tramage_init, taille_cache_identites=arguments.taille_cache,
+        pool=pool_bdd_init, persistance=persistance_init,
+        taille_page_historique=arguments.taille_page,
+        taille_historique_recent=arguments.historique_recent,
+        controle_requetes=arguments.controle_requetes,
+        delai_presence=arguments.delai_presence,
+        taille_bloc_flux=arguments.taille_bloc_flux, journal=journal_init,
+        dossier_recherche=arguments.recherche or None,
+        limites_debit=limites_debit_init,
+        chemin_socket_admin=arguments.socket_admin or None,
+        metriques=metriques_init if arguments.port_metriques else None,
+        echantillonnage_messages=max(1, arguments.echantillonnage_messages))
+
+    try:
+
+        serveur_messagerie.demarrage_serveur()
+
+    finally:
+
+        arret_traces()
 
 
 if __name__ == '__main__':
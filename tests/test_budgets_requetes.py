@@ -0,0 +1,147 @@
+"""
+Budgets de requêtes des commandes clients.
+
+Le serveur est construit sur une base SQLite temporaire avec
+controle_requetes=True : une commande qui exécute plus de requêtes que
+son budget (AccesDonnees.BUDGETS) lève BudgetRequetesDepasse. Une
+modification qui ferait par exemple une requête par destinataire dans
+DISCUSSION_PUBLIQUE échoue donc ici.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Codes"))
+
+import serveur  # noqa: E402
+
+
+# Destinataires connectés pendant les diffusions : assez pour qu'une
+# requête par destinataire dépasse tous les budgets
+NOMBRE_CLIENTS = 5
+
+
+class ConnexionTest(serveur.ConnexionClient):
+    """
+    Connexion sans socket : les messages mis en file sont aussitôt
+    « envoyés » et gardés dans recus.
+    """
+
+    def __init__(self, ip_client):
+        super().__init__(ip_client)
+        self.recus = []
+
+    def reveiller_ecrivain(self):
+
+        messages = self.extraire_messages()
+        self.recus.extend(donnees.decode() for donnees in messages)
+        self.confirmer_envoi(sum(len(donnees) for donnees in messages))
+
+
+@pytest.fixture
+def serveur_test(tmp_path):
+    """
+    Serveur initialisé comme par demarrage_serveur, sans écoute réseau.
+    """
+
+    stockage = serveur.StockageSQLite(chemin=str(tmp_path / "sae.db"))
+    serveur_messagerie = serveur.ServeurDeMessagerie(
+        "127.0.0.1", 0, stockage, pool={'taille_min': 1, 'taille_max': 4},
+        controle_requetes=True)
+    serveur_messagerie.connexion_bdd()
+    serveur_messagerie.migration_schema()
+    serveur_messagerie.chargement_index_salons()
+    serveur_messagerie.chargement_sanctions()
+    serveur_messagerie.chargement_compteur_messages()
+    serveur_messagerie.chargement_historique_recent()
+    serveur_messagerie.demarrage_ecriture_messages()
+    serveur_messagerie.registre_presence.demarrer(
+        serveur_messagerie.diffusion_presence)
+
+    yield serveur_messagerie
+
+    serveur_messagerie.registre_presence.arreter()
+    serveur_messagerie.ecriture_messages.arreter()
+    serveur_messagerie.pool_bdd.fermer()
+
+
+def connexion_client(serveur_messagerie, numero):
+    """
+    Inscrit et authentifie le client numero, comme gestion_clients.
+
+    :return: La connexion du client.
+    """
+
+    ip_client = f"127.0.0.{numero + 1}"
+    connexion = ConnexionTest(ip_client)
+    serveur_messagerie.sessions[ip_client] = serveur.SessionClient()
+    serveur_messagerie.clients[ip_client] = connexion
+
+    serveur_messagerie.traitement_message_client(
+        connexion, ip_client,
+        f"[PROTOCOLE]INSCRIPTION:N{numero},P{numero},u{numero}@x.fr,mdp,"
+        f"utilisateur")
+    serveur_messagerie.traitement_message_client(
+        connexion, ip_client, f"[PROTOCOLE]AUTHENTIFICATION:u{numero}@x.fr,mdp")
+
+    assert "SUCCES_AUTHENTIFICATION" in "".join(connexion.recus)
+    return connexion
+
+
+def test_commandes_dans_leur_budget(serveur_test):
+
+    connexions = [connexion_client(serveur_test, numero)
+                  for numero in range(1, NOMBRE_CLIENTS + 1)]
+    expediteur, destinataire = connexions[0], connexions[1]
+
+    for message in ["[PROTOCOLE]DISCUSSION_PUBLIQUE:General:bonjour",
+                    "[PROTOCOLE]DISCUSSION_PRIVEE:u2@x.fr:psst",
+                    "[PROTOCOLE]DISCUSSION_PRIVEE:u2@x.fr:encore"]:
+
+        serveur_test.traitement_message_client(
+            expediteur, expediteur.ip_client, message)
+
+    recus = "".join(destinataire.recus)
+    assert "[PROTOCOLE]MESSAGE_CHAT:General:" in recus
+    assert recus.count("[PROTOCOLE]NOUVEAU_MESSAGE_PRIVE:") == 2
+
+    statistiques = serveur_test.acces_donnees.statistiques()
+
+    for commande, appels in [("AUTHENTIFICATION", NOMBRE_CLIENTS),
+                             ("DISCUSSION_PUBLIQUE", 1),
+                             ("DISCUSSION_PRIVEE", 2)]:
+
+        mesure = statistiques[commande]
+        assert mesure["appels"] == appels
+        assert mesure["depassements"] == 0
+        assert mesure["requetes_max"] <= mesure["budget"]
+
+
+def test_requete_supplementaire_levee(serveur_test, monkeypatch):
+
+    connexions = [connexion_client(serveur_test, numero)
+                  for numero in range(1, NOMBRE_CLIENTS + 1)]
+    diffusion = serveur_test.diffusion_locale_message_public
+
+    def diffusion_avec_requete_par_destinataire(nom_salon, message_formate,
+                                                id_message):
+
+        for _ in serveur_test.clients:
+
+            serveur_test.acces_donnees.un("identite_par_id", (1,))
+
+        diffusion(nom_salon, message_formate, id_message)
+
+    monkeypatch.setattr(serveur_test, "diffusion_locale_message_public",
+                        diffusion_avec_requete_par_destinataire)
+
+    with pytest.raises(serveur.BudgetRequetesDepasse):
+
+        serveur_test.traitement_message_client(
+            connexions[0], connexions[0].ip_client,
+            "[PROTOCOLE]DISCUSSION_PUBLIQUE:General:bonjour")
+
+    assert (serveur_test.acces_donnees.statistiques()
+            ["DISCUSSION_PUBLIQUE"]["depassements"] == 1)
@@ -0,0 +1,106 @@
+"""
+Limitation de débit (LimiteurDebit), sur une horloge simulée : controler
+est appelé à des instants choisis en remplaçant time.monotonic.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Codes"))
+
+import serveur  # noqa: E402
+
+
+REGLES = serveur.limites_debit_init['regles']
+
+
+class Horloge:
+    """
+    Horloge simulée, avancée à la main.
+    """
+
+    def __init__(self):
+        self.instant = 1000.0
+
+    def __call__(self):
+        return self.instant
+
+
+@pytest.fixture
+def horloge(monkeypatch):
+
+    horloge = Horloge()
+    monkeypatch.setattr(serveur.time, "monotonic", horloge)
+    return horloge
+
+
+def test_flot_soutenu_mute(horloge):
+
+    limiteur = serveur.LimiteurDebit(REGLES, politique="mute")
+    issues = []
+
+    # 100 messages par seconde pendant 60 s : un message passe à chaque
+    # jeton regagné, sans remettre à zéro le compte des refus
+    for _ in range(6000):
+
+        issue, _ = limiteur.controler("discussion", "connexion", "a@x.fr",
+                                      "127.0.0.1")
+        issues.append(issue)
+        horloge.instant += 0.01
+
+    assert issues.count("mute") > 0
+    assert issues.index("mute") < 100
+
+
+def test_refus_espaces_pas_de_mute(horloge):
+
+    limiteur = serveur.LimiteurDebit(
+        {"discussion": {"connexion": (1, 1)}}, politique="mute",
+        seuil_mute=3, fenetre_mute=10)
+
+    # Un refus toutes les 6 s : jamais 3 refus dans la même fenêtre
+    for _ in range(10):
+
+        limiteur.controler("discussion", "connexion", "a@x.fr", "127.0.0.1")
+        issue, _ = limiteur.controler("discussion", "connexion", "a@x.fr",
+                                      "127.0.0.1")
+        assert issue == "refuse"
+        horloge.instant += 6
+
+    assert limiteur.statistiques()[0].get("mute", 0) == 0
+
+
+def test_seau_en_retard_pas_expire_avant_remplissage(horloge):
+
+    capacite, debit = 10, 5
+    limiteur = serveur.LimiteurDebit(
+        {"discussion": {"utilisateur": (capacite, debit)}},
+        politique="retard", attente_max=2.0)
+
+    def rafale():
+
+        issues = []
+
+        for _ in range(capacite + 10):
+
+            issue, _ = limiteur.controler("discussion", "connexion",
+                                          "a@x.fr", "127.0.0.1")
+            issues.append(issue)
+
+        return issues
+
+    # La rafale réserve les jetons de 2 s de remplissage : le seau est à
+    # -10, plein seulement après (capacite + 10) / debit = 4 s
+    assert rafale().count("accepte") == capacite
+    horloge.instant += capacite / debit
+
+    assert "a@x.fr" in limiteur.seaux["utilisateur"]
+    assert rafale().count("accepte") == 0
+
+    horloge.instant += 2 * (capacite + 10) / debit
+    limiteur.controler("discussion", "connexion", "b@x.fr", "127.0.0.1")
+
+    assert "a@x.fr" not in limiteur.seaux["utilisateur"]
+    assert not limiteur.instant_plein["utilisateur"].get("a@x.fr")